@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from db.models import get_db, Event, EventType, User
+from sqlalchemy import func, text, and_, or_, select, cast, literal, literal_column, null, true, tuple_, Date
+from db.models import get_db, Event, EventType, EventDailyAgg, User
 from datetime import date
 from typing import Optional, List
+import base64
+import json
+import uuid
+import numpy as np
 
 from api.auth import analyst_or_admin, get_current_user
 from jose import JWTError, jwt
 from core.security import SECRET_KEY, ALGORITHM
+from services import privacidad, densidad, version_datos
+from core.cache_http import etag_eventos
+from core import cache_resultados
+from core.cache_resultados import CacheResultados, cacheado
+from services.filtros_espaciales import FiltroEspacial, FiltroEspacialInvalido
 
 router = APIRouter()
 
@@ -29,123 +39,176 @@ async def get_optional_user(
 
 POBLACION_JAMUNDI = 180942
 
-@router.get("/estadisticas/kpis")
+# Roles que pueden ver datos sensibles (Analista, Fuerza Pública, Admin)
+ROLES_SENSIBLES = ["Administrador (Observatorio)", "Analista Institucional", "Enlace Fuerza Pública"]
+
+def _acceso_sensible(token: Optional[str]) -> bool:
+    """True si el token (opcional, por query) pertenece a un rol con acceso a datos sensibles."""
+    if not token:
+        return False
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return payload.get("role") in ROLES_SENSIBLES
+    except JWTError:
+        return False
+
+def _nivel_acceso(token: Optional[str]) -> str:
+    return "institucional" if _acceso_sensible(token) else "publico"
+
+# Respuestas de estadísticas/mapas en memoria (ver core/cache_resultados.py)
+cache_analitica = CacheResultados("analitica")
+
+def filtro_espacial(
+    bbox: Optional[str] = Query(None, description="minx,miny,maxx,maxy (EPSG:4326)"),
+    near: Optional[str] = Query(None, description="lng,lat del centro de búsqueda"),
+    radius_m: Optional[float] = Query(None, description="Radio en metros para near"),
+    poligono: Optional[str] = Query(None, description="Polígono en WKT o GeoJSON"),
+    token: Optional[str] = Query(None)
+) -> Optional[FiltroEspacial]:
+    """
+    Dependencia común de filtros espaciales. En Modo Abierto se filtra sobre la
+    coordenada generalizada para no exponer ubicaciones exactas vía conteos.
+    """
+    columna = "location_geom" if _acceso_sensible(token) else "public_geom"
+    try:
+        filtro = FiltroEspacial(bbox, near, radius_m, poligono, columna=columna)
+    except FiltroEspacialInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return filtro if filtro.activo else None
+
+def _fuente_agregada(espacial: Optional[FiltroEspacial] = None):
+    """
+    Relación (fecha, categoria, barrio, total) sobre la que se calculan las estadísticas.
+    Sin filtro espacial es el cubo diario `events_daily_agg`, que se mantiene al
+    ingerir/eliminar eventos. Con filtro espacial se agrega al vuelo desde `events`
+    (índice GIST) con las mismas columnas, de modo que las consultas no cambian.
+    """
+    if espacial is None:
+        return EventDailyAgg.__table__
+    barrio = func.coalesce(Event.barrio, "")
+    return select(
+        Event.occurrence_date.label("fecha"),
+        EventType.category.label("categoria"),
+        barrio.label("barrio"),
+        func.count().label("total")
+    ).join(
+        EventType, Event.event_type_id == EventType.id
+    ).where(
+        espacial.condicion()
+    ).group_by(Event.occurrence_date, EventType.category, barrio).subquery("agg")
+
+def _filtros_agregados(agg, start_date=None, end_date=None, categories=None):
+    condiciones = []
+    if start_date: condiciones.append(agg.c.fecha >= start_date)
+    if end_date: condiciones.append(agg.c.fecha <= end_date)
+    if categories: condiciones.append(agg.c.categoria.in_(categories))
+    return condiciones
+
+def _suma(columna, *condiciones):
+    """SUM(total) con FILTER opcional; nunca retorna NULL."""
+    total = func.sum(columna)
+    if condiciones:
+        total = total.filter(and_(*condiciones))
+    return func.coalesce(total, 0)
+
+@router.get("/estadisticas/kpis", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_dashboard_kpis(
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None, 
     categories: Optional[List[str]] = Query(None),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
-    try:
-        # 1. Total Incidentes (con filtros de fecha y categoría)
-        total_q = db.query(func.count(Event.id))
-        if start_date: total_q = total_q.filter(Event.occurrence_date >= start_date)
-        if end_date: total_q = total_q.filter(Event.occurrence_date <= end_date)
-        if categories:
-            total_q = total_q.join(EventType).filter(EventType.category.in_(categories))
-        total = total_q.scalar() or 0
-        
-        # 2. Homicidios (para la tasa)
-        hom_q = db.query(func.count(Event.id)).join(EventType).filter(EventType.category == "HOMICIDIO")
-        if start_date: hom_q = hom_q.filter(Event.occurrence_date >= start_date)
-        if end_date: hom_q = hom_q.filter(Event.occurrence_date <= end_date)
-        homicidios = hom_q.scalar() or 0
-        tasa = round((homicidios / POBLACION_JAMUNDI) * 100000, 2)
-        
-        # 3. Zonas críticas (Barrios con > 10 incidentes)
-        # Usamos una subquery explícita para contar grupos
-        subq = db.query(Event.barrio).filter(Event.barrio != 'Sin especificar')
-        if start_date: subq = subq.filter(Event.occurrence_date >= start_date)
-        if end_date: subq = subq.filter(Event.occurrence_date <= end_date)
-        if categories: subq = subq.join(EventType).filter(EventType.category.in_(categories))
-        
-        subq_grouped = subq.group_by(Event.barrio).having(func.count(Event.id) > 10).subquery()
-        zonas_criticas = db.query(func.count()).select_from(subq_grouped).scalar() or 0
-        
-        return {
-            "total_incidentes": total,
-            "tasa_homicidios": tasa,
-            "zonas_criticas": zonas_criticas,
-            "poblacion": POBLACION_JAMUNDI
-        }
-    except Exception as e:
-        # Fallback de seguridad: Nunca retornar 500 si podemos retornar data parcial
-        print(f"ALERTA: Error en KPI endpoint: {str(e)}")
-        return {
-            "total_incidentes": total if 'total' in locals() else 0,
-            "tasa_homicidios": 0.0,
-            "zonas_criticas": 0,
-            "poblacion": POBLACION_JAMUNDI,
-            "error_fallback": True
-        }
+    agg = _fuente_agregada(espacial)
+    # 1. Total Incidentes (con filtros de fecha y categoría)
+    total = db.query(_suma(agg.c.total)).filter(
+        *_filtros_agregados(agg, start_date, end_date, categories)
+    ).scalar() or 0
+
+    # 2. Homicidios (para la tasa)
+    homicidios = db.query(_suma(agg.c.total)).filter(
+        agg.c.categoria == "HOMICIDIO",
+        *_filtros_agregados(agg, start_date, end_date)
+    ).scalar() or 0
+    tasa = round((homicidios / POBLACION_JAMUNDI) * 100000, 2)
+
+    # 3. Zonas críticas (Barrios con > 10 incidentes)
+    # Usamos una subquery explícita para contar grupos
+    subq_grouped = db.query(agg.c.barrio).filter(
+        agg.c.barrio != 'Sin especificar',
+        agg.c.barrio != '',
+        *_filtros_agregados(agg, start_date, end_date, categories)
+    ).group_by(agg.c.barrio).having(func.sum(agg.c.total) > 10).subquery()
+    zonas_criticas = db.query(func.count()).select_from(subq_grouped).scalar() or 0
+
+    # Si la BD falla, la caché de resultados sirve la última respuesta válida
+    # en lugar de KPIs en cero que parecen datos reales.
+    return {
+        "total_incidentes": total,
+        "tasa_homicidios": tasa,
+        "zonas_criticas": zonas_criticas,
+        "poblacion": POBLACION_JAMUNDI
+    }
+
+# Mapeo manual de meses a Español para evitar dependencia de locale de DB
+MESES_ES = {
+    "Jan": "Ene", "Feb": "Feb", "Mar": "Mar", "Apr": "Abr", "May": "May", "Jun": "Jun",
+    "Jul": "Jul", "Aug": "Ago", "Sep": "Sep", "Oct": "Oct", "Nov": "Nov", "Dec": "Dic"
+}
+
+def _traducir_etiqueta(label):
+    for en, es in MESES_ES.items():
+        if en in label:
+            return label.replace(en, es)
+    return label
+
+def _granularidad(start_date, end_date):
+    """Determina (intervalo date_trunc, formato TO_CHAR) según el rango consultado."""
+    if start_date and end_date:
+        dias = (end_date - start_date).days
+        if dias <= 31:
+            return "day", "DD Mon"
+        elif dias <= 120:
+            return "week", "DD Mon" # Inicio de semana
+    return "month", "Mon"
 
-@router.get("/estadisticas/tendencia")
+@router.get("/estadisticas/tendencia", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_tendencia_delictiva(
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None, 
     categories: Optional[List[str]] = Query(None),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
     """
     Retorna la tendencia mensual de delitos (Homicidios vs Otros) con filtros.
     """
-    # Determinar granularidad según el rango
-    intervalo = "month"
-    formato_sql = "Mon"
-    if start_date and end_date:
-        dias = (end_date - start_date).days
-        if dias <= 31:
-            intervalo = "day"
-            formato_sql = "DD Mon"
-        elif dias <= 120:
-            intervalo = "week"
-            formato_sql = "DD Mon" # Inicio de semana
+    agg = _fuente_agregada(espacial)
+    intervalo, formato_sql = _granularidad(start_date, end_date)
+    # Literales (no parámetros) para que SELECT y GROUP BY usen la misma expresión
+    periodo = func.date_trunc(literal_column(f"'{intervalo}'"), agg.c.fecha)
 
-    query_str = f"""
-        SELECT 
-            TO_CHAR(date_trunc('{intervalo}', occurrence_date), '{formato_sql}') as etiqueta,
-            COUNT(*) FILTER (WHERE et.category = 'HOMICIDIO') as homicidios,
-            COUNT(*) FILTER (WHERE et.category != 'HOMICIDIO') as otros,
-            date_trunc('{intervalo}', occurrence_date) as full_date
-        FROM events e
-        JOIN event_types et ON e.event_type_id = et.id
-        WHERE 1=1
-    """
-    params = {}
-    if start_date:
-        query_str += " AND occurrence_date >= :start_date"
-        params["start_date"] = start_date
-    if end_date:
-        query_str += " AND occurrence_date <= :end_date"
-        params["end_date"] = end_date
-    if categories:
-        query_str += " AND et.category IN :categories"
-        params["categories"] = tuple(categories)
-
-    query_str += f" GROUP BY 1, 4 ORDER BY 4 DESC"
+    query = db.query(
+        func.to_char(periodo, literal_column(f"'{formato_sql}'")).label("etiqueta"),
+        _suma(agg.c.total, agg.c.categoria == 'HOMICIDIO').label("homicidios"),
+        _suma(agg.c.total, agg.c.categoria != 'HOMICIDIO').label("otros"),
+        periodo.label("full_date")
+    ).filter(
+        *_filtros_agregados(agg, start_date, end_date, categories)
+    ).group_by(periodo).order_by(periodo.desc())
     
     # Si NO se provee fecha inicio, limitamos a los últimos 6 meses para contexto
     if not start_date:
-        query_str += " LIMIT 6"
-    
-    results = db.execute(text(query_str), params).fetchall()
+        query = query.limit(6)
     
-    # Mapeo manual de meses a Español para evitar dependencia de locale de DB
-    MESES_ES = {
-        "Jan": "Ene", "Feb": "Feb", "Mar": "Mar", "Apr": "Abr", "May": "May", "Jun": "Jun",
-        "Jul": "Jul", "Aug": "Ago", "Sep": "Sep", "Oct": "Oct", "Nov": "Nov", "Dec": "Dic"
-    }
-    
-    def translate_label(label):
-        for en, es in MESES_ES.items():
-            if en in label:
-                return label.replace(en, es)
-        return label
+    results = query.all()
     
     # Invertir para que se vea cronológico en el gráfico (Antiguo -> Nuevo)
     trend_data = [
         {
-            "name": translate_label(r.etiqueta), 
+            "name": _traducir_etiqueta(r.etiqueta), 
             "homicidios": r.homicidios, 
             "hurtos": r.otros
         } 
@@ -155,88 +218,312 @@ def get_tendencia_delictiva(
     
     return trend_data
 
-@router.get("/estadisticas/distribucion")
+@router.get("/estadisticas/distribucion", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_distribucion_delitos(
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None, 
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
     """
     Retorna la distribución por tipo de delito con filtros térmporales.
     """
-    query = db.query(
-        EventType.category,
-        func.count(Event.id).label('total')
-    ).join(Event)
-    
-    if start_date: query = query.filter(Event.occurrence_date >= start_date)
-    if end_date: query = query.filter(Event.occurrence_date <= end_date)
-    
-    results = query.group_by(EventType.category).order_by(text('total DESC')).all()
+    agg = _fuente_agregada(espacial)
+    total = func.sum(agg.c.total)
+    results = db.query(
+        agg.c.categoria.label("category"),
+        total.label('total')
+    ).filter(
+        *_filtros_agregados(agg, start_date, end_date)
+    ).group_by(agg.c.categoria).order_by(total.desc()).all()
     
     return [{"name": r.category, "value": r.total} for r in results]
 
-@router.get("/estadisticas/barrios")
-def get_top_barrios(db: Session = Depends(get_db)):
+@router.get("/estadisticas/barrios", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
+def get_top_barrios(
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
+    db: Session = Depends(get_db)
+):
     """
     Retorna el Top 5 de barrios con más delitos.
     """
+    agg = _fuente_agregada(espacial)
+    total = func.sum(agg.c.total)
     results = db.query(
-        Event.barrio,
-        func.count(Event.id).label('total')
-    ).group_by(Event.barrio).order_by(text('total DESC')).limit(5).all()
+        agg.c.barrio,
+        total.label('total')
+    ).group_by(agg.c.barrio).order_by(total.desc()).limit(5).all()
     
     return [{"name": r.barrio or "Desconocido", "delitos": r.total} for r in results]
 
+def _calcular_bundle_dashboard(db, start_date, end_date, categories, espacial=None):
+    """
+    Calcula KPIs, tendencia, distribución, top de barrios y cobertura en una sola
+    consulta sobre el cubo, usando agregación condicional (FILTER) y GROUPING SETS,
+    más los 5 incidentes más recientes del periodo (LIMIT 5 sobre `events`).
+    Sin fechas, el periodo por defecto es el mes del último dato (como el Dashboard).
+    """
+    agg = _fuente_agregada(espacial)
+    limites = select(
+        func.min(agg.c.fecha).label("fecha_min"),
+        func.max(agg.c.fecha).label("fecha_max")
+    ).cte("limites")
+
+    if start_date is None and end_date is None:
+        mes_max = func.date_trunc("month", limites.c.fecha_max)
+        ini = cast(mes_max, Date)
+        fin = cast(mes_max + literal_column("interval '1 month'") - literal_column("interval '1 day'"), Date)
+        intervalo, formato_sql = "day", "DD Mon"
+    else:
+        ini = cast(literal(start_date), Date) if start_date else null()
+        fin = cast(literal(end_date), Date) if end_date else null()
+        intervalo, formato_sql = _granularidad(start_date, end_date)
+
+    rango = select(
+        ini.label("ini"),
+        fin.label("fin"),
+        limites.c.fecha_min,
+        limites.c.fecha_max
+    ).select_from(limites).cte("rango")
+
+    # Periodo anterior: el mes calendario previo al inicio (comparativa por defecto del Dashboard)
+    mes_ini = func.date_trunc("month", rango.c.ini)
+    anterior_ini = cast(mes_ini - literal_column("interval '1 month'"), Date)
+    anterior_fin = cast(mes_ini - literal_column("interval '1 day'"), Date)
+
+    en_rango = and_(
+        or_(rango.c.ini.is_(None), agg.c.fecha >= rango.c.ini),
+        or_(rango.c.fin.is_(None), agg.c.fecha <= rango.c.fin)
+    )
+    en_anterior = agg.c.fecha.between(anterior_ini, anterior_fin)
+    en_categoria = agg.c.categoria.in_(categories) if categories else true()
+
+    base = select(
+        agg.c.fecha, agg.c.categoria, agg.c.barrio, agg.c.total,
+        en_rango.label("en_rango"),
+        en_anterior.label("en_anterior"),
+        en_categoria.label("en_categoria")
+    ).select_from(agg.join(rango, true())).where(or_(en_rango, en_anterior)).cte("base")
+
+    b = base.c
+    es_homicidio = b.categoria == "HOMICIDIO"
+    periodo = func.date_trunc(literal_column(f"'{intervalo}'"), b.fecha)
+
+    query = select(
+        func.grouping(periodo, b.categoria, b.barrio).label("conjunto"),
+        func.to_char(periodo, literal_column(f"'{formato_sql}'")).label("etiqueta"),
+        periodo.label("periodo"),
+        b.categoria,
+        b.barrio,
+        _suma(b.total, b.en_rango, b.en_categoria).label("total"),
+        _suma(b.total, b.en_rango, es_homicidio).label("homicidios"),
+        _suma(b.total, b.en_rango, b.en_categoria, es_homicidio).label("tendencia_homicidios"),
+        _suma(b.total, b.en_rango, b.en_categoria, ~es_homicidio).label("tendencia_otros"),
+        _suma(b.total, b.en_rango).label("distribucion"),
+        _suma(b.total, b.en_anterior, b.en_categoria).label("anterior_total"),
+        _suma(b.total, b.en_anterior, es_homicidio).label("anterior_homicidios"),
+        select(rango.c.ini).scalar_subquery().label("ini"),
+        select(rango.c.fin).scalar_subquery().label("fin"),
+        select(anterior_ini).scalar_subquery().label("anterior_ini"),
+        select(anterior_fin).scalar_subquery().label("anterior_fin"),
+        select(rango.c.fecha_min).scalar_subquery().label("fecha_min"),
+        select(rango.c.fecha_max).scalar_subquery().label("fecha_max")
+    ).group_by(
+        func.grouping_sets(literal_column("()"), periodo, b.categoria, b.barrio)
+    )
+
+    filas = db.execute(query).fetchall()
+
+    # Bits de GROUPING(periodo, categoria, barrio): 1 = columna agregada
+    totales = next(f for f in filas if f.conjunto == 7)
+    por_periodo = sorted((f for f in filas if f.conjunto == 3), key=lambda f: f.periodo)
+    por_categoria = [f for f in filas if f.conjunto == 5 and f.distribucion > 0]
+    por_barrio = [f for f in filas if f.conjunto == 6 and f.total > 0]
+
+    tendencia = [
+        {
+            "name": _traducir_etiqueta(f.etiqueta),
+            "homicidios": f.tendencia_homicidios,
+            "hurtos": f.tendencia_otros
+        }
+        for f in por_periodo if f.tendencia_homicidios or f.tendencia_otros
+    ]
+    if totales.ini is None:
+        tendencia = tendencia[-6:]
+
+    por_categoria.sort(key=lambda f: f.distribucion, reverse=True)
+    por_barrio.sort(key=lambda f: f.total, reverse=True)
+    zonas_criticas = sum(
+        1 for f in por_barrio if f.barrio not in ("Sin especificar", "") and f.total > 10
+    )
+
+    def tasa(homicidios):
+        return round((homicidios / POBLACION_JAMUNDI) * 100000, 2)
+
+    # Actividad reciente: los últimos 5 incidentes del periodo efectivo
+    recientes = select(
+        Event.id, Event.occurrence_date, Event.barrio, Event.descripcion, Event.estado, EventType.category
+    ).join(EventType, Event.event_type_id == EventType.id)
+    if totales.ini: recientes = recientes.where(Event.occurrence_date >= totales.ini)
+    if totales.fin: recientes = recientes.where(Event.occurrence_date <= totales.fin)
+    if categories: recientes = recientes.where(EventType.category.in_(categories))
+    if espacial: recientes = recientes.where(espacial.condicion())
+    recientes = db.execute(
+        recientes.order_by(Event.occurrence_date.desc(), Event.id.desc()).limit(5)
+    ).fetchall()
+
+    return {
+        "periodo": {"inicio": totales.ini, "fin": totales.fin},
+        "cobertura": {
+            "fecha_inicial": totales.fecha_min or date.today(),
+            "ultima_fecha": totales.fecha_max or date.today()
+        },
+        "kpis": {
+            "total_incidentes": totales.total,
+            "tasa_homicidios": tasa(totales.homicidios),
+            "zonas_criticas": zonas_criticas,
+            "poblacion": POBLACION_JAMUNDI
+        },
+        "periodo_anterior": {
+            "inicio": totales.anterior_ini,
+            "fin": totales.anterior_fin,
+            "total_incidentes": totales.anterior_total,
+            "tasa_homicidios": tasa(totales.anterior_homicidios)
+        },
+        "tendencia": tendencia,
+        "distribucion": [{"name": f.categoria, "value": f.distribucion} for f in por_categoria],
+        "barrios": [{"name": f.barrio or "Desconocido", "delitos": f.total} for f in por_barrio[:5]],
+        "recientes": [_incidente(r) for r in recientes]
+    }
+
+@router.get("/estadisticas/dashboard", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
+def get_dashboard_bundle(
+    start_date: Optional[date] = None, 
+    end_date: Optional[date] = None, 
+    categories: Optional[List[str]] = Query(None),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna en un solo documento los bloques del Dashboard (kpis, tendencia,
+    distribución, barrios, actividad reciente y cobertura de datos), calculados en un
+    único recorrido del cubo.
+    """
+    return _calcular_bundle_dashboard(db, start_date, end_date, categories, espacial)
+
+RESUMEN_LIMITE_MAX = 5000
+RESUMEN_LOTE_STREAM = 1000
+
+def _codificar_cursor(fecha: date, event_id) -> str:
+    return base64.urlsafe_b64encode(f"{fecha.isoformat()}|{event_id}".encode()).decode()
+
+def _decodificar_cursor(cursor: str):
+    try:
+        fecha_txt, id_txt = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(fecha_txt), uuid.UUID(id_txt)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+def _incidente(r):
+    return {
+        "id": str(r.id),
+        "fecha": str(r.occurrence_date),
+        "tipo": r.category,
+        "barrio": r.barrio or "Sin especificar",
+        "descripcion": r.descripcion or "",
+        "estado": r.estado or "Abierto"
+    }
+
 @router.get("/estadisticas/resumen")
 def get_resumen_estadistico(
+    response: Response,
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None, 
+    categories: Optional[List[str]] = Query(None),
+    barrio: Optional[str] = None,
+    orden: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(1000, ge=1, le=RESUMEN_LIMITE_MAX),
+    cursor: Optional[str] = None,
+    formato: str = Query("json", pattern="^(json|ndjson)$"),
+    etag: Optional[str] = Depends(etag_eventos),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
     """
-    Retorna un resumen de incidentes para los KPIs del dashboard.
+    Retorna el listado de incidentes paginado por cursor (keyset) sobre (occurrence_date, id).
+    - formato=json: una página de `limit` filas; el cursor de la siguiente página va en
+      el encabezado `X-Siguiente-Cursor` (ausente en la última página).
+    - formato=ndjson: transmite todas las filas desde el cursor, una por línea, usando
+      un cursor del lado del servidor para mantener la memoria constante.
     """
-    query = db.query(Event).order_by(Event.occurrence_date.desc())
-    if start_date:
-        query = query.filter(Event.occurrence_date >= start_date)
-    if end_date:
-        query = query.filter(Event.occurrence_date <= end_date)
-    
-    events = query.all()
-    
-    # Transformar a formato esperado por el frontend
-    incidents = []
-    for e in events:
-        incidents.append({
-            "id": str(e.id),
-            "fecha": str(e.occurrence_date),
-            "tipo": e.event_type.category,
-            "barrio": e.barrio or "Sin especificar",
-            "descripcion": e.descripcion or "",
-            "estado": e.estado or "Abierto"
-        })
-    
-    return incidents
+    clave = tuple_(Event.occurrence_date, Event.id)
+    query = select(
+        Event.id,
+        Event.occurrence_date,
+        Event.barrio,
+        Event.descripcion,
+        Event.estado,
+        EventType.category
+    ).join(EventType, Event.event_type_id == EventType.id)
+
+    if start_date: query = query.where(Event.occurrence_date >= start_date)
+    if end_date: query = query.where(Event.occurrence_date <= end_date)
+    if categories: query = query.where(EventType.category.in_(categories))
+    if barrio: query = query.where(Event.barrio == barrio)
+    if espacial: query = query.where(espacial.condicion())
+    if cursor:
+        posicion = tuple_(*_decodificar_cursor(cursor))
+        query = query.where(clave < posicion if orden == "desc" else clave > posicion)
+
+    if orden == "desc":
+        query = query.order_by(Event.occurrence_date.desc(), Event.id.desc())
+    else:
+        query = query.order_by(Event.occurrence_date.asc(), Event.id.asc())
+
+    if formato == "ndjson":
+        def generar():
+            # Sesión propia: la del request se cierra antes de terminar la transmisión
+            from db.models import SessionLocal
+            db_stream = SessionLocal()
+            try:
+                filas = db_stream.execute(query.execution_options(yield_per=RESUMEN_LOTE_STREAM))
+                for r in filas:
+                    yield json.dumps(_incidente(r), ensure_ascii=False) + "\n"
+            finally:
+                db_stream.close()
+
+        return StreamingResponse(
+            generar(), media_type="application/x-ndjson", headers={"ETag": etag} if etag else None
+        )
+
+    filas = db.execute(query.limit(limit + 1)).fetchall()
+    if len(filas) > limit:
+        filas = filas[:limit]
+        ultima = filas[-1]
+        response.headers["X-Siguiente-Cursor"] = _codificar_cursor(ultima.occurrence_date, ultima.id)
 
-@router.get("/homicidios/tasa")
+    return [_incidente(r) for r in filas]
+
+@router.get("/homicidios/tasa", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_tasa_homicidios(
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None, 
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
     """
     Calcula la tasa de homicidios por cada 100k habitantes.
     Fórmula: (Nº Homicidios / 180,942) * 100,000
     """
-    query = db.query(func.count(Event.id)).join(EventType).filter(EventType.category == "HOMICIDIO")
-    
-    if start_date:
-        query = query.filter(Event.occurrence_date >= start_date)
-    if end_date:
-        query = query.filter(Event.occurrence_date <= end_date)
-    
-    conteo = query.scalar() or 0
+    agg = _fuente_agregada(espacial)
+    conteo = db.query(_suma(agg.c.total)).filter(
+        agg.c.categoria == "HOMICIDIO",
+        *_filtros_agregados(agg, start_date, end_date)
+    ).scalar() or 0
     tasa = (conteo / POBLACION_JAMUNDI) * 100000
     
     return {
@@ -250,32 +537,28 @@ def get_tasa_homicidios(
         "poblacion_referencia": POBLACION_JAMUNDI
     }
 
-@router.get("/estadisticas/comparativa")
+@router.get("/estadisticas/comparativa", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_comparativa_periodos(
     start1: date, 
     end1: date, 
     start2: date, 
     end2: date,
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
     """
     Compara dos periodos de tiempo seleccionados.
     Útil para comparaciones Año tras Año (YoY).
     """
+    agg = _fuente_agregada(espacial)
+
     def get_stats(s, e):
-        # Homicidios
-        homicidios = db.query(func.count(Event.id)).join(EventType).filter(
-            EventType.category == "HOMICIDIO",
-            Event.occurrence_date >= s,
-            Event.occurrence_date <= e
-        ).scalar() or 0
-        
-        # Otros delitos (Hurtos, Lesiones, etc)
-        otros = db.query(func.count(Event.id)).join(EventType).filter(
-            EventType.category != "HOMICIDIO",
-            Event.occurrence_date >= s,
-            Event.occurrence_date <= e
-        ).scalar() or 0
+        # Homicidios y otros delitos (Hurtos, Lesiones, etc) en una sola lectura del cubo
+        homicidios, otros = db.query(
+            _suma(agg.c.total, agg.c.categoria == "HOMICIDIO"),
+            _suma(agg.c.total, agg.c.categoria != "HOMICIDIO")
+        ).filter(*_filtros_agregados(agg, s, e)).one()
         
         return {"homicidios": homicidios, "otros": otros, "total": homicidios + otros}
 
@@ -296,41 +579,36 @@ def get_comparativa_periodos(
         }
     }
 
-@router.get("/eventos/geojson")
+@router.get("/eventos/geojson", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_eventos_geojson(
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None, 
     categories: Optional[List[str]] = Query(None),
     token: Optional[str] = Query(None),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
     db: Session = Depends(get_db)
 ):
     # Verificar permisos de roles
-    user = None
-    sensitive_access = False
-    
-    if token:
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            role_name = payload.get("role")
-            # Roles que pueden ver datos sensibles (Analista, Fuerza Pública, Admin)
-            if role_name in ["Administrador (Observatorio)", "Analista Institucional", "Enlace Fuerza Pública"]:
-                sensitive_access = True
-            user = db.query(User).filter(User.username == payload.get("sub")).first()
-        except:
-            pass
-
-    is_institutional = sensitive_access
+    is_institutional = _acceso_sensible(token)
 
-    query = db.query(
+    # Modo Abierto: coordenada generalizada precalculada (centro de celda), determinista
+    columna_geom = 'location_geom' if is_institutional else 'public_geom'
+    columnas = [
         Event.id,
         Event.occurrence_date,
         Event.barrio,
         Event.descripcion,
         EventType.category,
         EventType.subcategory,
-        func.ST_X(text('location_geom::geometry')).label('lng'),
-        func.ST_Y(text('location_geom::geometry')).label('lat')
-    ).join(EventType).filter(text('location_geom IS NOT NULL'))
+        func.ST_X(text(f'{columna_geom}::geometry')).label('lng'),
+        func.ST_Y(text(f'{columna_geom}::geometry')).label('lat')
+    ]
+    if not is_institutional:
+        # k-anonimato: cuántos eventos del conjunto consultado comparten la celda
+        columnas.append(func.count().over(partition_by=Event.celda_publica).label('conteo_celda'))
+
+    query = db.query(*columnas).join(EventType).filter(text(f'{columna_geom} IS NOT NULL'))
     
     # ... filters ...
     if start_date:
@@ -339,24 +617,25 @@ def get_eventos_geojson(
         query = query.filter(Event.occurrence_date <= end_date)
     
     if categories:
-        from sqlalchemy import or_
         query = query.filter(or_(*[EventType.category.ilike(f"%{cat}%") for cat in categories]))
-        
-    result = query.all()
+
+    if espacial:
+        query = query.filter(espacial.condicion())
+
+    if is_institutional:
+        result = query.order_by(Event.occurrence_date, Event.id).all()
+    else:
+        sub = query.subquery()
+        result = db.query(sub).filter(
+            sub.c.conteo_celda >= privacidad.K_MINIMO
+        ).order_by(sub.c.occurrence_date, sub.c.id).all()
     
     features = []
-    import random
     for row in result:
-        # Modo Abierto: Ofuscar coordenadas y ocultar descripción
+        # Modo Abierto: ocultar descripción
         lng = row.lng
         lat = row.lat
-        descripcion = row.descripcion
-        
-        if not is_institutional:
-            # Añadir ruido de ~50-100 metros para proteger privacidad
-            lng += random.uniform(-0.0005, 0.0005)
-            lat += random.uniform(-0.0005, 0.0005)
-            descripcion = "Detalle reservado (Modo Abierto)"
+        descripcion = row.descripcion if is_institutional else "Detalle reservado (Modo Abierto)"
 
         feature = {
             "type": "Feature",
@@ -381,18 +660,180 @@ def get_eventos_geojson(
         "mode": "Institutional" if is_institutional else "Public"
     }
 
-@router.get("/estadisticas/ultima-actualizacion")
+# Teselas vectoriales (MVT)
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+ZOOM_MAX = 22
+ZOOM_PUNTOS = 14          # Desde este zoom se entregan eventos individuales
+CELDAS_CLUSTER = 64       # Celdas de agrupación por lado de tesela en zooms bajos
+TESELA_MAX_AGE = 300
+
+@router.get("/eventos/tiles/{z}/{x}/{y}.mvt")
+def get_eventos_tile(
+    z: int,
+    x: int,
+    y: int,
+    start_date: Optional[date] = None, 
+    end_date: Optional[date] = None, 
+    categories: Optional[List[str]] = Query(None),
+    token: Optional[str] = Query(None),
+    etag: Optional[str] = Depends(etag_eventos),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
+    db: Session = Depends(get_db)
+):
+    """
+    Tesela vectorial (Mapbox Vector Tile) de eventos, generada con ST_AsMVT.
+    En zooms bajos los puntos se agrupan por grilla (capa con `total` y `homicidios`);
+    desde ZOOM_PUNTOS se entregan eventos individuales. Aplica las mismas reglas de
+    privacidad que /eventos/geojson: en modo abierto no hay id ni descripción, se usa
+    la coordenada generalizada (public_geom) y se suprimen celdas con menos de
+    privacidad.K_MINIMO eventos.
+    """
+    if not (0 <= z <= ZOOM_MAX and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Coordenadas de tesela fuera de rango")
+
+    is_institutional = _acceso_sensible(token)
+
+    columna_geom = "e.location_geom" if is_institutional else "e.public_geom"
+    filtros = [f"{columna_geom} IS NOT NULL", f"{columna_geom} && ST_Transform(t.envelope, 4326)"]
+    params = {"z": z, "x": x, "y": y, "extent": MVT_EXTENT, "buffer": MVT_BUFFER, "k": privacidad.K_MINIMO}
+    if start_date:
+        filtros.append("e.occurrence_date >= :start_date")
+        params["start_date"] = start_date
+    if end_date:
+        filtros.append("e.occurrence_date <= :end_date")
+        params["end_date"] = end_date
+    if categories:
+        filtros.append("et.category ILIKE ANY(:patrones)")
+        params["patrones"] = [f"%{cat}%" for cat in categories]
+    if espacial:
+        condicion, params_espaciales = espacial.condicion_sql(alias="e")
+        filtros.append(condicion)
+        params.update(params_espaciales)
+
+    puntos = f"""
+        SELECT e.id, e.occurrence_date, e.barrio, e.descripcion, et.category, et.subcategory,
+               ST_Transform({columna_geom}::geometry, 3857) AS geom,
+               COUNT(*) OVER (PARTITION BY e.celda_publica) AS conteo_celda
+        FROM events e
+        JOIN event_types et ON e.event_type_id = et.id
+        CROSS JOIN tesela t
+        WHERE {" AND ".join(filtros)}
+    """
+    if not is_institutional:
+        # k-anonimato sobre el conjunto filtrado (una celda nunca se parte entre teselas)
+        puntos = f"SELECT * FROM ({puntos}) pf WHERE pf.conteo_celda >= :k"
+
+    if z < ZOOM_PUNTOS:
+        # Tamaño de celda en metros (EPSG:3857) proporcional al ancho de la tesela
+        params["celda"] = 40075016.68557849 / (2 ** z) / CELDAS_CLUSTER
+        capa = """
+            SELECT ST_AsMVTGeom(ST_SnapToGrid(p.geom, :celda), t.envelope, :extent, :buffer, true) AS geom,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE p.category = 'HOMICIDIO') AS homicidios
+            FROM puntos p CROSS JOIN tesela t
+            GROUP BY ST_SnapToGrid(p.geom, :celda), t.envelope
+        """
+        nombre_capa = "clusters"
+    elif is_institutional:
+        capa = """
+            SELECT ST_AsMVTGeom(p.geom, t.envelope, :extent, :buffer, true) AS geom,
+                   p.id::text AS id, p.occurrence_date::text AS fecha, p.category AS categoria,
+                   p.subcategory AS subcategoria, p.barrio, p.descripcion
+            FROM puntos p CROSS JOIN tesela t
+        """
+        nombre_capa = "eventos"
+    else:
+        capa = """
+            SELECT ST_AsMVTGeom(p.geom, t.envelope, :extent, :buffer, true) AS geom,
+                   p.occurrence_date::text AS fecha, p.category AS categoria,
+                   p.subcategory AS subcategoria, p.barrio
+            FROM puntos p CROSS JOIN tesela t
+        """
+        nombre_capa = "eventos"
+
+    query_str = f"""
+        WITH tesela AS (SELECT ST_TileEnvelope(:z, :x, :y) AS envelope),
+        puntos AS ({puntos}),
+        capa AS ({capa})
+        SELECT ST_AsMVT(capa, '{nombre_capa}', :extent, 'geom') FROM capa
+    """
+    tile = db.execute(text(query_str), params).scalar()
+
+    # Cacheable por URL (los filtros y el token van en la query); privada si es institucional
+    visibilidad = "private" if is_institutional else "public"
+    return Response(
+        content=bytes(tile) if tile else b"",
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": f"{visibilidad}, max-age={TESELA_MAX_AGE}", **({"ETag": etag} if etag else {})}
+    )
+
+@router.get("/densidad", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
+def get_densidad(
+    start_date: Optional[date] = None, 
+    end_date: Optional[date] = None, 
+    categories: Optional[List[str]] = Query(None),
+    hex_m: float = Query(300, ge=50, le=5000, description="Radio del hexágono en metros"),
+    celda_m: float = Query(100, ge=20, le=2000, description="Resolución del raster KDE en metros"),
+    banda_m: float = Query(250, ge=50, le=5000, description="Ancho de banda (sigma) del KDE en metros"),
+    token: Optional[str] = Query(None),
+    espacial: Optional[FiltroEspacial] = Depends(filtro_espacial),
+    db: Session = Depends(get_db)
+):
+    """
+    Densidad espacial de eventos (docs/INDICADORES.md, Hotspots): conteo por grilla
+    hexagonal y superficie KDE gaussiana, calculadas con NumPy (histogram2d + FFT).
+    """
+    is_institutional = _acceso_sensible(token)
+
+    columna_geom = 'location_geom' if is_institutional else 'public_geom'
+    query = db.query(
+        func.ST_X(text(f'{columna_geom}::geometry')).label('lng'),
+        func.ST_Y(text(f'{columna_geom}::geometry')).label('lat')
+    ).join(EventType).filter(text(f'{columna_geom} IS NOT NULL'))
+    if start_date: query = query.filter(Event.occurrence_date >= start_date)
+    if end_date: query = query.filter(Event.occurrence_date <= end_date)
+    if categories:
+        query = query.filter(or_(*[EventType.category.ilike(f"%{cat}%") for cat in categories]))
+    if espacial: query = query.filter(espacial.condicion())
+
+    coords = np.array([(r.lng, r.lat) for r in query.all()], dtype=float).reshape(-1, 2)
+    lng, lat = coords[:, 0], coords[:, 1]
+
+    try:
+        resultado = {
+            "total_eventos": int(len(lng)),
+            "hexagonos": densidad.hexagonos(
+                lng, lat, hex_m, k_minimo=1 if is_institutional else privacidad.K_MINIMO
+            ),
+            "kde": densidad.kde(lng, lat, celda_m, banda_m),
+            "mode": "Institutional" if is_institutional else "Public"
+        }
+    except densidad.RasterDemasiadoGrande as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return resultado
+
+@router.get("/estadisticas/ultima-actualizacion", dependencies=[Depends(etag_eventos)])
+@cacheado(cache_analitica, version_datos.EVENTOS, _nivel_acceso)
 def get_ultima_fecha_datos(db: Session = Depends(get_db)):
     """
     Retorna el rango total de datos disponibles (primera y última fecha).
     Útil para mostrar la cobertura de datos en el Dashboard.
     """
+    agg = _fuente_agregada()
     stats = db.query(
-        func.min(Event.occurrence_date).label("min_date"),
-        func.max(Event.occurrence_date).label("max_date")
+        func.min(agg.c.fecha).label("min_date"),
+        func.max(agg.c.fecha).label("max_date")
     ).first()
     
     return {
         "fecha_inicial": stats.min_date if stats.min_date else date.today(),
         "ultima_fecha": stats.max_date if stats.max_date else date.today()
     }
+
+@router.get("/cache/estadisticas")
+def get_estadisticas_cache(current_user: User = Depends(analyst_or_admin)):
+    """Contadores de aciertos/fallos de las cachés de resultados (monitoreo)."""
+    return cache_resultados.estadisticas()
@@ -1,245 +1,281 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from db.models import get_db, Event, EventType
+from sqlalchemy import text
+from db.models import get_db, Event
 import pandas as pd
-import io
+import json
 import uuid
-from typing import List, Dict, Optional, Any
-from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional
+from datetime import date
 
 from api.auth import admin_only, analyst_or_admin
+from services import agregados, carga_eventos, categorias, geocodificacion, lectura_tabular, normalizacion, particiones, privacidad, territorios, version_datos, vista_previa
 
 router = APIRouter()
 
+# Máximo de errores por fila detallados en el reporte (el conteo total siempre se informa)
+MAX_ERRORES_REPORTE = 1000
+
 @router.post("/upload", dependencies=[Depends(analyst_or_admin)])
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
     Recibe un archivo Excel/CSV, procesa los datos y los inserta en PostGIS.
-    Reporta éxitos y fallos individuales por fila.
+    Reporta éxitos y fallos individuales por fila. Solo se omiten filas ya cargadas
+    con el mismo id_externo; hechos distintos con la misma fecha, hora, tipo y barrio
+    se insertan todos.
+    """
+    return procesar_archivo(file.file, file.filename, db)
+
+def procesar_archivo(archivo: BinaryIO, nombre: str, db: Session) -> Dict[str, Any]:
     """
-    contents = await file.read()
-    
+    Ingesta de un archivo de eventos (usado por /upload y por las subidas reanudables).
+    El archivo se lee por lotes desde disco, de modo que la memoria depende del
+    tamaño del lote (SISC_INGESTA_LOTE) y no del archivo.
+    """
+    report = {
+        "total": 0,
+        "success_count": 0,
+        "skipped_count": 0, # Filas ya cargadas con el mismo id_externo (dedup_hash)
+        "error_count": 0,
+        "errors": []
+    }
+
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        elif file.filename.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(io.BytesIO(contents))
-        else:
-            raise HTTPException(status_code=400, detail="Formato de archivo no soportado")
-
-        # Normalizar nombres de columnas a minúsculas
-        df.columns = [c.lower().strip() for c in df.columns]
-
-        required_cols = ['fecha', 'hora', 'delito', 'latitud', 'longitud']
-        if not all(col in df.columns for col in required_cols):
-            raise HTTPException(status_code=400, detail=f"Faltan columnas requeridas: {required_cols}")
-
-        report = {
-            "total": len(df),
-            "success_count": 0,
-            "error_count": 0,
-            "errors": []
-        }
+        fila_inicial = 2 # +1 por índice base 0, +1 por la fila de encabezado
+        for df in lectura_tabular.iterar_lotes(archivo, nombre):
+            # Normalizar nombres de columnas a minúsculas
+            df.columns = [str(c).lower().strip() for c in df.columns]
+
+            required_cols = carga_eventos.COLUMNAS_REQUERIDAS
+            if not all(col in df.columns for col in required_cols):
+                raise HTTPException(status_code=400, detail=f"Faltan columnas requeridas: {required_cols}")
+
+            # Validación vectorizada + COPY a staging + un INSERT ... SELECT con la geometría
+            validos, errores = carga_eventos.validar(df, fila_inicial)
+            altas = carga_eventos.cargar(db, validos)
+            agregados.registrar_altas(db, altas)
 
-        for index, row in df.iterrows():
-            row_num = index + 2 # +1 for 0-index, +1 for header row
-            try:
-                # 1. Validar y normalizar Categoría
-                delito_nombre = str(row.get('delito', '')).upper().strip()
-                if not delito_nombre:
-                    raise ValueError("El campo 'delito' no puede estar vacío")
-
-                event_type = db.query(EventType).filter(EventType.category == delito_nombre).first()
-                if not event_type:
-                    event_type = EventType(category=delito_nombre, is_delicto=True)
-                    db.add(event_type)
-                    db.flush()
-
-                # 2. Parsing de Fecha y Hora con validación
-                try:
-                    occ_date = pd.to_datetime(row['fecha']).date()
-                    occ_time = pd.to_datetime(row['hora']).time()
-                except Exception:
-                    raise ValueError(f"Formato de fecha/hora inválido (Fecha: {row['fecha']}, Hora: {row['hora']})")
-
-                # 3. Datos de Geometría
-                try:
-                    lng = float(row['longitud'])
-                    lat = float(row['latitud'])
-                    if not (-180 <= lng <= 180) or not (-90 <= lat <= 90):
-                        raise ValueError("Coordenadas fuera de rango válido")
-                except (ValueError, TypeError):
-                    raise ValueError(f"Coordenadas inválidas (Lat: {row.get('latitud')}, Lng: {row.get('longitud')})")
-
-                # 4. Crear el evento
-                new_event = Event(
-                    external_id=str(row.get('id_externo', uuid.uuid4())),
-                    event_type_id=event_type.id,
-                    occurrence_date=occ_date,
-                    occurrence_time=occ_time,
-                    barrio=str(row.get('barrio', 'Sin especificar')),
-                    descripcion=str(row.get('descripcion', '')),
-                    estado=str(row.get('estado', 'Abierto'))
-                )
-                db.add(new_event)
-                db.flush()
-
-                # 5. Insertar geometría PostGIS
-                db.execute(
-                    text("UPDATE events SET location_geom = ST_SetSRID(ST_Point(:lng, :lat), 4326) WHERE id = :id"),
-                    {"lng": lng, "lat": lat, "id": new_event.id}
-                )
-                
-                report["success_count"] += 1
-
-            except Exception as row_err:
-                report["error_count"] += 1
-                report["errors"].append({"fila": row_num, "error": str(row_err)})
+            report["total"] += len(df)
+            report["success_count"] += len(altas)
+            report["skipped_count"] += len(validos) - len(altas)
+            report["error_count"] += len(errores)
+            report["errors"].extend(errores[:MAX_ERRORES_REPORTE - len(report["errors"])])
+            fila_inicial += len(df)
 
+        privacidad.generalizar_pendientes(db)
+        version_datos.incrementar(db, version_datos.EVENTOS)
         db.commit()
         return {
             "status": "success" if report["error_count"] == 0 else "partial_success",
-            "message": f"Carga completada: {report['success_count']} éxitos, {report['error_count']} errores.",
+            "message": f"Carga completada: {report['success_count']} éxitos, {report['skipped_count']} duplicados omitidos, {report['error_count']} errores.",
             "report": report
         }
 
+    except lectura_tabular.FormatoNoSoportado as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
+        db.rollback()
         raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error fatal procesando el archivo: {str(e)}")
 
+@router.post("/preview", dependencies=[Depends(analyst_or_admin)])
+def preview_file(
+    file: UploadFile = File(...),
+    limite: int = Query(200, ge=1, le=vista_previa.LIMITE_MAX),
+    muestra: str = Query("primeras", pattern="^(primeras|estratificada)$")
+):
+    """
+    Vista previa de un archivo antes de importarlo: infiere el mapeo de columnas y
+    valida las primeras `limite` filas (o una muestra estratificada por tipo de delito)
+    con las mismas reglas de normalización que aplica /bulk al insertar. No escribe en la BD.
+    """
+    try:
+        return vista_previa.vista_previa(file.file, file.filename, limite, muestra)
+    except lectura_tabular.FormatoNoSoportado as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo: {str(e)}")
+
 @router.post("/bulk", dependencies=[Depends(analyst_or_admin)])
-async def bulk_upload(data: List[dict], db: Session = Depends(get_db)):
+def bulk_upload(data: List[dict], db: Session = Depends(get_db)):
     """
     Recibe una lista de eventos pre-analizados por la IA en JSON y los inserta.
+    Los duplicados (fecha, hora, tipo, barrio) se detectan en la base de datos con el
+    índice único de dedup_hash: un INSERT ... ON CONFLICT DO NOTHING por lote.
     """
     report = {
         "total": len(data),
         "success_count": 0,
         "skipped_count": 0,
         "error_count": 0,
-        "errors": []
+        "errors": [],
+        "geocoded_count": 0, # Sin coordenadas, ubicados por el nomenclátor (barrio exacto o contenido)
+        "geocoded_fuzzy_count": 0, # Sin coordenadas, ubicados por un barrio parecido: revisar
+        "geocoded_fuzzy_rows": [], # {index, barrio, coincidencia}
+        "default_point_count": 0, # Sin coordenadas ni barrio reconocido: punto por defecto
+        "barrio_corrected_count": 0, # Barrio de texto reemplazado por el del polígono que contiene el punto
+        "date_fallback_count": 0,
+        "time_fallback_count": 0,
+        # Filas (índice en `data`) sin fecha/hora interpretable: se cargaron con la fecha de hoy / 00:00
+        "date_fallback_rows": [],
+        "time_fallback_rows": []
     }
+    filas = []
+    # Normalización por columnas: categorías (una evaluación de reglas por valor distinto)
+    # y fechas/horas (formatos conocidos vectorizados; inferencia solo para el residuo)
+    tipos = categorias.EVENTOS.normalizar_serie(
+        pd.Series([str(item.get('tipo', '')).upper().strip() for item in data], dtype=object)
+    )
+    fechas, fecha_por_defecto = normalizacion.fechas_robustas(pd.Series([item.get('fecha') for item in data], dtype=object))
+    horas, hora_por_defecto = normalizacion.horas_robustas(pd.Series([item.get('hora') for item in data], dtype=object))
+    punto_defecto = set() # Posiciones en `filas` ubicadas en el punto por defecto
+    geocodificadas = set() # Posiciones en `filas` ubicadas por el nomenclátor de barrios
+    # Punto de referencia por barrio para las filas que lleguen sin coordenadas
+    nomenclator = geocodificacion.gazetteer(db)
+    lat_ref, lng_ref, tipo_ref = nomenclator.geocodificar_serie(
+        pd.Series([item.get('barrio') for item in data], dtype=object)
+    )
 
     for index, item in enumerate(data):
         try:
-            with db.begin_nested(): # SAVEPOINT: falla solo esta fila si algo sale mal
-                # 1. Validar Categoría
-                raw_delito = str(item.get('tipo', '')).upper().strip()
-                # Normalización inteligente
-                delito_nombre = raw_delito
-                if 'H.PERSONA' in raw_delito or raw_delito == 'H. PERSONAS': delito_nombre = 'HURTO A PERSONAS'
-                elif 'H.COMERCIO' in raw_delito: delito_nombre = 'HURTO A COMERCIO'
-                elif 'H.RESIDENCIA' in raw_delito: delito_nombre = 'HURTO A RESIDENCIAS'
-                elif 'H.MOTOS' in raw_delito: delito_nombre = 'HURTO A MOTOCICLETAS'
-                elif 'H.AUTOMO' in raw_delito: delito_nombre = 'HURTO A AUTOMOTORES'
-                elif 'L.PERSONALES' in raw_delito or 'LESIONES' in raw_delito: delito_nombre = 'LESIONES PERSONALES'
-                elif 'HOMICI' in raw_delito: delito_nombre = 'HOMICIDIO'
-                elif 'VIOLENCIA' in raw_delito or 'VIF' in raw_delito: delito_nombre = 'VIOLENCIA INTRAFAMILIAR'
-
-                event_type = db.query(EventType).filter(EventType.category == delito_nombre).first()
-                if not event_type:
-                    event_type = EventType(category=delito_nombre, is_delicto=True)
-                    db.add(event_type)
-                    db.flush()
-
-                # 2. Fecha y Hora
-                def parse_robust_time(val):
-                    if not val or str(val).lower() == 'undefined' or str(val).strip() == '':
-                        return datetime.strptime("00:00", "%H:%M").time()
-                    val_str = str(val).split('-')[0].strip()
-                    try:
-                        if ':' in val_str:
-                            parts = val_str.split(':')
-                            h = int(parts[0])
-                            m = int(parts[1]) if len(parts) > 1 else 0
-                            return datetime.strptime(f"{h:02d}:{m:02d}", "%H:%M").time()
-                        return pd.to_datetime(val_str).time()
-                    except:
-                        return datetime.strptime("00:00", "%H:%M").time()
-
-                def parse_robust_date(val):
-                    if not val or str(val).lower() == 'undefined':
-                        return datetime.now().date()
-                    try:
-                        return pd.to_datetime(val).date()
-                    except:
-                        try:
-                            val_clean = str(val).split(' ')[0]
-                            return pd.to_datetime(val_clean).date()
-                        except:
-                            return datetime.now().date()
-
-                occ_date = parse_robust_date(item.get('fecha'))
-                occ_time = parse_robust_time(item.get('hora'))
-                barrio = str(item.get('barrio', 'Sin especificar'))
-
-                # 2.5 DETECCIÓN DE DUPLICADOS (Opción B elegida por el usuario)
-                existing_event = db.query(Event).filter(
-                    Event.occurrence_date == occ_date,
-                    Event.occurrence_time == occ_time,
-                    Event.event_type_id == event_type.id,
-                    Event.barrio == barrio
-                ).first()
-
-                if existing_event:
-                    report["skipped_count"] += 1
-                    continue
-
-                # 3. Geometría
-                try:
-                    def clean_coord(c):
-                        if not c or str(c).lower() == 'undefined': return None
-                        return float(str(c).replace(',', '.'))
-                    lat = clean_coord(item.get('latitud')) or 3.26
-                    lng = clean_coord(item.get('longitud')) or -76.53
-                except:
-                    lat, lng = 3.26, -76.53
-
-                # 4. Crear Evento
-                new_event = Event(
-                    external_id=str(item.get('id_externo', uuid.uuid4())),
-                    event_type_id=event_type.id,
-                    occurrence_date=occ_date,
-                    occurrence_time=occ_time,
-                    barrio=barrio,
-                    descripcion=str(item.get('descripcion', '')),
-                    estado=str(item.get('estado', 'Abierto'))
-                )
-                db.add(new_event)
-                db.flush()
-
-                # 5. PostGIS
-                db.execute(
-                    text("UPDATE events SET location_geom = ST_SetSRID(ST_Point(:lng, :lat), 4326) WHERE id = :id"),
-                    {"lng": lng, "lat": lat, "id": new_event.id}
-                )
-                report["success_count"] += 1
-            
-            # Commit masivo cada 50 filas (Mucho más rápido)
-            if index % 50 == 0:
-                db.commit()
+            # 1. Validar Categoría
+            delito_nombre = tipos.iat[index]
+            if len(delito_nombre) > 50:
+                raise ValueError(f"El campo 'tipo' excede 50 caracteres ({delito_nombre[:20]}...)")
 
+            # 2. Fecha y Hora
+            occ_date = fechas.iat[index]
+            occ_time = horas.iat[index]
+            if fecha_por_defecto[index]:
+                report["date_fallback_count"] += 1
+                if len(report["date_fallback_rows"]) < MAX_ERRORES_REPORTE:
+                    report["date_fallback_rows"].append(index)
+            if hora_por_defecto[index]:
+                report["time_fallback_count"] += 1
+                if len(report["time_fallback_rows"]) < MAX_ERRORES_REPORTE:
+                    report["time_fallback_rows"].append(index)
+
+            # 3. Geometría
+            lat = normalizacion.limpiar_coordenada(item.get('latitud'))
+            lng = normalizacion.limpiar_coordenada(item.get('longitud'))
+            if not lat or not lng:
+                if pd.notna(lat_ref.iat[index]):
+                    lat, lng = float(lat_ref.iat[index]), float(lng_ref.iat[index])
+                    geocodificadas.add(len(filas))
+                    if tipo_ref.iat[index] == geocodificacion.APROXIMADO:
+                        report["geocoded_fuzzy_count"] += 1
+                        if len(report["geocoded_fuzzy_rows"]) < MAX_ERRORES_REPORTE:
+                            report["geocoded_fuzzy_rows"].append({
+                                "index": index,
+                                "barrio": item.get('barrio'),
+                                "coincidencia": nomenclator.coincidencia(item.get('barrio'))[0],
+                            })
+                    else:
+                        report["geocoded_count"] += 1
+                else:
+                    lat, lng = normalizacion.LAT_DEFECTO, normalizacion.LNG_DEFECTO
+                    report["default_point_count"] += 1
+                    punto_defecto.add(len(filas))
+
+            filas.append({
+                "categoria": delito_nombre,
+                "fecha": occ_date,
+                "hora": occ_time,
+                "barrio": str(item.get('barrio', 'Sin especificar'))[:100],
+                "descripcion": str(item.get('descripcion', '')),
+                "estado": str(item.get('estado', 'Abierto'))[:50],
+                "external_id": str(item.get('id_externo', uuid.uuid4()))[:100],
+                "lng": lng,
+                "lat": lat,
+            })
         except Exception as e:
-            # El uso de begin_nested() hace rollback automático de ESTA fila si falla
             report["error_count"] += 1
-            report["errors"].append({"index": index, "error": str(e)})
+            if len(report["errors"]) < MAX_ERRORES_REPORTE:
+                report["errors"].append({"index": index, "error": str(e)})
+
+    # Territorio por punto en polígono, en un solo join espacial para todo el lote
+    # (el punto por defecto no dice nada del barrio real y se deja sin territorio).
+    # El barrio solo se corrige en filas con coordenadas propias: las ubicadas por el
+    # nomenclátor tienen el punto de referencia de su propio barrio
+    ubicables = [i for i in range(len(filas)) if i not in punto_defecto]
+    if ubicables:
+        territorios_ids, barrios = carga_eventos.asignar_territorios(
+            [filas[i]["lng"] for i in ubicables], [filas[i]["lat"] for i in ubicables],
+            [filas[i]["barrio"] for i in ubicables],
+            coordenadas_fuente=[i not in geocodificadas for i in ubicables]
+        )
+        for i, territorio, barrio in zip(ubicables, territorios_ids, barrios):
+            fila = filas[i]
+            fila["territory_id"] = None if pd.isna(territorio) else int(territorio)
+            if barrio != fila["barrio"]:
+                fila["barrio"] = barrio
+                report["barrio_corrected_count"] += 1
+
+    try:
+        altas = carga_eventos.insertar(db, filas)
+        agregados.registrar_altas(db, altas)
+        privacidad.generalizar_pendientes(db)
+        version_datos.incrementar(db, version_datos.EVENTOS)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error fatal en la carga masiva: {str(e)}")
 
-    db.commit() # Commit final de lo que quede pendiente
+    report["success_count"] = len(altas)
+    report["skipped_count"] = len(filas) - len(altas)
     return {
         "status": "success" if report["error_count"] == 0 else "partial_success",
         "message": f"Carga masiva completada: {report['success_count']} nuevos, {report['skipped_count']} duplicados omitidos.",
         "report": report
     }
 
+@router.post("/territorios", dependencies=[Depends(admin_only)])
+def cargar_territorios(
+    file: UploadFile = File(...),
+    tipo: str = Query(..., description="BARRIO, VEREDA, CORREGIMIENTO o COMUNA"),
+    campo_nombre: str = Query("name", description="Propiedad del feature con el nombre"),
+    campo_codigo: Optional[str] = Query(None, description="Propiedad del feature con el código"),
+    db: Session = Depends(get_db)
+):
+    """
+    Carga polígonos (GeoJSON FeatureCollection en EPSG:4326) en `territories`. Las
+    cargas siguientes asignan territorio y barrio por punto en polígono; para los
+    eventos existentes use `python asignar_territorios.py`.
+    """
+    try:
+        geojson = json.load(file.file)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El archivo no es un GeoJSON válido")
+    try:
+        cargados = territorios.cargar_geojson(db, geojson, tipo, campo_nombre, campo_codigo)
+        db.commit()
+    except territorios.TerritorioInvalido as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error cargando territorios: {str(e)}")
+    return {"message": f"{cargados} territorios de tipo {tipo.upper()} cargados", "total": cargados}
+
 @router.delete("/clear", dependencies=[Depends(analyst_or_admin)])
-def clear_all_events(db: Session = Depends(get_db)):
-    """Elimina todos los eventos de la base de datos"""
-    db.query(Event).delete()
+def clear_all_events(anio: Optional[int] = Query(None, ge=1900, le=2100), db: Session = Depends(get_db)):
+    """
+    Elimina todos los eventos (o solo los del año `anio`) con TRUNCATE de la tabla o de
+    la partición anual, sin recorrer las filas.
+    """
+    if anio is None:
+        db.execute(text("TRUNCATE events"))
+        agregados.vaciar(db)
+        mensaje = "Base de datos de eventos limpiada correctamente"
+    else:
+        particiones.vaciar_anio(db, anio)
+        agregados.vaciar_periodo(db, date(anio, 1, 1), date(anio + 1, 1, 1))
+        mensaje = f"Eventos de {anio} eliminados correctamente"
+    version_datos.incrementar(db, version_datos.EVENTOS)
     db.commit()
-    return {"message": "Base de datos de eventos limpiada correctamente"}
+    return {"message": mensaje}
 
 @router.delete("/{event_id}", dependencies=[Depends(analyst_or_admin)])
 def delete_event(event_id: uuid.UUID, db: Session = Depends(get_db)):
@@ -247,6 +283,8 @@ def delete_event(event_id: uuid.UUID, db: Session = Depends(get_db)):
     event = db.query(Event).filter(Event.id == event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Evento no encontrado")
+    agregados.registrar_bajas(db, [(event.occurrence_date, event.event_type.category, event.barrio)])
     db.delete(event)
+    version_datos.incrementar(db, version_datos.EVENTOS)
     db.commit()
     return {"message": "Evento eliminado correctamente"}
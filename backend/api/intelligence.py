@@ -5,15 +5,20 @@ from api.auth import get_current_user
 from db.models import User
 from db.models_intelligence import NationalCrimeStats, IngestionLog
 from services.scraper_mindefensa import MinDefensaScraper
-from services.excel_processor import NationalStatsProcessor
+from services.excel_processor import ArchivoNoProcesable, NationalStatsProcessor
+from services import carga_nacional, ingesta_nacional, version_datos
+from core.cache_http import etag_nacional
+from core.cache_resultados import CacheResultados, cacheado
+import asyncio
 import logging
 from datetime import datetime
+from typing import BinaryIO
 
 router = APIRouter(tags=["Intelligence"])
 logger = logging.getLogger("sisc_api")
 
 @router.post("/upload")
-async def upload_intelligence_file(
+def upload_intelligence_file(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -24,65 +29,57 @@ async def upload_intelligence_file(
     """
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos Excel (.xlsx, .xls)")
+    return procesar_archivo_nacional(file.file, file.filename, db)
 
+def procesar_archivo_nacional(archivo: BinaryIO, filename: str, db: Session):
+    """
+    Ingesta de un Excel de MinDefensa (usado por /upload y por las subidas reanudables).
+    El Excel se lee desde disco (sin copiarlo a memoria) y los registros se cargan con
+    COPY + INSERT ... ON CONFLICT: los ya existentes (mismo hash) se omiten.
+    """
     # Crear log de inicio
     log_entry = IngestionLog(
         estado="IN_PROGRESS",
         registros_insertados=0,
         errores=None,
-        detalles={"filename": file.filename}
+        detalles={"filename": filename}
     )
     db.add(log_entry)
     db.commit()
     db.refresh(log_entry)
 
     try:
-        contents = await file.read()
         processor = NationalStatsProcessor()
         
-        # Procesar generator
-        records_generator = processor.process_excel(contents, file.filename)
-        
-        count = 0
-        batch = []
-        BATCH_SIZE = 1000
-        
-        for record in records_generator:
-            # Crear modelo
-            db_record = NationalCrimeStats(**record)
-            batch.append(db_record)
-            
-            if len(batch) >= BATCH_SIZE:
-                db.bulk_save_objects(batch)
-                db.commit()
-                count += len(batch)
-                batch = []
-        
-        # Guardar remanente
-        if batch:
-            db.bulk_save_objects(batch)
-            db.commit()
-            count += len(batch)
+        # Procesar generator de lotes (columnas listas para cargar)
+        archivo.seek(0)
+        count, skipped = carga_nacional.cargar(db, processor.process_excel(archivo, filename))
+        if count:
+            version_datos.incrementar(db, version_datos.NACIONAL)
             
         # Actualizar log exitoso
         log_entry.estado = "SUCCESS"
         log_entry.registros_insertados = count
+        log_entry.detalles = {**log_entry.detalles, "skipped": skipped}
         log_entry.fecha_fin = datetime.utcnow()
         db.commit()
         
         return {
             "message": "Archivo procesado exitosamente",
-            "filename": file.filename,
-            "records_inserted": count
+            "filename": filename,
+            "records_inserted": count,
+            "records_skipped": skipped
         }
         
     except Exception as e:
-        # Log error
+        # Log error (la transacción de la carga quedó abortada)
+        db.rollback()
         log_entry.estado = "ERROR"
         log_entry.errores = str(e)
         log_entry.fecha_fin = datetime.utcnow()
         db.commit()
-        raise HTTPException(status_code=500, detail=f"Error procesando archivo: {str(e)}")
+        status = 400 if isinstance(e, ArchivoNoProcesable) else 500
+        raise HTTPException(status_code=status, detail=f"Error procesando archivo: {str(e)}")
 
 @router.post("/ingest")
 async def trigger_ingestion(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
@@ -110,59 +107,53 @@ def run_ingestion_process(log_id: int, db: Session): # Session here might be clo
     try:
         log = db_bg.query(IngestionLog).get(log_id)
         scraper = MinDefensaScraper()
-        processor = NationalStatsProcessor()
         
         files = scraper.fetch_available_files()
         log.detalles = {"found_files": len(files), "file_list": [f['name'] for f in files]}
         db_bg.commit()
         
+        # Descarga concurrente y condicional; los archivos idénticos a la última ingesta se omiten
+        descargas = asyncio.run(scraper.descargar(files))
+        log.detalles = {
+            **log.detalles,
+            "unchanged_files": [f['name'] for f in descargas if f['estado'] == "sin_cambios"],
+            "failed_files": [f['name'] for f in descargas if f['estado'] == "error"],
+        }
+        db_bg.commit()
+        
         total_inserted = 0
         processed_files = 0
+        por_archivo = []
         
-        for file_info in files:
-            # Descargar
-            content = scraper.download_file(file_info['url'])
-            if not content:
+        # Lectura en paralelo (pool de procesos); la carga a la BD se hace aquí, un archivo a la vez
+        nuevos = [f for f in descargas if f['estado'] == "nuevo"]
+        for file_info, tabla, error in ingesta_nacional.parsear_archivos(nuevos):
+            if error:
+                por_archivo.append({"file": file_info['name'], "error": error})
                 continue
-                
-            # Procesar
-            # Convertir generador a lista para inserción masiva (bulk es mejor)
-            records = []
-            inferred_delito = file_info.get('category')
+            lotes = [tabla.to_pandas()] if tabla is not None else []
             
-            for record_dict in processor.process_excel(content, file_info['name'], inferred_delito):
-                # Crear instancia de modelo
-                db_record = NationalCrimeStats(**record_dict)
-                records.append(db_record)
-            
-            if records:
-                # Bulk save with duplicate prevention handling
-                try:
-                    # Usamos una técnica de "insert ignore" o similar si el DB lo soporta, 
-                    # o simplemente capturamos la excepción de integridad.
-                    # SQL Alchemy bulk_save_objects no maneja bien ON CONFLICT.
-                    # Por ahora, insertamos uno a uno o capturamos el error del batch.
-                    db_bg.bulk_save_objects(records)
-                    db_bg.commit()
-                    total_inserted += len(records)
-                except Exception as batch_err:
-                    db_bg.rollback()
-                    logger.warning(f"Error en batch de {file_info['name']}, intentando inserción individual: {batch_err}")
-                    # Fallback a inserción individual para ignorar duplicados
-                    for r in records:
-                        try:
-                            db_bg.add(r)
-                            db_bg.commit()
-                            total_inserted += 1
-                        except Exception:
-                            db_bg.rollback() # Ignorar duplicado (hash_registro unique constraint)
-                            continue
+            # Un COPY + INSERT ... ON CONFLICT por archivo: los duplicados se omiten en la BD
+            try:
+                insertados, omitidos = carga_nacional.cargar(db_bg, lotes)
+                if insertados:
+                    version_datos.incrementar(db_bg, version_datos.NACIONAL)
+                db_bg.commit()
+            except Exception as carga_err:
+                db_bg.rollback()
+                logger.error(f"Error cargando {file_info['name']}: {carga_err}")
+                por_archivo.append({"file": file_info['name'], "error": str(carga_err)})
+                continue
             
+            total_inserted += insertados
+            por_archivo.append({"file": file_info['name'], "inserted": insertados, "skipped": omitidos})
+            scraper.cache.marcar_procesado(file_info['url'], file_info['sha256'])
             processed_files += 1
             
         log.estado = "SUCCESS"
         log.archivos_procesados = processed_files
         log.registros_insertados = total_inserted
+        log.detalles = {**log.detalles, "files": por_archivo}
         log.fecha_fin = datetime.utcnow()
         db_bg.commit()
         
@@ -176,8 +167,12 @@ def run_ingestion_process(log_id: int, db: Session): # Session here might be clo
     finally:
         db_bg.close()
 
-@router.get("/stats")
-async def get_national_stats(municipio: str = "JAMUNDI", anio: int = 2025, db: Session = Depends(get_db)):
+# Respuestas de /stats en memoria (ver core/cache_resultados.py)
+cache_inteligencia = CacheResultados("inteligencia")
+
+@router.get("/stats", dependencies=[Depends(etag_nacional)])
+@cacheado(cache_inteligencia, version_datos.NACIONAL)
+def get_national_stats(municipio: str = "JAMUNDI", anio: int = 2025, db: Session = Depends(get_db)):
     """
     Retorna estadísticas comparativas reales basadas en los datos cargados.
     """
@@ -0,0 +1,144 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Optional
+
+from db.models import get_db, User
+from api.auth import analyst_or_admin
+from api.ingesta import procesar_archivo
+from api.intelligence import procesar_archivo_nacional
+from services import subidas
+
+router = APIRouter()
+
+# Protocolo de subida reanudable inspirado en tus (https://tus.io):
+#   POST   /ingesta/subidas                  -> crea la sesión (Location + Upload-Offset: 0)
+#   HEAD   /ingesta/subidas/{id}             -> Upload-Offset / Upload-Length actuales
+#   PATCH  /ingesta/subidas/{id}             -> agrega bytes en Upload-Offset
+#   POST   /ingesta/subidas/{id}/finalizar   -> verifica SHA-256 (archivo o cadena de trozos) e ingesta
+TUS_VERSION = "1.0.0"
+
+class SubidaCreate(BaseModel):
+    filename: str
+    size: int
+    destino: str = "eventos" # eventos (/ingesta/upload) | nacional (/api/intelligence/upload)
+    sha256: Optional[str] = None # Hash hexadecimal del archivo completo, se verifica al finalizar
+
+class SubidaFinalizar(BaseModel):
+    sha256: Optional[str] = None
+    # SHA-256 de la concatenación de los SHA-256 de cada trozo enviado, en orden
+    # (para clientes que no pueden calcular el hash del archivo completo de forma incremental)
+    sha256_trozos: Optional[str] = None
+
+def _sesion(subida_id: str, usuario: User):
+    try:
+        meta = subidas.obtener(subida_id)
+    except subidas.SubidaNoEncontrada:
+        raise HTTPException(status_code=404, detail="Subida no encontrada o expirada")
+    if meta.get("usuario") != usuario.username:
+        raise HTTPException(status_code=404, detail="Subida no encontrada o expirada")
+    return meta
+
+def _cabeceras(meta, offset=None):
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(meta["offset"] if offset is None else offset),
+        "Upload-Length": str(meta["tamano"]),
+        "Cache-Control": "no-store"
+    }
+
+@router.post("", status_code=201)
+def crear_subida(datos: SubidaCreate, response: Response, current_user: User = Depends(analyst_or_admin)):
+    """Crea una sesión de subida reanudable; los trozos se guardan en el spool local."""
+    if datos.destino == "nacional" and not datos.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos Excel (.xlsx, .xls)")
+    if datos.destino == "eventos" and not datos.filename.lower().endswith(('.csv', '.xls', '.xlsx')):
+        raise HTTPException(status_code=400, detail="Formato de archivo no soportado")
+    try:
+        meta = subidas.crear(datos.filename, datos.size, datos.destino, datos.sha256, current_user.username)
+    except subidas.SubidaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response.headers.update(_cabeceras(meta, 0))
+    response.headers["Location"] = f"/ingesta/subidas/{meta['id']}"
+    return {"id": meta["id"], "offset": 0, "size": meta["tamano"], "trozo_max": subidas.TROZO_MAX}
+
+@router.head("/{subida_id}")
+def consultar_offset(subida_id: str, current_user: User = Depends(analyst_or_admin)):
+    """Offset confirmado, para reanudar tras un corte."""
+    meta = _sesion(subida_id, current_user)
+    return Response(status_code=200, headers=_cabeceras(meta))
+
+@router.get("/{subida_id}")
+def estado_subida(subida_id: str, response: Response, current_user: User = Depends(analyst_or_admin)):
+    """Igual que HEAD, con el estado en el cuerpo (útil desde el navegador)."""
+    meta = _sesion(subida_id, current_user)
+    response.headers.update(_cabeceras(meta))
+    return {"id": meta["id"], "filename": meta["nombre_archivo"], "destino": meta["destino"],
+            "offset": meta["offset"], "size": meta["tamano"]}
+
+@router.patch("/{subida_id}", status_code=204)
+async def escribir_trozo(
+    subida_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    current_user: User = Depends(analyst_or_admin)
+):
+    """
+    Agrega un trozo en `Upload-Offset`. Si el offset no coincide con lo recibido responde
+    409 con el offset correcto en `Upload-Offset` para que el cliente reanude desde ahí.
+    """
+    meta = _sesion(subida_id, current_user)
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type debe ser application/offset+octet-stream")
+
+    datos = bytearray()
+    async for parte in request.stream():
+        datos.extend(parte)
+        if len(datos) > subidas.TROZO_MAX:
+            raise HTTPException(status_code=413, detail="Trozo demasiado grande")
+
+    try:
+        offset = await run_in_threadpool(subidas.escribir, subida_id, upload_offset, bytes(datos), upload_checksum)
+    except subidas.ConflictoOffset as e:
+        raise HTTPException(status_code=409, detail=str(e), headers=_cabeceras(meta, e.esperado))
+    except subidas.ChecksumInvalido as e:
+        raise HTTPException(status_code=460, detail=str(e)) # 460 = Checksum Mismatch en tus
+    except subidas.SubidaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except subidas.SubidaNoEncontrada:
+        raise HTTPException(status_code=404, detail="Subida no encontrada o expirada")
+
+    return Response(status_code=204, headers=_cabeceras(meta, offset))
+
+@router.post("/{subida_id}/finalizar")
+def finalizar_subida(
+    subida_id: str,
+    datos: Optional[SubidaFinalizar] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(analyst_or_admin)
+):
+    """Verifica tamaño y SHA-256 y ejecuta la ingesta del destino de la sesión."""
+    _sesion(subida_id, current_user)
+    try:
+        meta = subidas.completar(
+            subida_id, datos.sha256 if datos else None, datos.sha256_trozos if datos else None
+        )
+    except subidas.ChecksumInvalido as e:
+        raise HTTPException(status_code=460, detail=str(e))
+    except subidas.HashRequerido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except subidas.SubidaInvalida as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    with open(meta["ruta"], "rb") as archivo:
+        if meta["destino"] == "nacional":
+            resultado = procesar_archivo_nacional(archivo, meta["nombre_archivo"], db)
+        else:
+            resultado = procesar_archivo(archivo, meta["nombre_archivo"], db)
+
+    # Si la ingesta falla (HTTPException) la sesión se conserva para reintentar el finalizado
+    subidas.eliminar(subida_id)
+    return resultado
@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+from datetime import date
+
+# Añadir el directorio actual al path para que las importaciones funcionen
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db.models import SessionLocal
+from services import particiones
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporta las particiones anuales frías de events a Parquet (zstd) y opcionalmente las elimina de la BD."
+    )
+    parser.add_argument("--directorio", default=os.getenv("SISC_ARCHIVO_DIR", "archivo_eventos"),
+                        help="Carpeta local donde se escriben los archivos events_y<año>.parquet")
+    parser.add_argument("--mantener", type=int, default=2,
+                        help="Años recientes que se consideran activos y no se archivan (incluye el actual)")
+    parser.add_argument("--anio", type=int, action="append", help="Archivar solo este año (repetible)")
+    parser.add_argument("--eliminar", action="store_true",
+                        help="Separar y eliminar cada partición después de exportarla y verificarla")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        limite = date.today().year - args.mantener + 1
+        anios = args.anio or [a for a in particiones.existentes(db) if a < limite]
+        if not anios:
+            print("- No hay particiones frías para archivar.")
+            return
+        for anio in anios:
+            # Un commit por partición: lo ya archivado no se pierde si falla una posterior
+            resultado = particiones.archivar(db, anio, args.directorio, eliminar=args.eliminar)
+            db.commit()
+            destino = resultado["archivo"] or "sin filas, no se escribió archivo"
+            accion = " (partición eliminada)" if resultado["eliminada"] else ""
+            print(f"- {anio}: {resultado['filas']} eventos -> {destino}{accion}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
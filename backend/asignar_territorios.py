@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+import sys
+
+# Añadir el directorio actual al path para que las importaciones funcionen
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db.models import SessionLocal
+from services import territorios
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Carga polígonos de territorios y asigna territory_id (y opcionalmente el barrio) a los eventos existentes."
+    )
+    parser.add_argument("--geojson", help="FeatureCollection (EPSG:4326) a cargar antes de asignar")
+    parser.add_argument("--tipo", help="Tipo de los polígonos del GeoJSON: BARRIO, VEREDA, CORREGIMIENTO o COMUNA")
+    parser.add_argument("--campo-nombre", default="name", help="Propiedad con el nombre del territorio")
+    parser.add_argument("--campo-codigo", default=None, help="Propiedad con el código del territorio")
+    parser.add_argument("--reescribir-barrio", action="store_true",
+                        help="Reemplazar el barrio de texto por el del polígono que contiene el punto")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.geojson:
+            if not args.tipo:
+                parser.error("--geojson requiere --tipo")
+            with open(args.geojson, encoding="utf-8") as f:
+                cargados = territorios.cargar_geojson(db, json.load(f), args.tipo, args.campo_nombre, args.campo_codigo)
+            print(f"- {cargados} territorios de tipo {args.tipo.upper()} cargados.")
+
+        resultado = territorios.backfill(db, reescribir_barrio=args.reescribir_barrio)
+        db.commit()
+        print(f"- Eventos con territorio actualizado: {resultado['territorios_asignados']}")
+        if args.reescribir_barrio:
+            print(f"- Eventos con barrio reescrito: {resultado['barrios_reescritos']}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import hashlib
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from db.models import get_db
+from services import version_datos
+
+
+def _coincide(if_none_match: str, etag: str) -> bool:
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+
+def etag_por_version(dominio: str):
+    """
+    Dependencia para GETs cuyos resultados solo cambian al ingerir/borrar datos.
+    El ETag se deriva de la versión del dominio + ruta + parámetros de la query
+    (incluye `token`, por lo que distingue Modo Abierto e institucional).
+    Si coincide con `If-None-Match`, responde 304 antes de ejecutar el endpoint.
+    Retorna el ETag para los endpoints que construyen su propio `Response`, o None
+    si la versión no se pudo leer (BD caída): la respuesta sale sin ETag y el
+    endpoint puede servir su caché de resultados (core/cache_resultados.py).
+    """
+    def dependencia(request: Request, response: Response, db: Session = Depends(get_db)) -> Optional[str]:
+        try:
+            version = version_datos.obtener(db, dominio)
+        except SQLAlchemyError:
+            db.rollback()
+            return None
+        params = urlencode(sorted(request.query_params.multi_items()))
+        firma = f"{dominio}:{version}:{request.url.path}?{params}"
+        etag = f'W/"{hashlib.sha256(firma.encode()).hexdigest()[:32]}"'
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _coincide(if_none_match, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        response.headers.setdefault("Cache-Control", "no-cache")
+        return etag
+
+    return dependencia
+
+
+etag_eventos = etag_por_version(version_datos.EVENTOS)
+etag_nacional = etag_por_version(version_datos.NACIONAL)
@@ -0,0 +1,257 @@
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from services import version_datos
+
+logger = logging.getLogger("sisc_api")
+
+TTL_S = int(os.getenv("SISC_CACHE_TTL", "300"))
+STALE_S = int(os.getenv("SISC_CACHE_STALE", "3600"))
+MAX_ENTRADAS = int(os.getenv("SISC_CACHE_MAX", "256"))
+# Presupuesto de memoria por caché (estimado con sys.getsizeof, ver _tamano)
+MAX_BYTES = int(os.getenv("SISC_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Los recálculos en segundo plano comparten un pool pequeño para no saturar la BD
+_refrescos = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresco")
+
+
+def _tamano(valor) -> int:
+    """Bytes aproximados que ocupa `valor` (suma de sys.getsizeof de todo el árbol de contenedores)."""
+    total, pendientes, vistos = 0, [valor], set()
+    while pendientes:
+        v = pendientes.pop()
+        if id(v) in vistos:
+            continue
+        vistos.add(id(v))
+        total += sys.getsizeof(v)
+        if isinstance(v, dict):
+            pendientes.extend(v.keys())
+            pendientes.extend(v.values())
+        elif isinstance(v, (list, tuple, set, frozenset)):
+            pendientes.extend(v)
+    return total
+
+
+class _Entrada:
+    __slots__ = ("valor", "version", "creado", "bytes")
+
+    def __init__(self, valor, version: int):
+        self.valor = valor
+        self.version = version
+        self.creado = time.monotonic()
+        self.bytes = _tamano(valor)
+
+
+class CacheResultados:
+    """
+    Caché en memoria de respuestas de endpoints de solo lectura.
+
+    - LRU acotada a `max_entradas` y a `max_bytes` de memoria estimada (las respuestas
+      grandes, como los rásters de /densidad, cuentan por su tamaño; una respuesta que
+      por sí sola supera el presupuesto no se guarda); cada entrada guarda la versión de datos con la
+      que se calculó (services/version_datos), así una ingesta la invalida.
+    - Fresca durante `ttl` s. Entre `ttl` y `ttl + stale` se sirve la respuesta
+      anterior y se recalcula en segundo plano (stale-while-revalidate).
+    - Single-flight: peticiones concurrentes con la misma clave esperan un único cálculo.
+    - Si la BD falla, se sirve la última respuesta válida de esa clave, aunque sea antigua.
+    """
+
+    def __init__(self, nombre: str, ttl: int = TTL_S, stale: int = STALE_S,
+                 max_entradas: int = MAX_ENTRADAS, max_bytes: int = MAX_BYTES):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        self._datos: "OrderedDict[Hashable, _Entrada]" = OrderedDict()
+        self._en_vuelo: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._contadores = dict.fromkeys(
+            ("aciertos", "aciertos_stale", "fallos", "compartidos",
+             "refrescos", "respaldos", "errores", "expulsiones"), 0
+        )
+        _registro[nombre] = self
+
+    def _contar(self, contador: str):
+        # Llamar con self._lock tomado
+        self._contadores[contador] += 1
+
+    def _guardar(self, clave: Hashable, valor, version: int):
+        entrada = _Entrada(valor, version)
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior.bytes
+            if entrada.bytes > self.max_bytes:
+                self._contar("expulsiones")
+                return
+            self._datos[clave] = entrada
+            self._bytes += entrada.bytes
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                _, expulsada = self._datos.popitem(last=False)
+                self._bytes -= expulsada.bytes
+                self._contar("expulsiones")
+
+    def _respaldo(self, clave: Hashable, error: Exception):
+        """Última respuesta conocida de la clave o, si no hay, el error original."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            self._contar("respaldos" if entrada else "errores")
+        if entrada is None:
+            raise error
+        logger.warning(f"Cache {self.nombre}: BD no disponible, sirviendo respuesta anterior ({error})")
+        return entrada.valor
+
+    def _calcular(self, clave: Hashable, version: int, calcular: Callable[[Session], Any],
+                  db: Session, futuro: Future):
+        try:
+            valor = calcular(db)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            self._guardar(clave, valor, version)
+            futuro.set_result(valor)
+            return valor
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+    def _refrescar(self, clave: Hashable, version: int, calcular: Callable[[Session], Any],
+                   futuro: Future):
+        from db.models import SessionLocal
+        db = SessionLocal()
+        try:
+            self._calcular(clave, version, calcular, db, futuro)
+        except Exception as e:
+            logger.warning(f"Cache {self.nombre}: error recalculando en segundo plano: {e}")
+        finally:
+            db.close()
+
+    def obtener(self, clave: Hashable, version: Optional[int],
+                calcular: Callable[[Session], Any], db: Session):
+        """
+        Retorna el resultado de `calcular(db)` para la clave, usando la caché.
+        `version` es la versión actual de los datos (None si no se pudo leer de la BD).
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and version is None:
+                self._contar("respaldos")
+                return entrada.valor
+            if entrada is not None and entrada.version == version:
+                edad = ahora - entrada.creado
+                if edad < self.ttl:
+                    self._datos.move_to_end(clave)
+                    self._contar("aciertos")
+                    return entrada.valor
+                if edad < self.ttl + self.stale:
+                    self._datos.move_to_end(clave)
+                    self._contar("aciertos_stale")
+                    if clave not in self._en_vuelo:
+                        futuro = Future()
+                        self._en_vuelo[clave] = futuro
+                        self._contar("refrescos")
+                        _refrescos.submit(self._refrescar, clave, version, calcular, futuro)
+                    return entrada.valor
+
+            futuro = self._en_vuelo.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = Future()
+                self._en_vuelo[clave] = futuro
+                self._contar("fallos")
+            else:
+                self._contar("compartidos")
+
+        try:
+            if propio:
+                return self._calcular(clave, version, calcular, db, futuro)
+            return futuro.result()
+        except SQLAlchemyError as e:
+            if propio:
+                db.rollback()
+            return self._respaldo(clave, e)
+
+    def invalidar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            consultas = self._contadores["aciertos"] + self._contadores["aciertos_stale"] + self._contadores["fallos"]
+            return {
+                **self._contadores,
+                "entradas": len(self._datos),
+                "en_vuelo": len(self._en_vuelo),
+                "max_entradas": self.max_entradas,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "stale_s": self.stale,
+                "tasa_aciertos": round(
+                    (self._contadores["aciertos"] + self._contadores["aciertos_stale"]) / consultas, 4
+                ) if consultas else None
+            }
+
+
+_registro: Dict[str, CacheResultados] = {}
+
+
+def estadisticas() -> Dict[str, Dict]:
+    """Contadores de todas las cachés del proceso (para monitoreo)."""
+    return {nombre: cache.estadisticas() for nombre, cache in _registro.items()}
+
+
+def _version_actual(db: Session, dominio: str) -> Optional[int]:
+    try:
+        return version_datos.obtener(db, dominio)
+    except SQLAlchemyError:
+        db.rollback()
+        return None
+
+
+def _normalizar(valor):
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(sorted(_normalizar(v) for v in valor))
+    if hasattr(valor, "clave"):
+        return valor.clave()
+    return valor
+
+
+def cacheado(cache: CacheResultados, dominio: str,
+             nivel_acceso: Optional[Callable[[Optional[str]], str]] = None):
+    """
+    Decorador para endpoints síncronos que reciben `db: Session`.
+    La clave es (endpoint, parámetros normalizados, nivel de acceso): el `token`
+    no entra en la clave, solo el nivel que otorga (p.ej. público / institucional).
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            db = kwargs["db"]
+            parametros = tuple(
+                (k, _normalizar(v)) for k, v in sorted(kwargs.items()) if k not in ("db", "token")
+            )
+            nivel = nivel_acceso(kwargs.get("token")) if nivel_acceso else None
+            clave = (func.__name__, parametros, nivel)
+
+            def calcular(sesion: Session):
+                return func(*args, **{**kwargs, "db": sesion})
+
+            return cache.obtener(clave, _version_actual(db, dominio), calcular, db)
+        return envoltura
+    return decorador
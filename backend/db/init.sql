@@ -64,6 +64,8 @@ CREATE TABLE event_types (
     is_delicto BOOLEAN DEFAULT TRUE
 );
 
+CREATE UNIQUE INDEX uq_event_types_categoria ON event_types (category, (COALESCE(subcategory, '')));
+
 INSERT INTO event_types (category, subcategory) VALUES 
 ('HOMICIDIO', 'DOLOSO'),
 ('HOMICIDIO', 'CULPOSO (ACCIDENTE TRANSITO)'),
@@ -73,9 +75,10 @@ INSERT INTO event_types (category, subcategory) VALUES
 ('LESIONES PERSONALES', 'EN RIÑA'),
 ('VIOLENCIA INTRAFAMILIAR', 'GENERAL');
 
--- 5. Eventos (Cuerpo Central)
+-- 5. Eventos (Cuerpo Central), particionada por año de ocurrencia.
+-- Las particiones events_y<AAAA> las crea la API al ingerir (services/particiones.py)
 CREATE TABLE events (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     external_id VARCHAR(100), -- ID en el sistema de origen
     source_id INT REFERENCES sources(id),
     event_type_id INT REFERENCES event_types(id),
@@ -93,10 +96,11 @@ CREATE TABLE events (
     victim_age INT,
     victim_id_hashed TEXT, -- Seudonimización
     ingestion_id UUID, -- Referencia al log de carga
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, occurrence_date)
+) PARTITION BY RANGE (occurrence_date);
 
 -- Índices Espaciales
 CREATE INDEX idx_events_geom ON events USING GIST (location_geom);
 CREATE INDEX idx_territories_geom ON territories USING GIST (geom);
-CREATE INDEX idx_events_date ON events (occurrence_date);
+CREATE INDEX idx_events_fecha_brin ON events USING BRIN (occurrence_date);
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Time, ForeignKey, Boolean, Text, text, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Date, Time, ForeignKey, Boolean, Text, text, DateTime, Index, BigInteger, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -17,23 +17,188 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def _convertir_a_geometria(conn, tabla: str, columna: str):
+    """Convierte a GEOMETRY(Point, 4326) una columna creada como TEXT (create_all con el proxy de texto)."""
+    conn.execute(text(f"""
+        DO $$ BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = '{tabla}' AND column_name = '{columna}') = 'text' THEN
+                ALTER TABLE {tabla} ALTER COLUMN {columna} TYPE GEOMETRY(Point, 4326) USING NULLIF({columna}, '')::geometry;
+            END IF;
+        END $$;
+    """))
+
 def create_tables():
     try:
         # Importar modelos de inteligencia para que SQLAlchemy los reconozca en el create_all
         from db.models_intelligence import NationalCrimeStats, IngestionLog
         
         Base.metadata.create_all(bind=engine)
+
+        # `events` particionada por año de occurrence_date (services/particiones.py): las
+        # bases creadas antes se convierten una vez; los índices se recrean más abajo
+        try:
+            from services import particiones
+            with engine.connect() as conn:
+                if particiones.migrar(conn):
+                    print("Tabla events convertida a particionada por año.")
+                conn.commit()
+        except Exception as e:
+            print(f"Nota: No se pudo particionar la tabla events: {e}")
+
         # Asegurar que PostGIS existe y la columna también
         with engine.connect() as conn:
             try:
                 # Usar text() para SQL crudo
                 conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
                 conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS location_geom GEOMETRY(Point, 4326);"))
+                # create_all la crea como TEXT (proxy del modelo) cuando la tabla no viene de init.sql
+                _convertir_a_geometria(conn, "events", "location_geom")
+                # Índice para la paginación por cursor (keyset) del listado de incidentes
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_events_fecha_id ON events (occurrence_date, id);"))
+                # BRIN por partición: mínimo/máximo de fecha por bloque, casi sin costo de escritura
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_events_fecha_brin ON events USING BRIN (occurrence_date);"))
+                # Generalización pública precalculada (services/privacidad.py)
+                conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS public_geom GEOMETRY(Point, 4326);"))
+                _convertir_a_geometria(conn, "events", "public_geom")
+                conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS celda_publica VARCHAR(40);"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_events_privacidad_pendiente ON events (id) WHERE public_geom IS NULL AND location_geom IS NOT NULL;"))
                 conn.commit()
                 print("PostGIS y columna location_geom verificados con éxito.")
             except Exception as e:
                 print(f"Nota: No se pudo verificar la columna geom (puede que ya exista o falten permisos): {e}")
                 # No hacemos rollback aquí para no invalidar la conexión si falla el DDL
+
+        # Índices espaciales para filtros bbox/radio/polígono, mapas y teselas (aparte:
+        # si fallan no deben deshacer los índices y columnas del bloque anterior)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_events_geom ON events USING GIST (location_geom);"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_events_public_geom ON events USING GIST (public_geom);"))
+                conn.commit()
+        except Exception as e:
+            print(f"Nota: No se pudieron crear los índices espaciales de events: {e}")
+
+        # Tipos de evento únicos por (categoría, subcategoría): las cargas concurrentes
+        # previas pudieron duplicar filas; se unifican en la menor id antes de crear el
+        # índice (los eventos reasignados recalculan su dedup_hash en el paso siguiente)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("""
+                    UPDATE events e SET event_type_id = d.canonica, dedup_hash = NULL
+                    FROM (
+                        SELECT id, MIN(id) OVER (PARTITION BY category, COALESCE(subcategory, '')) AS canonica
+                        FROM event_types
+                    ) d
+                    WHERE e.event_type_id = d.id AND d.id <> d.canonica
+                """))
+                unificados = conn.execute(text("""
+                    DELETE FROM event_types et
+                    USING event_types o
+                    WHERE o.category = et.category
+                      AND COALESCE(o.subcategory, '') = COALESCE(et.subcategory, '')
+                      AND o.id < et.id
+                """)).rowcount
+                if unificados:
+                    # Las ids eliminadas pueden estar en la caché de tipos de otros workers
+                    conn.execute(text("""
+                        INSERT INTO data_versions (dominio, version) VALUES ('tipos_evento', 1)
+                        ON CONFLICT (dominio) DO UPDATE SET version = data_versions.version + 1
+                    """))
+                conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_event_types_categoria ON event_types (category, (COALESCE(subcategory, '')));"))
+                conn.commit()
+        except Exception as e:
+            print(f"Nota: No se pudo crear el índice único de event_types (la ingesta crea tipos serializada con un advisory lock): {e}")
+
+        # Clave de deduplicación: se calcula para eventos previos (los duplicados ya
+        # existentes quedan con hash NULL para no perder datos) y luego se indexa
+        try:
+            from services.carga_eventos import SQL_BACKFILL_DEDUP, sql_hash_dedup
+            with engine.connect() as conn:
+                conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS dedup_hash VARCHAR(32);"))
+                nueva = not conn.execute(text("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'events' AND column_name = 'dedup_con_id'
+                """)).scalar()
+                conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS dedup_con_id BOOLEAN NOT NULL DEFAULT FALSE;"))
+                if nueva:
+                    # Filas de /ingesta/upload cargadas antes de la columna: su hash ya incluye external_id
+                    conn.execute(text(f"""
+                        UPDATE events SET dedup_con_id = TRUE
+                        WHERE dedup_hash = {sql_hash_dedup("occurrence_date", "occurrence_time", "event_type_id", "barrio", "external_id")}
+                    """))
+                conn.execute(text(SQL_BACKFILL_DEDUP))
+                # Un índice único de tabla particionada debe incluir la clave de partición;
+                # la fecha ya es parte del hash, así que la unicidad es la misma
+                conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_events_dedup_hash ON events (dedup_hash, occurrence_date);"))
+                conn.commit()
+        except Exception as e:
+            print(f"Nota: No se pudo preparar la deduplicación de eventos: {e}")
+
+        # Contadores de versión de datos (ETag de /analitica y /api/intelligence)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("INSERT INTO data_versions (dominio, version) VALUES ('eventos', 0), ('nacional', 0), ('territorios', 0), ('tipos_evento', 0), ('barrios', 0) ON CONFLICT (dominio) DO NOTHING;"))
+                conn.commit()
+        except Exception as e:
+            print(f"Nota: No se pudo inicializar data_versions: {e}")
+
+        # Polígonos de barrios/comunas/corregimientos y su asignación a eventos (services/territorios.py)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("ALTER TABLE territories ALTER COLUMN geom TYPE GEOMETRY(GEOMETRY, 4326) USING geom::geometry;"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_territories_geom ON territories USING GIST (geom);"))
+                conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_territories_tipo_nombre ON territories (type, name);"))
+                conn.execute(text("ALTER TABLE events ADD COLUMN IF NOT EXISTS territory_id INT REFERENCES territories(id);"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS idx_events_territory ON events (territory_id);"))
+                conn.commit()
+        except Exception as e:
+            print(f"Nota: No se pudo preparar la tabla territories: {e}")
+
+        # Particiones del año en curso y el siguiente (las demás las crea la ingesta)
+        try:
+            from datetime import date
+            from services import particiones
+            db = SessionLocal()
+            try:
+                hoy = date.today()
+                particiones.asegurar(db, [hoy.year, hoy.year + 1])
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"Nota: No se pudieron crear las particiones de events: {e}")
+
+        # Semilla del nomenclátor de barrios (geocodificación de eventos sin coordenadas)
+        try:
+            from services.geocodificacion import sembrar
+            db = SessionLocal()
+            try:
+                sembrar(db)
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"Nota: No se pudo sembrar barrios_referencia: {e}")
+
+        # Poblar el cubo diario si la tabla es nueva y ya existen eventos históricos
+        try:
+            from services.agregados import inicializar_si_vacio
+            inicializar_si_vacio()
+        except Exception as e:
+            print(f"Nota: No se pudo inicializar events_daily_agg: {e}")
+
+        # Generalizar coordenadas públicas de eventos previos a la columna public_geom
+        try:
+            from services.privacidad import generalizar_pendientes
+            db = SessionLocal()
+            try:
+                generalizar_pendientes(db)
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"Nota: No se pudo generalizar coordenadas públicas: {e}")
     except Exception as e:
         print(f"Error fatal durante create_tables: {e}")
 
@@ -52,8 +217,23 @@ class User(Base):
     role_id = Column(Integer, ForeignKey("roles.id"))
     is_active = Column(Boolean, default=True)
 
+class Territory(Base):
+    """Polígonos de barrios, veredas, comunas y corregimientos (services/territorios.py)."""
+    __tablename__ = "territories"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    type = Column(String(50), nullable=False) # BARRIO, VEREDA, COMUNA, CORREGIMIENTO
+    code = Column(String(20))
+    # PostGIS geom (proxy de texto; create_tables la convierte a GEOMETRY)
+    geom = Column(Text)
+
+    __table_args__ = (
+        Index('uq_territories_tipo_nombre', 'type', 'name', unique=True),
+    )
+
 class EventType(Base):
     __tablename__ = "event_types"
+    # Único por (category, COALESCE(subcategory, '')): índice uq_event_types_categoria en create_tables
     id = Column(Integer, primary_key=True, index=True)
     category = Column(String(50), nullable=False)
     subcategory = Column(String(100))
@@ -64,16 +244,66 @@ class Event(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     external_id = Column(String(100))
     event_type_id = Column(Integer, ForeignKey("event_types.id"))
-    occurrence_date = Column(Date, nullable=False)
+    # Polígono que contiene el punto (asignado al ingerir o con asignar_territorios.py)
+    territory_id = Column(Integer, ForeignKey("territories.id"))
+    # Clave de partición (RANGE anual, services/particiones.py): forma parte de la PK
+    occurrence_date = Column(Date, primary_key=True, nullable=False)
     occurrence_time = Column(Time, nullable=False)
     barrio = Column(String(100))
     estado = Column(String(50), default="Abierto")
     descripcion = Column(Text)
     # PostGIS geom (usamos un proxy de texto para que SQLAlchemy lo vea)
     location_geom = Column(Text) 
+    # Punto generalizado (centro de celda) y celda para el Modo Abierto. La columna
+    # public_geom GEOMETRY(Point, 4326) la crea create_tables; no se declara aquí para
+    # que create_all no la cree como TEXT (solo se usa desde SQL crudo)
+    celda_publica = Column(String(40))
+    # md5(fecha|hora|tipo|barrio[|external_id]) para descartar duplicados al ingerir;
+    # dedup_con_id indica si la clave incluye external_id (services/carga_eventos.py)
+    dedup_hash = Column(String(32))
+    dedup_con_id = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     
     event_type = relationship("EventType")
 
+    __table_args__ = (
+        Index('idx_events_fecha_id', 'occurrence_date', 'id'),
+        Index('uq_events_dedup_hash', 'dedup_hash', 'occurrence_date', unique=True),
+        {'postgresql_partition_by': 'RANGE (occurrence_date)'},
+    )
+
+class EventDailyAgg(Base):
+    """
+    Cubo diario pre-agregado de eventos (fecha × categoría × barrio → total).
+    Se mantiene en la misma transacción que las altas/bajas de `events`
+    (ver services/agregados.py) y alimenta los endpoints de /analitica/estadisticas.
+    """
+    __tablename__ = "events_daily_agg"
+    fecha = Column(Date, primary_key=True)
+    categoria = Column(String(50), primary_key=True)
+    barrio = Column(String(100), primary_key=True, default="") # "" = barrio nulo en events
+    total = Column(Integer, nullable=False, default=0)
+
+class DataVersion(Base):
+    """
+    Contador monótono por dominio de datos ("eventos", "nacional"). Lo incrementan las
+    rutas de ingesta y borrado; los GET lo usan para construir ETags (core/cache_http.py).
+    """
+    __tablename__ = "data_versions"
+    dominio = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class BarrioReferencia(Base):
+    """
+    Nomenclátor de barrios y corregimientos con un punto de referencia. Lo usa la
+    ingesta para ubicar eventos sin coordenadas (services/geocodificacion.py).
+    """
+    __tablename__ = "barrios_referencia"
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(100), nullable=False)
+    nombre_normalizado = Column(String(100), nullable=False, unique=True) # Mayúsculas, sin tildes ni signos
+    latitud = Column(Float, nullable=False)
+    longitud = Column(Float, nullable=False)
+
 class Proposal(Base):
     __tablename__ = "proposals"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from db.models import SessionLocal, Event, EventType, Role, User
 from core.security import get_password_hash
+from services import particiones
 from datetime import date, time
 import uuid
 
@@ -63,6 +64,8 @@ def seed():
                 {"date": date(2024, 2, 20), "time": time(14, 00), "ext_id": "POL-002", "geom": "POINT(-76.545 3.255)"},
                 {"date": date(2024, 3, 5), "time": time(3, 15), "ext_id": "POL-003", "geom": "POINT(-76.525 3.270)"}
             ]
+            # events está particionada por año (services/particiones.py)
+            particiones.asegurar(db, {ep["date"].year for ep in eventos_prueba})
             
             for ep in eventos_prueba:
                 ev = Event(
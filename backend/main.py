@@ -16,7 +16,7 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("sisc_api")
 
-from api import analitica, ingesta, auth, reportes, ia, intelligence, participacion
+from api import analitica, ingesta, auth, reportes, ia, intelligence, participacion, subidas
 from db.models import create_tables
 from contextlib import asynccontextmanager
 
@@ -72,6 +72,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Cursor", "ETag", "Location", "Tus-Resumable", "Upload-Offset", "Upload-Length"],
 )
 
 @app.get("/")
@@ -83,6 +84,7 @@ app.include_router(analitica.router, prefix="/analitica", tags=["analitica"])
 app.include_router(reportes.router, prefix="/reportes", tags=["reportes"])
 app.include_router(ia.router, prefix="/ia", tags=["ia"])
 app.include_router(ingesta.router, prefix="/ingesta", tags=["ingesta"])
+app.include_router(subidas.router, prefix="/ingesta/subidas", tags=["ingesta"])
 app.include_router(participacion.router, prefix="/participacion", tags=["participacion"])
 app.include_router(intelligence.router, prefix="/api/intelligence", tags=["intelligence"])
 
@@ -1,28 +1,53 @@
 from sqlalchemy import create_engine, text
 import os
 
+from services import geocodificacion, normalizacion
+
 DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql://sisc_user:sisc_password@db:5432/sisc_jamundi")
 
-# Coordenadas aproximadas para los barrios de la prueba
-COORDS = {
-    "PORTAL DE JORDAN E24": (3.2505, -76.5412),
-    "VIA CALI JAMUNDI E24": (3.2753, -76.5281),
-    "EL RODEO E24": (3.2598, -76.5345),
-    "BARRIO PENDIENTE POR ASIGNAR": (3.2612, -76.5320)
-}
+# Puntos que indican un evento sin georreferenciar: el punto por defecto de la ingesta
+# y el de la alcaldía que traen algunos archivos de origen
+PUNTOS_GENERICOS = (
+    (normalizacion.LAT_DEFECTO, normalizacion.LNG_DEFECTO),
+    (3.2606, -76.5364),
+)
 
 def patch_coords():
+    """
+    Reubica los eventos guardados en un punto genérico usando el nomenclátor de barrios
+    (services/geocodificacion.py): una búsqueda por barrio distinto y un UPDATE por barrio.
+    """
     engine = create_engine(DATABASE_URL)
+    gazetteer = geocodificacion.Gazetteer(geocodificacion.BARRIOS_SEMILLA)
     with engine.connect() as conn:
-        # Buscar eventos sin coordenadas de precisión (que tengan el default 3.26, -76.53)
-        # O simplemente actualizar los recién creados por su nombre de barrio
-        for barrio, (lat, lng) in COORDS.items():
-            conn.execute(
-                text("UPDATE events SET location_geom = ST_SetSRID(ST_Point(:lng, :lat), 4326) WHERE barrio = :barrio"),
+        try:
+            filas = conn.execute(text("SELECT nombre, latitud, longitud FROM barrios_referencia")).all()
+            if filas:
+                gazetteer = geocodificacion.Gazetteer(filas)
+        except Exception as e:
+            conn.rollback()
+            print(f"Nota: usando la semilla del nomenclátor ({e})")
+
+        condicion = " OR ".join(
+            f"ST_DWithin(location_geom, ST_SetSRID(ST_Point({lng}, {lat}), 4326), 0.00001)"
+            for lat, lng in PUNTOS_GENERICOS
+        )
+        barrios = [b for (b,) in conn.execute(text(f"SELECT DISTINCT barrio FROM events WHERE barrio IS NOT NULL AND ({condicion})"))]
+
+        actualizados = 0
+        for barrio in barrios:
+            punto = gazetteer.buscar(barrio)
+            if punto is None:
+                continue
+            lat, lng = punto
+            actualizados += conn.execute(
+                text(f"UPDATE events SET location_geom = ST_SetSRID(ST_Point(:lng, :lat), 4326), public_geom = NULL, celda_publica = NULL WHERE barrio = :barrio AND ({condicion})"),
                 {"lat": lat, "lng": lng, "barrio": barrio}
-            )
+            ).rowcount
+        # La celda pública se recalcula al reiniciar la API (create_tables)
+        conn.execute(text("UPDATE data_versions SET version = version + 1 WHERE dominio = 'eventos'"))
         conn.commit()
-        print("Coordenadas actualizadas para demostración de precisión.")
+        print(f"Coordenadas actualizadas: {actualizados} eventos en {len(barrios)} barrios revisados.")
 
 if __name__ == "__main__":
     patch_coords()
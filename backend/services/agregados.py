@@ -0,0 +1,102 @@
+from collections import Counter
+from typing import Iterable, Tuple
+from datetime import date
+import logging
+
+from sqlalchemy import delete, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db.models import EventDailyAgg
+
+logger = logging.getLogger("sisc_api")
+
+# Clave del cubo: (fecha, categoría, barrio)
+ClaveCubo = Tuple[date, str, str]
+
+LOTE_UPSERT = 1000
+
+
+def clave_cubo(fecha: date, categoria: str, barrio) -> ClaveCubo:
+    """Normaliza una fila de `events` a la clave del cubo (barrio nulo -> "")."""
+    return (fecha, categoria, barrio or "")
+
+
+def aplicar_delta(db: Session, conteos: Counter):
+    """
+    Suma (o resta, si el conteo es negativo) los conteos al cubo diario.
+    No hace commit: debe ejecutarse en la misma transacción que el cambio en `events`.
+    """
+    filas = [
+        {"fecha": f, "categoria": c, "barrio": b, "total": n}
+        for (f, c, b), n in conteos.items() if n
+    ]
+    if not filas:
+        return
+
+    for i in range(0, len(filas), LOTE_UPSERT):
+        stmt = insert(EventDailyAgg).values(filas[i:i + LOTE_UPSERT])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EventDailyAgg.fecha, EventDailyAgg.categoria, EventDailyAgg.barrio],
+            set_={"total": EventDailyAgg.total + stmt.excluded.total}
+        )
+        db.execute(stmt)
+
+    # Las celdas que quedan en cero no aportan nada a las consultas; solo pueden quedar
+    # así las que recibieron una resta en este delta
+    restadas = [(f["fecha"], f["categoria"], f["barrio"]) for f in filas if f["total"] < 0]
+    for i in range(0, len(restadas), LOTE_UPSERT):
+        db.execute(delete(EventDailyAgg).where(
+            tuple_(EventDailyAgg.fecha, EventDailyAgg.categoria, EventDailyAgg.barrio).in_(restadas[i:i + LOTE_UPSERT]),
+            EventDailyAgg.total <= 0
+        ))
+
+
+def registrar_altas(db: Session, filas: Iterable[Tuple]):
+    """Registra eventos insertados. `filas` son tuplas (fecha, categoría, barrio)."""
+    aplicar_delta(db, Counter(clave_cubo(*f) for f in filas))
+
+
+def registrar_bajas(db: Session, filas: Iterable[Tuple]):
+    """Registra eventos eliminados. `filas` son tuplas (fecha, categoría, barrio)."""
+    conteos = Counter()
+    for f in filas:
+        conteos[clave_cubo(*f)] -= 1
+    aplicar_delta(db, conteos)
+
+
+def vaciar(db: Session):
+    """Vacía el cubo (usado junto con el borrado total de eventos)."""
+    db.execute(delete(EventDailyAgg))
+
+
+def vaciar_periodo(db: Session, desde: date, hasta: date):
+    """Elimina las celdas del cubo con fecha en [desde, hasta) (borrado de una partición de events)."""
+    db.execute(delete(EventDailyAgg).where(EventDailyAgg.fecha >= desde, EventDailyAgg.fecha < hasta))
+
+
+def reconstruir(db: Session):
+    """Recalcula el cubo completo desde `events`. No hace commit."""
+    vaciar(db)
+    db.execute(text("""
+        INSERT INTO events_daily_agg (fecha, categoria, barrio, total)
+        SELECT e.occurrence_date, et.category, COALESCE(e.barrio, ''), COUNT(*)
+        FROM events e
+        JOIN event_types et ON e.event_type_id = et.id
+        GROUP BY 1, 2, 3
+    """))
+
+
+def inicializar_si_vacio():
+    """Puebla el cubo una única vez cuando la tabla es nueva y ya hay eventos cargados."""
+    from db.models import SessionLocal
+    db = SessionLocal()
+    try:
+        cubo_vacio = db.query(EventDailyAgg.fecha).first() is None
+        hay_eventos = db.execute(text("SELECT EXISTS (SELECT 1 FROM events)")).scalar()
+        if cubo_vacio and hay_eventos:
+            logger.info("Poblando events_daily_agg a partir del histórico de eventos...")
+            reconstruir(db)
+            db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,285 @@
+import io
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from services import categorias, geocodificacion, normalizacion, particiones, territorios
+
+COLUMNAS_REQUERIDAS = ['fecha', 'hora', 'delito', 'latitud', 'longitud']
+
+# Tamaño de lote para el INSERT ... FROM unnest(...) de /ingesta/bulk
+LOTE_INSERT = 5000
+
+
+# Clave de deduplicación (events.dedup_hash, índice único uq_events_dedup_hash) según
+# el origen del evento; events.dedup_con_id indica cuál se usó, para recalcularla igual
+# (p.ej. al reescribir el barrio o unificar tipos):
+#   /ingesta/bulk                           md5(fecha|hora|tipo|barrio)             dedup_con_id = FALSE
+#   /ingesta/upload y subidas de eventos    md5(fecha|hora|tipo|barrio|external_id) dedup_con_id = TRUE
+
+
+def sql_hash_dedup(fecha: str, hora: str, tipo: str, barrio: str, external_id: Optional[str] = None) -> str:
+    """
+    Expresión SQL de la clave de deduplicación (fecha|hora|tipo|barrio). Con
+    `external_id` la clave incluye además el identificador de la fuente: solo se omite
+    la misma fila cargada otra vez, no otro hecho con la misma fecha, hora, tipo y barrio.
+    """
+    if external_id is None:
+        return f"md5(concat_ws('|', {fecha}, {hora}, {tipo}, coalesce({barrio}, '')))"
+    return f"md5(concat_ws('|', {fecha}, {hora}, {tipo}, coalesce({barrio}, ''), {external_id}))"
+
+
+# Clave de una fila existente de `events`, con la variante con que se cargó
+SQL_HASH_EVENTO = f"""CASE WHEN dedup_con_id
+    THEN {sql_hash_dedup("occurrence_date", "occurrence_time", "event_type_id", "barrio", "external_id")}
+    ELSE {sql_hash_dedup("occurrence_date", "occurrence_time", "event_type_id", "barrio")} END"""
+
+SQL_BACKFILL_DEDUP = f"""
+    UPDATE events e SET dedup_hash = h.hash
+    FROM (
+        SELECT id, hash, row_number() OVER (PARTITION BY hash ORDER BY id) AS n
+        FROM (
+            SELECT id, {SQL_HASH_EVENTO} AS hash
+            FROM events WHERE dedup_hash IS NULL
+        ) s
+    ) h
+    WHERE e.id = h.id AND h.n = 1
+      AND NOT EXISTS (SELECT 1 FROM events x WHERE x.dedup_hash = h.hash)
+"""
+
+# Columnas que entrega `validar`
+COLUMNAS_VALIDADAS = [
+    "id", "external_id", "categoria", "fecha", "hora",
+    "barrio", "descripcion", "estado", "lng", "lat", "territory_id"
+]
+
+# Columnas de la tabla de staging, en el orden en que se escriben con COPY
+# (la categoría ya llega resuelta a event_types.id desde la caché de tipos)
+COLUMNAS_STAGING = [
+    "id", "external_id", "event_type_id", "fecha", "hora",
+    "barrio", "descripcion", "estado", "lng", "lat", "territory_id"
+]
+
+
+def _texto(df: pd.DataFrame, columna: str, defecto: str) -> pd.Series:
+    if columna not in df.columns:
+        return pd.Series(defecto, index=df.index, dtype=object)
+    return df[columna].where(df[columna].notna(), defecto).astype(str)
+
+
+def asignar_territorios(lngs, lats, barrios, coordenadas_fuente=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    territory_id y barrio de cada punto con el índice STRtree de territorios (un join
+    espacial vectorizado por lote). El barrio del polígono reemplaza al recibido solo
+    donde `coordenadas_fuente` es True (por defecto en todos): un punto tomado del
+    nomenclátor de barrios salió del propio texto y no lo contradice. Donde el punto no cae
+    en un barrio/vereda/corregimiento conocido se conserva el barrio recibido.
+    Retorna (ids float con NaN, barrios).
+    """
+    ids, nombres = territorios.indice().asignar(lngs, lats)
+    barrios = np.asarray(barrios, dtype=object)
+    reemplazar = ~pd.isna(nombres)
+    if coordenadas_fuente is not None:
+        reemplazar &= np.asarray(coordenadas_fuente, dtype=bool)
+    return ids, np.where(reemplazar, nombres, barrios)
+
+
+def validar(df: pd.DataFrame, fila_inicial: int = 2) -> Tuple[pd.DataFrame, List[Dict]]:
+    """
+    Valida y normaliza un DataFrame de eventos columna a columna.
+    Retorna (filas válidas con COLUMNAS_VALIDADAS, errores [{fila, error}]).
+    `fila_inicial` es el número de fila del archivo que corresponde a la primera fila de `df`.
+    """
+    df = df.reset_index(drop=True)
+    filas = np.arange(len(df)) + fila_inicial
+
+    # 1. Categoría (reglas de alias compiladas, evaluadas una vez por valor distinto)
+    categoria = categorias.EVENTOS.normalizar_serie(
+        df['delito'].where(df['delito'].notna(), '').astype(str).str.upper().str.strip()
+    )
+    sin_categoria = categoria.eq('')
+    categoria_larga = categoria.str.len() > 50 # event_types.category es VARCHAR(50)
+
+    # 2. Fecha y hora (la hora se pasa a texto: Excel entrega objetos time)
+    fecha = normalizacion.parsear_fechas(df['fecha'])
+    hora = pd.to_datetime(df['hora'].astype(str), errors='coerce', format='mixed')
+    fecha_invalida = fecha.isna() | hora.isna()
+
+    # 3. Coordenadas (las faltantes se toman del nomenclátor de barrios, una búsqueda por nombre distinto)
+    lng = pd.to_numeric(df['longitud'], errors='coerce')
+    lat = pd.to_numeric(df['latitud'], errors='coerce')
+    sin_coordenadas = lng.isna() | lat.isna()
+    if sin_coordenadas.any() and 'barrio' in df.columns:
+        lat_ref, lng_ref, _ = geocodificacion.gazetteer().geocodificar_serie(df.loc[sin_coordenadas, 'barrio'])
+        lat = lat.where(~sin_coordenadas, lat_ref)
+        lng = lng.where(~sin_coordenadas, lng_ref)
+    coord_invalida = ~(lng.between(-180, 180) & lat.between(-90, 90))
+
+    invalida = sin_categoria | categoria_larga | fecha_invalida | coord_invalida
+    errores = []
+    if invalida.any():
+        motivo = np.select(
+            [sin_categoria, categoria_larga, fecha_invalida, coord_invalida],
+            ["delito", "delito_largo", "fecha", "coordenadas"]
+        )
+        for i in np.flatnonzero(invalida.to_numpy()):
+            if motivo[i] == "delito":
+                mensaje = "El campo 'delito' no puede estar vacío"
+            elif motivo[i] == "delito_largo":
+                mensaje = f"El campo 'delito' excede 50 caracteres ({categoria.iat[i][:20]}...)"
+            elif motivo[i] == "fecha":
+                mensaje = f"Formato de fecha/hora inválido (Fecha: {df['fecha'].iat[i]}, Hora: {df['hora'].iat[i]})"
+            else:
+                mensaje = f"Coordenadas inválidas (Lat: {df['latitud'].iat[i]}, Lng: {df['longitud'].iat[i]})"
+            errores.append({"fila": int(filas[i]), "error": mensaje})
+
+    validos = ~invalida
+    n = int(validos.sum())
+    external_id = _texto(df, 'id_externo', '')[validos].str.slice(0, 100)
+    sin_id = external_id.eq('')
+    if sin_id.any():
+        external_id = external_id.copy()
+        external_id[sin_id] = [str(uuid.uuid4()) for _ in range(int(sin_id.sum()))]
+
+    # 4. Territorio por punto en polígono: el barrio del polígono reemplaza al texto libre
+    # en las filas con coordenadas propias (no en las ubicadas por el nomenclátor)
+    territorio, barrio = asignar_territorios(
+        lng[validos].to_numpy(), lat[validos].to_numpy(),
+        _texto(df, 'barrio', 'Sin especificar')[validos].str.slice(0, 100).to_numpy(),
+        coordenadas_fuente=(~sin_coordenadas)[validos].to_numpy()
+    )
+
+    salida = pd.DataFrame({
+        "id": [str(uuid.uuid4()) for _ in range(n)],
+        "external_id": external_id.to_numpy(),
+        "categoria": categoria[validos].to_numpy(),
+        "fecha": fecha[validos].dt.date.to_numpy(),
+        "hora": hora[validos].dt.strftime('%H:%M:%S').to_numpy(),
+        "barrio": barrio,
+        "descripcion": _texto(df, 'descripcion', '')[validos].to_numpy(),
+        "estado": _texto(df, 'estado', 'Abierto')[validos].str.slice(0, 50).to_numpy(),
+        "lng": lng[validos].to_numpy(),
+        "lat": lat[validos].to_numpy(),
+        "territory_id": pd.array(territorio, dtype="Int64"),
+    }, columns=COLUMNAS_VALIDADAS)
+    return salida, errores
+
+
+def cargar(db: Session, validos: pd.DataFrame) -> List[Tuple]:
+    """
+    Carga filas ya validadas en `events`: COPY a una tabla temporal y un único
+    INSERT ... SELECT que construye la geometría. Los tipos de evento se resuelven
+    antes, en memoria, con la caché de proceso (categorias.tipos_evento), y se crean las
+    particiones anuales que falten.
+    El dedup_hash incluye external_id (dedup_con_id): se omiten (ON CONFLICT DO NOTHING) las filas ya
+    cargadas con el mismo id de la fuente, p.ej. al volver a subir un archivo; las filas
+    sin id reciben uno nuevo en `validar` y siempre se insertan.
+    No hace commit. Retorna las altas efectivas (fecha, categoría, barrio) para el cubo diario.
+    """
+    if validos.empty:
+        return []
+
+    ids = categorias.tipos_evento.resolver(db, validos["categoria"].unique())
+    particiones.asegurar(db, {f.year for f in validos["fecha"].unique()})
+    por_id = {i: c for c, i in ids.items()}
+    staging = validos.assign(categoria=validos["categoria"].map(ids)) \
+        .rename(columns={"categoria": "event_type_id"})[COLUMNAS_STAGING]
+
+    buffer = io.StringIO()
+    staging.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    # COPY necesita el cursor de psycopg2 de la misma conexión/transacción de la sesión
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS staging_eventos (
+                id UUID, external_id TEXT, event_type_id INT, fecha DATE, hora TIME,
+                barrio TEXT, descripcion TEXT, estado TEXT, lng DOUBLE PRECISION, lat DOUBLE PRECISION,
+                territory_id INT
+            ) ON COMMIT DROP
+        """)
+        cursor.execute("TRUNCATE staging_eventos")
+        cursor.copy_expert(
+            f"COPY staging_eventos ({', '.join(COLUMNAS_STAGING)}) FROM STDIN "
+            "WITH (FORMAT csv, FORCE_NOT_NULL (barrio, descripcion, estado))",
+            buffer
+        )
+
+        cursor.execute(f"""
+            INSERT INTO events (
+                id, external_id, event_type_id, occurrence_date, occurrence_time,
+                barrio, descripcion, estado, location_geom, territory_id, dedup_hash, dedup_con_id
+            )
+            SELECT s.id, s.external_id, s.event_type_id, s.fecha, s.hora,
+                   s.barrio, s.descripcion, s.estado,
+                   ST_SetSRID(ST_MakePoint(s.lng, s.lat), 4326), s.territory_id,
+                   {sql_hash_dedup("s.fecha", "s.hora", "s.event_type_id", "s.barrio", "s.external_id")}, TRUE
+            FROM staging_eventos s
+            ON CONFLICT (dedup_hash, occurrence_date) DO NOTHING
+            RETURNING occurrence_date, event_type_id, barrio
+        """)
+        altas = [(fecha, por_id[tipo], barrio) for fecha, tipo, barrio in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+    return altas
+
+
+def insertar(db: Session, filas: List[Dict]) -> List[Tuple]:
+    """
+    Inserta eventos ya normalizados con un INSERT ... SELECT FROM unnest(...) por lote,
+    omitiendo duplicados (ON CONFLICT DO NOTHING). Cada fila es un dict con
+    categoria, fecha, hora, barrio, descripcion, estado, external_id, lng, lat
+    y opcionalmente territory_id.
+    No hace commit. Retorna las altas efectivas (fecha, categoría, barrio).
+    """
+    if not filas:
+        return []
+
+    tipos = categorias.tipos_evento.resolver(db, {f["categoria"] for f in filas})
+    por_id = {i: c for c, i in tipos.items()}
+    particiones.asegurar(db, {f["fecha"].year for f in filas})
+
+    sql = text(f"""
+        WITH datos AS (
+            SELECT * FROM unnest(
+                CAST(:ids AS uuid[]), CAST(:external_ids AS text[]), CAST(:tipos AS int[]),
+                CAST(:fechas AS date[]), CAST(:horas AS time[]), CAST(:barrios AS text[]),
+                CAST(:descripciones AS text[]), CAST(:estados AS text[]),
+                CAST(:lngs AS float8[]), CAST(:lats AS float8[]), CAST(:territorios AS int[])
+            ) AS d(id, external_id, tipo, fecha, hora, barrio, descripcion, estado, lng, lat, territorio)
+        )
+        INSERT INTO events (
+            id, external_id, event_type_id, occurrence_date, occurrence_time,
+            barrio, descripcion, estado, location_geom, territory_id, dedup_hash, dedup_con_id
+        )
+        SELECT id, external_id, tipo, fecha, hora, barrio, descripcion, estado,
+               ST_SetSRID(ST_MakePoint(lng, lat), 4326), territorio,
+               {sql_hash_dedup("fecha", "hora", "tipo", "barrio")}, FALSE
+        FROM datos
+        ON CONFLICT (dedup_hash, occurrence_date) DO NOTHING
+        RETURNING occurrence_date, event_type_id, barrio
+    """)
+
+    altas = []
+    for i in range(0, len(filas), LOTE_INSERT):
+        lote = filas[i:i + LOTE_INSERT]
+        altas.extend((fecha, por_id[tipo], barrio) for fecha, tipo, barrio in db.execute(sql, {
+            "ids": [str(uuid.uuid4()) for _ in lote],
+            "external_ids": [f["external_id"] for f in lote],
+            "tipos": [tipos[f["categoria"]] for f in lote],
+            "fechas": [f["fecha"] for f in lote],
+            "horas": [f["hora"] for f in lote],
+            "barrios": [f["barrio"] for f in lote],
+            "descripciones": [f["descripcion"] for f in lote],
+            "estados": [f["estado"] for f in lote],
+            "lngs": [f["lng"] for f in lote],
+            "lats": [f["lat"] for f in lote],
+            "territorios": [f.get("territory_id") for f in lote],
+        }))
+    return altas
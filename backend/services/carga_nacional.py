@@ -0,0 +1,58 @@
+import io
+from typing import Iterable, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from services.excel_processor import COLUMNAS_REGISTRO
+
+# Columnas de texto: un valor vacío se carga como '' y no como NULL
+COLUMNAS_TEXTO = ["departamento", "municipio", "municipio_normalizado", "tipo_delito", "fuente_archivo", "hash_registro"]
+
+
+def cargar(db: Session, lotes: Iterable[pd.DataFrame]) -> Tuple[int, int]:
+    """
+    Carga los lotes de un archivo (NationalStatsProcessor.process_excel) en
+    `national_crime_stats`: COPY de cada lote a una tabla temporal (sin WAL, propia de
+    la sesión) y un único INSERT ... SELECT ... ON CONFLICT (hash_registro) DO NOTHING.
+    Los registros ya cargados (mismo hash) se omiten sin abortar la transacción.
+    No hace commit. Retorna (insertados, omitidos).
+    """
+    # COPY necesita el cursor de psycopg2 de la misma conexión/transacción de la sesión
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS staging_nacional (
+                departamento TEXT, municipio TEXT, municipio_normalizado TEXT, fecha_hecho DATE,
+                anio INT, mes INT, tipo_delito TEXT, cantidad INT, fuente_archivo TEXT,
+                hash_registro TEXT, fecha_ingesta TIMESTAMP
+            ) ON COMMIT DROP
+        """)
+        cursor.execute("TRUNCATE staging_nacional")
+
+        recibidos = 0
+        for lote in lotes:
+            if lote.empty:
+                continue
+            buffer = io.StringIO()
+            lote[COLUMNAS_REGISTRO].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY staging_nacional ({', '.join(COLUMNAS_REGISTRO)}) FROM STDIN "
+                f"WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(COLUMNAS_TEXTO)}))",
+                buffer
+            )
+            recibidos += len(lote)
+        if not recibidos:
+            return 0, 0
+
+        cursor.execute(f"""
+            INSERT INTO national_crime_stats ({', '.join(COLUMNAS_REGISTRO)})
+            SELECT {', '.join(COLUMNAS_REGISTRO)} FROM staging_nacional
+            ON CONFLICT (hash_registro) DO NOTHING
+        """)
+        insertados = cursor.rowcount
+    finally:
+        cursor.close()
+
+    return insertados, recibidos - insertados
@@ -0,0 +1,178 @@
+import re
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from services import version_datos
+
+# Tabla única de alias → categoría canónica. El orden es la prioridad: gana la primera
+# regla que aparezca en el texto (p.ej. "HOMICIDIO INTENCIONAL" antes que "HOMICIDIO").
+# Los patrones son expresiones regulares sin grupos de captura.
+
+# Delitos locales (/ingesta/upload, /ingesta/bulk, /ingesta/preview); el texto llega en mayúsculas
+REGLAS_EVENTOS = (
+    ("HURTO A PERSONAS", r"H\.PERSONA|^H\. PERSONAS$"),
+    ("HURTO A COMERCIO", r"H\.COMERCIO"),
+    ("HURTO A RESIDENCIAS", r"H\.RESIDENCIA"),
+    ("HURTO A MOTOCICLETAS", r"H\.MOTOS"),
+    ("HURTO A AUTOMOTORES", r"H\.AUTOMO"),
+    ("LESIONES PERSONALES", r"L\.PERSONALES|LESIONES"),
+    ("HOMICIDIO", r"HOMICI"),
+    ("VIOLENCIA INTRAFAMILIAR", r"VIOLENCIA|VIF"),
+)
+
+# Archivos nacionales de MinDefensa: el tipo sale del nombre del archivo (sin tildes ni puntos)
+REGLAS_NACIONAL = (
+    ("Homicidio Intencional", r"HOMICIDIO INTENCIONAL"),
+    ("Homicidio (Tránsito)", r"HOMICIDIO ACCIDENTES"),
+    ("Lesiones Personales", r"LESIONES COMUNES"),
+    ("Lesiones (Tránsito)", r"LESIONES ACCIDENTES"),
+    ("Hurto Personas", r"HURTO PERSONAS"),
+    ("Hurto Comercio", r"HURTO COMERCIO"),
+    ("Hurto Residencias", r"HURTO RESIDENCIAS"),
+    ("Hurto Vehículos", r"HURTO VEHICULOS"),
+    ("Extorsión", r"EXTORSION"),
+    ("Secuestro", r"SECUESTRO"),
+    ("Delitos Sexuales", r"SEXUALES"),
+    ("Violencia Intrafamiliar", r"INTRAFAMILIAR"),
+    ("Terrorismo", r"TERRORISMO"),
+    ("Delitos Ambientales", r"MEDIO AMBIENTE"),
+    ("Delitos Informáticos", r"INFORMATICOS"),
+    ("Masacres", r"MASACRES"),
+    ("Homicidio", r"HOMICIDIO"),
+    ("Hurto", r"HURTO"),
+)
+
+
+class Normalizador:
+    """
+    Compila una tabla de reglas en una sola expresión regular de alternativas
+    `^(?:.*?(?P<r0>...)|.*?(?P<r1>...)|...)`: el motor prueba las alternativas en orden,
+    así que la primera regla que aparece en el texto es la que gana, con una sola
+    llamada al motor de expresiones regulares por valor.
+    """
+
+    def __init__(self, reglas: Sequence[Tuple[str, str]], defecto: Optional[str] = None):
+        self.canonicas = [canonica for canonica, _ in reglas]
+        self.defecto = defecto # None: conservar el texto original si ninguna regla aplica
+        self.patron = "^(?:" + "|".join(
+            f".*?(?P<r{i}>{patron})" for i, (_, patron) in enumerate(reglas)
+        ) + ")"
+        self._regex = re.compile(self.patron, re.DOTALL)
+
+    def normalizar(self, valor: str) -> str:
+        m = self._regex.match(valor)
+        if m is None:
+            return valor if self.defecto is None else self.defecto
+        return self.canonicas[int(m.lastgroup[1:])]
+
+    def normalizar_serie(self, serie: pd.Series) -> pd.Series:
+        """
+        Versión vectorizada: evalúa las reglas una vez por valor distinto
+        (`str.extract` sobre los únicos) y propaga el resultado con `map`.
+        """
+        valores = serie.astype(str)
+        unicos = pd.unique(valores)
+        if len(unicos) == 0:
+            return valores
+        coincidencias = pd.Series(unicos).str.extract(self.patron, flags=re.DOTALL).notna().to_numpy()
+        regla = coincidencias.argmax(axis=1)
+        sin_regla = ~coincidencias.any(axis=1)
+        canonicas = np.array(self.canonicas, dtype=object)[regla]
+        canonicas[sin_regla] = unicos[sin_regla] if self.defecto is None else self.defecto
+        return valores.map(dict(zip(unicos, canonicas)))
+
+
+EVENTOS = Normalizador(REGLAS_EVENTOS)
+NACIONAL = Normalizador(REGLAS_NACIONAL, defecto="Delito General")
+
+
+# Clave del advisory lock que serializa la creación de tipos cuando falta el índice único
+LOCK_TIPOS_EVENTO = 7260002
+
+
+class CacheTiposEvento:
+    """
+    Caché de proceso categoría → event_types.id (la menor id de la categoría, igual que
+    las consultas históricas). Solo se consulta la BD cuando aparece una categoría que
+    no está en memoria; las categorías nuevas se crean con un upsert contra el índice
+    único uq_event_types_categoria, de modo que dos cargas concurrentes no duplican filas.
+    Si el índice no existe (create_tables no pudo crearlo) la creación se serializa con
+    un advisory lock de transacción y se inserta sin destino de ON CONFLICT.
+
+    Las ids creadas por una transacción se publican en la caché al confirmarse
+    (after_commit): si la transacción se revierte no quedan ids inexistentes en memoria.
+    La caché se descarta cuando cambia la versión del dominio "tipos_evento" (la
+    incrementa create_tables al unificar tipos duplicados), en todos los workers.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def resolver(self, db: Session, categorias: Iterable[str]) -> Dict[str, int]:
+        """Ids de `categorias`, creando las que no existan. No hace commit."""
+        categorias = set(categorias)
+        pendientes = db.info.setdefault("tipos_evento_pendientes", {})
+        version = version_datos.obtener(db, version_datos.TIPOS_EVENTO)
+        with self._lock:
+            if version != self._version:
+                self._ids.clear()
+                self._version = version
+            ids = {c: self._ids[c] for c in categorias if c in self._ids}
+        ids.update({c: pendientes[c] for c in categorias - ids.keys() if c in pendientes})
+
+        faltantes = sorted(categorias - ids.keys())
+        if not faltantes:
+            return ids
+
+        con_indice = db.execute(text("SELECT to_regclass('uq_event_types_categoria') IS NOT NULL")).scalar()
+        if con_indice:
+            conflicto = "ON CONFLICT (category, (COALESCE(subcategory, ''))) DO NOTHING"
+        else:
+            # Sin índice único: el lock hace que el NOT EXISTS vea las filas de otra carga
+            db.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": LOCK_TIPOS_EVENTO})
+            conflicto = ""
+        creadas = {
+            fila.category for fila in db.execute(text(f"""
+                INSERT INTO event_types (category, is_delicto)
+                SELECT c, TRUE FROM unnest(CAST(:categorias AS text[])) AS c
+                WHERE NOT EXISTS (SELECT 1 FROM event_types et WHERE et.category = c)
+                {conflicto}
+                RETURNING category
+            """), {"categorias": faltantes})
+        }
+        encontradas = dict(db.execute(text("""
+            SELECT category, MIN(id) FROM event_types
+            WHERE category = ANY(CAST(:categorias AS text[])) GROUP BY category
+        """), {"categorias": faltantes}).all())
+
+        ids.update(encontradas)
+        pendientes.update({c: i for c, i in encontradas.items() if c in creadas})
+        with self._lock:
+            self._ids.update({c: i for c, i in encontradas.items() if c not in creadas})
+        return ids
+
+    def _confirmar(self, db: Session):
+        pendientes = db.info.pop("tipos_evento_pendientes", None)
+        if pendientes:
+            with self._lock:
+                self._ids.update(pendientes)
+
+
+tipos_evento = CacheTiposEvento()
+
+
+@event.listens_for(Session, "after_commit")
+def _publicar_tipos_creados(session):
+    tipos_evento._confirmar(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_tipos_creados(session):
+    session.info.pop("tipos_evento_pendientes", None)
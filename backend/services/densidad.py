@@ -0,0 +1,126 @@
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+# Origen fijo (centro de Jamundí) para que la grilla sea estable entre consultas
+ORIGEN_LAT = 3.26
+ORIGEN_LNG = -76.53
+METROS_POR_GRADO_LAT = 110540.0
+METROS_POR_GRADO_LNG = 111320.0 * math.cos(math.radians(ORIGEN_LAT))
+
+MAX_CELDAS_LADO = 512
+
+
+class RasterDemasiadoGrande(ValueError):
+    pass
+
+
+def a_metros(lng: np.ndarray, lat: np.ndarray):
+    """Proyección equirectangular local (suficiente para la escala municipal)."""
+    return (lng - ORIGEN_LNG) * METROS_POR_GRADO_LNG, (lat - ORIGEN_LAT) * METROS_POR_GRADO_LAT
+
+
+def a_grados(x: np.ndarray, y: np.ndarray):
+    return x / METROS_POR_GRADO_LNG + ORIGEN_LNG, y / METROS_POR_GRADO_LAT + ORIGEN_LAT
+
+
+def hexagonos(lng: np.ndarray, lat: np.ndarray, tamano_m: float, k_minimo: int = 1) -> Dict:
+    """
+    Conteo por grilla hexagonal (hexágonos "pointy-top" de radio `tamano_m`).
+    Retorna un FeatureCollection con un polígono por hexágono no vacío.
+    """
+    features = []
+    if len(lng) == 0:
+        return {"type": "FeatureCollection", "features": features}
+
+    x, y = a_metros(lng, lat)
+    # Coordenadas axiales fraccionarias -> redondeo cúbico vectorizado
+    q = (math.sqrt(3) / 3 * x - y / 3) / tamano_m
+    r = (2 / 3 * y) / tamano_m
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    corregir_q = (dq > dr) & (dq > ds)
+    corregir_r = ~corregir_q & (dr > ds)
+    rq = np.where(corregir_q, -rr - rs, rq)
+    rr = np.where(corregir_r, -rq - rs, rr)
+
+    celdas, conteos = np.unique(np.stack([rq, rr], axis=1).astype(np.int64), axis=0, return_counts=True)
+    mantener = conteos >= k_minimo
+    celdas, conteos = celdas[mantener], conteos[mantener]
+
+    # Centros y vértices de cada hexágono
+    cx = tamano_m * math.sqrt(3) * (celdas[:, 0] + celdas[:, 1] / 2)
+    cy = tamano_m * 1.5 * celdas[:, 1]
+    angulos = np.radians(np.arange(6) * 60 + 30)
+    vx = cx[:, None] + tamano_m * np.cos(angulos)[None, :]
+    vy = cy[:, None] + tamano_m * np.sin(angulos)[None, :]
+    vlng, vlat = a_grados(vx, vy)
+
+    for i in range(len(conteos)):
+        anillo = [[round(float(vlng[i, j]), 6), round(float(vlat[i, j]), 6)] for j in range(6)]
+        anillo.append(anillo[0])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [anillo]},
+            "properties": {"q": int(celdas[i, 0]), "r": int(celdas[i, 1]), "total": int(conteos[i])}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _convolucion_fft(matriz: np.ndarray, nucleo: np.ndarray) -> np.ndarray:
+    """Convolución 2D ('same') vía FFT con relleno para evitar el solapamiento circular."""
+    forma = (matriz.shape[0] + nucleo.shape[0] - 1, matriz.shape[1] + nucleo.shape[1] - 1)
+    completa = np.fft.irfft2(np.fft.rfft2(matriz, forma) * np.fft.rfft2(nucleo, forma), forma)
+    f0, c0 = nucleo.shape[0] // 2, nucleo.shape[1] // 2
+    return completa[f0:f0 + matriz.shape[0], c0:c0 + matriz.shape[1]]
+
+
+def kde(lng: np.ndarray, lat: np.ndarray, celda_m: float, banda_m: float) -> Optional[Dict]:
+    """
+    Superficie de densidad Kernel Gaussiana (eventos por km²): histograma 2D de los
+    puntos convolucionado con un núcleo gaussiano de desviación `banda_m`.
+    """
+    if len(lng) == 0:
+        return None
+
+    x, y = a_metros(lng, lat)
+    margen = 3 * banda_m
+    x0, x1 = x.min() - margen, x.max() + margen
+    y0, y1 = y.min() - margen, y.max() + margen
+    columnas = int(math.ceil((x1 - x0) / celda_m))
+    filas = int(math.ceil((y1 - y0) / celda_m))
+    if columnas > MAX_CELDAS_LADO or filas > MAX_CELDAS_LADO:
+        raise RasterDemasiadoGrande(
+            f"La grilla KDE ({filas}x{columnas}) supera {MAX_CELDAS_LADO} celdas por lado; aumente celda_m"
+        )
+
+    hist, _, _ = np.histogram2d(
+        y, x,
+        bins=[filas, columnas],
+        range=[[y0, y0 + filas * celda_m], [x0, x0 + columnas * celda_m]]
+    )
+
+    radio = max(1, int(math.ceil(3 * banda_m / celda_m)))
+    eje = np.arange(-radio, radio + 1) * celda_m
+    gauss = np.exp(-0.5 * (eje / banda_m) ** 2)
+    nucleo = np.outer(gauss, gauss)
+    nucleo /= nucleo.sum()
+
+    densidad = np.clip(_convolucion_fft(hist, nucleo), 0, None) / ((celda_m / 1000) ** 2)
+
+    lng0, lat0 = a_grados(np.array(x0), np.array(y0))
+    lng1, lat1 = a_grados(np.array(x0 + columnas * celda_m), np.array(y0 + filas * celda_m))
+    return {
+        "bbox": [round(float(lng0), 6), round(float(lat0), 6), round(float(lng1), 6), round(float(lat1), 6)],
+        "filas": filas,
+        "columnas": columnas,
+        "celda_m": celda_m,
+        "banda_m": banda_m,
+        "unidad": "eventos/km2",
+        "maximo": round(float(densidad.max()), 4),
+        # Fila 0 = borde sur del bbox, columna 0 = borde oeste
+        "valores": np.round(densidad, 4).tolist()
+    }
+
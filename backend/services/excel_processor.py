@@ -1,12 +1,37 @@
+import hashlib
+import numpy as np
 import pandas as pd
 import unicodedata
 import logging
 from datetime import datetime, date
-from typing import List, Dict, Generator
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 import io
 
+from services import categorias, lectura_tabular
+from services.lectura_tabular import TAMANO_LOTE
+
 logger = logging.getLogger("sisc_api")
 
+# Columnas (normalizadas) de los Excel de MinDefensa que usa la ingesta
+COLUMNAS_NACIONAL = ("DEPARTAMENTO", "MUNICIPIO", "FECHA", "CANTIDAD", "TOTAL")
+# Columnas de los lotes que genera process_excel (campos de NationalCrimeStats)
+COLUMNAS_REGISTRO = [
+    "departamento", "municipio", "municipio_normalizado", "fecha_hecho", "anio", "mes",
+    "tipo_delito", "cantidad", "fuente_archivo", "hash_registro", "fecha_ingesta",
+]
+
+class ArchivoNoProcesable(ValueError):
+    pass
+
+
+def _tipo_conteo(valor) -> str:
+    if valor is None:
+        return "vacio"
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return "otro"
+    return "entero" if isinstance(valor, int) else "decimal"
+
+
 class NationalStatsProcessor:
     def __init__(self):
         self.municipios_cache = {} # Para memoizar normalizaciones
@@ -28,105 +53,217 @@ class NationalStatsProcessor:
         text = text.replace(".", "")
         return text
 
-    def process_excel(self, file_content: bytes, filename: str, inferred_crime_type: str = None) -> Generator[Dict, None, None]:
+    def process_excel(self, file_content: Union[bytes, BinaryIO], filename: str, inferred_crime_type: str = None) -> Iterator[pd.DataFrame]:
         """
-        Procesa el archivo Excel y genera diccionarios listos para insertar en DB.
+        Procesa el archivo Excel y genera lotes (DataFrame con COLUMNAS_REGISTRO) listos
+        para carga_nacional.cargar. `file_content` puede ser el contenido en bytes o un
+        archivo binario con seek (p.ej. el temporal de una subida). Antes se recorre solo
+        la columna de conteo para fijar el formato de la cantidad en el hash (ver
+        _formato_cantidad, sin guardar filas); luego cada lote de leer_lotes se
+        transforma por columnas y se entrega en cuanto se lee, de modo que la memoria
+        depende del tamaño del lote y no del archivo.
+        Un libro ilegible o sin encabezado/columnas requeridas lanza una excepción
+        (ArchivoNoProcesable en el segundo caso) en lugar de generar cero lotes.
         """
-        try:
-            # Leer excel en memoria
-            xls = pd.ExcelFile(io.BytesIO(file_content))
-            
-            # Asumimos que la primera hoja tiene los datos relevantes
-            # MinDefensa suele tener encabezados en filas 5-8. 
-            # Estrategia robusta: buscar la fila donde empieza "DEPARTAMENTO" o "MUNICIPIO"
-            df = pd.read_excel(xls, sheet_name=0, header=None)
-            
-            header_row_idx = self._find_header_row(df)
-            if header_row_idx == -1:
-                logger.error(f"No se encontró fila de encabezado en {filename}")
-                return
+        if isinstance(file_content, bytes):
+            file_content = io.BytesIO(file_content)
 
-            # Recargar con el encabezado correcto
-            df = pd.read_excel(xls, sheet_name=0, header=header_row_idx)
-            
-            # Normalizar nombres de columnas
-            df.columns = [self.normalize_text(str(c)) for c in df.columns]
-            
-            # Validar columnas mínimas
-            required_cols = ["MUNICIPIO", "DEPARTAMENTO"]
-            if not all(col in df.columns for col in required_cols):
-                logger.error(f"Faltan columnas requeridas en {filename}: {df.columns}")
-                return
-                
-            # Identificar año del archivo o columnas de fecha
-            # Si el archivo es multianual, debe tener columna FECHA o ANIO
-            has_date_col = "FECHA" in df.columns
-            file_year = self._extract_year_from_filename(filename)
-            
-            for _, row in df.iterrows():
-                try:
-                    municipio = row.get("MUNICIPIO")
-                    if pd.isna(municipio) or municipio == "TOTAL":
-                        continue
-                        
-                    dept = row.get("DEPARTAMENTO")
-                    municipio_norm = self.normalize_text(municipio)
-                    
-                    # Determinar tipo de delito (Prioridad: Inferred > Filename)
-                    tipo_delito = inferred_crime_type or self._infer_crime_type(filename)
-                    
-                    # Determinar fecha y año
-                    if has_date_col:
-                        fecha_raw = row.get("FECHA")
-                        # Parsear fecha (asumiendo datetime o string)
-                        fecha_obj = self._parse_date(fecha_raw)
-                    else:
-                        # Si no hay fecha exacta, asumimos por nombre de columna (ej: Enero, Febrero...)
-                        # O si es consolidado anual, usamos 1ro de Enero
-                        fecha_obj = date(file_year, 1, 1)
-
-                    if not fecha_obj:
-                        continue
-
-                    # Extraer conteo (sumar columnas de delitos si hay desglose)
-                    cantidad = row.get("CANTIDAD", 1) # Default 1 si es registro individual
-                    if "TOTAL" in row:
-                        cantidad = row["TOTAL"]
-                    
-                    # Generar hash único para evitar duplicados
-                    import hashlib
-                    hash_input = f"{municipio_norm}|{fecha_obj}|{tipo_delito}|{cantidad}"
-                    registro_hash = hashlib.sha256(hash_input.encode()).hexdigest()
-                    
-                    # Construir objeto
-                    yield {
-                        "departamento": str(dept),
-                        "municipio": str(municipio),
-                        "municipio_normalizado": municipio_norm,
-                        "fecha_hecho": fecha_obj,
-                        "anio": fecha_obj.year,
-                        "mes": fecha_obj.month,
-                        "tipo_delito": tipo_delito,
-                        "cantidad": int(cantidad) if pd.notnull(cantidad) else 0,
-                        "fuente_archivo": filename,
-                        "hash_registro": registro_hash,
-                        "fecha_ingesta": datetime.utcnow()
-                    }
-                    
-                except Exception as row_err:
-                    logger.warning(f"Error procesando fila en {filename}: {row_err}")
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"Error general procesando Excel {filename}: {e}")
-
-    def _find_header_row(self, df) -> int:
-        """Busca la fila que contiene 'MUNICIPIO'"""
-        for i, row in df.iterrows():
-            row_vals = [str(x).upper() for x in row.values]
-            if "MUNICIPIO" in row_vals:
-                return i
-        return -1
+        # Si el archivo es multianual, debe tener columna FECHA
+        file_year = self._extract_year_from_filename(filename)
+        # Determinar tipo de delito (Prioridad: Inferred > Filename)
+        tipo_delito = inferred_crime_type or self._infer_crime_type(filename)
+
+        inicio = file_content.tell()
+        formato = self._formato_cantidad(self.tipos_cantidad(file_content, filename))
+        file_content.seek(inicio)
+        for lote in self.leer_lotes(file_content, filename):
+            registros = self._transformar_lote(lote, filename, file_year, tipo_delito)
+            if not registros.empty:
+                yield self._agregar_hash(registros, tipo_delito, formato)
+
+    def _transformar_lote(self, lote: pd.DataFrame, filename: str, file_year: int, tipo_delito: str) -> pd.DataFrame:
+        municipio = lote["MUNICIPIO"]
+        lote = lote[municipio.notna() & (municipio != "TOTAL")]
+        if lote.empty:
+            return pd.DataFrame(columns=COLUMNAS_REGISTRO)
+
+        # Determinar fecha: columna FECHA o, en consolidados anuales, 1ro de Enero
+        if "FECHA" in lote.columns:
+            fechas = self._parse_dates(lote["FECHA"])
+        else:
+            fechas = pd.Series(date(file_year, 1, 1), index=lote.index, dtype=object)
+
+        # Extraer conteo (TOTAL si hay desglose, si no CANTIDAD; 1 si es registro individual)
+        if "TOTAL" in lote.columns or "CANTIDAD" in lote.columns:
+            cantidad = lote["TOTAL" if "TOTAL" in lote.columns else "CANTIDAD"]
+        else:
+            cantidad = pd.Series(1, index=lote.index, dtype=object)
+        cantidad_num = pd.to_numeric(cantidad, errors="coerce")
+
+        # Sin fecha, o con un conteo presente pero no numérico: la fila se descarta
+        validas = fechas.notna() & (cantidad_num.notna() | cantidad.isna())
+        if not validas.all():
+            logger.warning(f"{int((~validas).sum())} filas sin fecha o con cantidad inválida en {filename}")
+        lote, fechas, cantidad, cantidad_num = lote[validas], fechas[validas], cantidad[validas], cantidad_num[validas]
+        if lote.empty:
+            return pd.DataFrame(columns=COLUMNAS_REGISTRO)
+
+        municipio = lote["MUNICIPIO"]
+        municipio_norm = self._normalizar_municipios(municipio)
+        fechas_dt = pd.to_datetime(fechas)
+
+        dept = lote["DEPARTAMENTO"]
+        return pd.DataFrame({
+            "departamento": dept.where(dept.notna(), np.nan).astype(str),
+            "municipio": municipio.astype(str),
+            "municipio_normalizado": municipio_norm,
+            "fecha_hecho": fechas,
+            "anio": fechas_dt.dt.year,
+            "mes": fechas_dt.dt.month,
+            "tipo_delito": tipo_delito,
+            "cantidad": cantidad_num.fillna(0).astype("int64"),
+            "fuente_archivo": filename,
+            "hash_registro": None,
+            "fecha_ingesta": datetime.utcnow(),
+            "_cantidad_original": cantidad,
+        }, index=lote.index)
+
+    def _formato_cantidad(self, tipos: set) -> str:
+        """
+        Tipo que pandas.read_excel le daba a la columna de conteo en toda la hoja, del
+        que depende cómo se escribe la cantidad en el hash: "object" si hubo textos,
+        "float" si hubo celdas vacías o decimales ("3.0"), "int" si solo enteros ("3").
+        """
+        if "otro" in tipos:
+            return "object"
+        if tipos & {"vacio", "decimal"}:
+            return "float"
+        return "int"
+
+    def _agregar_hash(self, registros: pd.DataFrame, tipo_delito: str, formato: str) -> pd.DataFrame:
+        """
+        Hash único para evitar duplicados: sha256("municipio|fecha|delito|cantidad"),
+        idéntico al de la lectura fila a fila con pandas (mismos registros ya cargados).
+        """
+        cantidad = registros["_cantidad_original"]
+        if formato == "float":
+            texto = pd.to_numeric(cantidad).astype(float).astype(str)
+        elif formato == "int":
+            texto = cantidad.astype("int64").astype(str)
+        else:
+            texto = cantidad.where(cantidad.notna(), np.nan).astype(str)
+        entradas = registros["municipio_normalizado"] + "|" + registros["fecha_hecho"].astype(str) \
+            + f"|{tipo_delito}|" + texto
+        registros["hash_registro"] = [hashlib.sha256(e.encode()).hexdigest() for e in entradas]
+        return registros[COLUMNAS_REGISTRO]
+
+    def _normalizar_municipios(self, municipios: pd.Series) -> pd.Series:
+        """normalize_text una vez por municipio distinto (memoizado en municipios_cache)."""
+        for valor in municipios.unique():
+            if valor not in self.municipios_cache:
+                self.municipios_cache[valor] = self.normalize_text(valor)
+        return municipios.map(self.municipios_cache)
+
+    def _parse_dates(self, valores: pd.Series) -> pd.Series:
+        """_parse_date por columna: directo si ya son fechas, si no una vez por valor distinto."""
+        if pd.api.types.is_datetime64_any_dtype(valores):
+            return valores.dt.date.where(valores.notna(), None)
+        memo = {v: self._parse_date(v) for v in valores.dropna().unique()}
+        return valores.map(memo).where(valores.notna(), None)
+
+    def _encabezado(self, filas: Iterator[Tuple], filename: str) -> Dict[str, int]:
+        """
+        Consume `filas` hasta el encabezado (MinDefensa pone títulos en las primeras
+        filas: es la primera con una celda "MUNICIPIO") y retorna la posición de cada
+        columna de COLUMNAS_NACIONAL presente.
+        """
+        for fila in filas:
+            if any(isinstance(v, str) and v.upper() == "MUNICIPIO" for v in fila):
+                encabezado = [self.normalize_text(str(c)) for c in fila]
+                break
+        else:
+            raise ArchivoNoProcesable(f"No se encontró fila de encabezado en {filename}")
+
+        # Primera aparición de cada columna (como pandas con encabezados repetidos)
+        posiciones = {}
+        for i, columna in enumerate(encabezado):
+            if columna in COLUMNAS_NACIONAL:
+                posiciones.setdefault(columna, i)
+        if not all(col in posiciones for col in ("MUNICIPIO", "DEPARTAMENTO")):
+            raise ArchivoNoProcesable(f"Faltan columnas requeridas en {filename}: {encabezado}")
+        return posiciones
+
+    @staticmethod
+    def _columna_conteo(posiciones: Dict[str, int]) -> Optional[str]:
+        return "TOTAL" if "TOTAL" in posiciones else ("CANTIDAD" if "CANTIDAD" in posiciones else None)
+
+    @staticmethod
+    def _valor_conteo(fila: Tuple, i_conteo: int):
+        valor = fila[i_conteo] if i_conteo < len(fila) else None
+        # Como el lector de pandas: los decimales enteros (3.0) se leen como int
+        if isinstance(valor, float) and valor.is_integer():
+            return int(valor)
+        return valor
+
+    def tipos_cantidad(self, archivo: BinaryIO, filename: str) -> set:
+        """
+        Pasada previa que solo mira la columna de conteo (TOTAL o CANTIDAD): tipos vistos
+        en todas las filas no vacías (incluidas totales y notas al pie), ver
+        _formato_cantidad. No guarda filas.
+        """
+        filas = self._iterar_filas(archivo, filename)
+        posiciones = self._encabezado(filas, filename)
+        i_conteo = posiciones.get(self._columna_conteo(posiciones))
+        tipos = set()
+        if i_conteo is not None:
+            for fila in filas:
+                if any(v is not None for v in fila):
+                    tipos.add(_tipo_conteo(self._valor_conteo(fila, i_conteo)))
+        return tipos
+
+    def leer_lotes(self, archivo: BinaryIO, filename: str, tamano_lote: int = TAMANO_LOTE) -> Iterator[pd.DataFrame]:
+        """
+        Lee la primera hoja en una sola pasada (openpyxl `read_only`, fila a fila).
+        Genera lotes de `tamano_lote` filas solo con las columnas que usa la ingesta
+        (COLUMNAS_NACIONAL presentes), con tipos inferidos por pandas (enteros, fechas);
+        las filas sin municipio se descartan al leer. La columna de conteo (TOTAL o
+        CANTIDAD) se deja como object con los valores originales.
+        """
+        filas = self._iterar_filas(archivo, filename)
+        posiciones = self._encabezado(filas, filename)
+
+        columnas = list(posiciones)
+        indices = [posiciones[c] for c in columnas]
+        i_municipio = posiciones["MUNICIPIO"]
+        conteo = self._columna_conteo(posiciones)
+        i_conteo = posiciones.get(conteo)
+        lote = []
+        for fila in filas:
+            if i_conteo is not None and i_conteo < len(fila) and isinstance(fila[i_conteo], float):
+                fila = fila[:i_conteo] + (self._valor_conteo(fila, i_conteo),) + fila[i_conteo + 1:]
+            if i_municipio >= len(fila) or fila[i_municipio] is None:
+                continue
+            lote.append(tuple(fila[i] if i < len(fila) else None for i in indices))
+            if len(lote) >= tamano_lote:
+                yield self._lote(lote, columnas, conteo)
+                lote = []
+        if lote:
+            yield self._lote(lote, columnas, conteo)
+
+    def _lote(self, filas: List[Tuple], columnas: List[str], conteo: str) -> pd.DataFrame:
+        lote = pd.DataFrame.from_records(filas, columns=columnas)
+        if conteo:
+            j = columnas.index(conteo)
+            lote[conteo] = pd.Series([f[j] for f in filas], index=lote.index, dtype=object)
+        return lote
+
+    def _iterar_filas(self, archivo: BinaryIO, filename: str) -> Iterator[Tuple]:
+        # Los .xls antiguos no admiten lectura por filas: se leen completos una sola vez
+        if filename.lower().endswith(".xls"):
+            hoja = pd.read_excel(archivo, sheet_name=0, header=None)
+            yield from hoja.astype(object).where(hoja.notna(), None).itertuples(index=False, name=None)
+        else:
+            yield from lectura_tabular.iterar_filas_xlsx(archivo)
 
     def _extract_year_from_filename(self, filename: str) -> int:
         import re
@@ -146,23 +283,4 @@ class NationalStatsProcessor:
         return None # Dejar que el llamador lo maneje
 
     def _infer_crime_type(self, filename: str) -> str:
-        name = self.normalize_text(filename).upper()
-        if "HOMICIDIO INTENCIONAL" in name: return "Homicidio Intencional"
-        if "HOMICIDIO ACCIDENTES" in name: return "Homicidio (Tránsito)"
-        if "LESIONES COMUNES" in name: return "Lesiones Personales"
-        if "LESIONES ACCIDENTES" in name: return "Lesiones (Tránsito)"
-        if "HURTO PERSONAS" in name: return "Hurto Personas"
-        if "HURTO COMERCIO" in name: return "Hurto Comercio"
-        if "HURTO RESIDENCIAS" in name: return "Hurto Residencias"
-        if "HURTO VEHICULOS" in name: return "Hurto Vehículos"
-        if "EXTORSION" in name: return "Extorsión"
-        if "SECUESTRO" in name: return "Secuestro"
-        if "SEXUALES" in name: return "Delitos Sexuales"
-        if "INTRAFAMILIAR" in name: return "Violencia Intrafamiliar"
-        if "TERRORISMO" in name: return "Terrorismo"
-        if "MEDIO AMBIENTE" in name: return "Delitos Ambientales"
-        if "INFORMATICOS" in name: return "Delitos Informáticos"
-        if "MASACRES" in name: return "Masacres"
-        if "HOMICIDIO" in name: return "Homicidio"
-        if "HURTO" in name: return "Hurto"
-        return "Delito General"
+        return categorias.NACIONAL.normalizar(self.normalize_text(filename).upper())
@@ -0,0 +1,104 @@
+import json
+import math
+from typing import Optional, Tuple
+
+from shapely import wkt as shapely_wkt
+from shapely.geometry import shape
+from sqlalchemy import text
+
+RADIO_MAX_M = 50000
+METROS_POR_GRADO = 111320.0
+
+
+class FiltroEspacialInvalido(ValueError):
+    pass
+
+
+class FiltroEspacial:
+    """
+    Filtro espacial sobre eventos (bbox, punto + radio y/o polígono), traducido a
+    predicados PostGIS que aprovechan los índices GIST de `events`.
+    `columna` es location_geom (institucional) o public_geom (Modo Abierto).
+    """
+
+    def __init__(self, bbox: Optional[str] = None, near: Optional[str] = None,
+                 radius_m: Optional[float] = None, poligono: Optional[str] = None,
+                 columna: str = "location_geom"):
+        self.columna = columna
+        self.bbox = self._parsear_bbox(bbox) if bbox else None
+        self.cerca = self._parsear_cerca(near, radius_m) if near else None
+        self.poligono_wkt = self._parsear_poligono(poligono) if poligono else None
+        if radius_m is not None and not near:
+            raise FiltroEspacialInvalido("radius_m requiere el parámetro near=lng,lat")
+
+    @property
+    def activo(self) -> bool:
+        return bool(self.bbox or self.cerca or self.poligono_wkt)
+
+    def clave(self) -> Tuple:
+        """Representación estable para claves de caché."""
+        return (self.columna, self.bbox, self.cerca, self.poligono_wkt)
+
+    @staticmethod
+    def _numeros(valor: str, cantidad: int, nombre: str):
+        try:
+            numeros = [float(v) for v in valor.split(",")]
+        except ValueError:
+            numeros = []
+        if len(numeros) != cantidad:
+            raise FiltroEspacialInvalido(f"{nombre} debe tener {cantidad} números separados por coma")
+        return numeros
+
+    def _parsear_bbox(self, bbox: str):
+        minx, miny, maxx, maxy = self._numeros(bbox, 4, "bbox")
+        if minx >= maxx or miny >= maxy:
+            raise FiltroEspacialInvalido("bbox debe ser minx,miny,maxx,maxy con min < max")
+        return (minx, miny, maxx, maxy)
+
+    def _parsear_cerca(self, near: str, radius_m: Optional[float]):
+        lng, lat = self._numeros(near, 2, "near")
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise FiltroEspacialInvalido("near fuera de rango (lng,lat)")
+        if radius_m is None or not (0 < radius_m <= RADIO_MAX_M):
+            raise FiltroEspacialInvalido(f"radius_m debe estar entre 0 y {RADIO_MAX_M} metros")
+        return (lng, lat, float(radius_m))
+
+    def _parsear_poligono(self, poligono: str) -> str:
+        try:
+            if poligono.lstrip().startswith("{"):
+                geojson = json.loads(poligono)
+                geom = shape(geojson.get("geometry", geojson))
+            else:
+                geom = shapely_wkt.loads(poligono)
+        except Exception:
+            raise FiltroEspacialInvalido("poligono debe ser WKT o GeoJSON válido")
+        if geom.geom_type not in ("Polygon", "MultiPolygon") or not geom.is_valid:
+            raise FiltroEspacialInvalido("poligono debe ser un Polygon/MultiPolygon válido")
+        return geom.wkt
+
+    def condicion_sql(self, alias: str = "events"):
+        """Retorna (fragmento SQL, parámetros) para consultas en texto."""
+        col = f"{alias}.{self.columna}"
+        partes, params = [], {}
+        if self.bbox:
+            partes.append(f"ST_Intersects({col}, ST_MakeEnvelope(:fe_minx, :fe_miny, :fe_maxx, :fe_maxy, 4326))")
+            params.update(zip(("fe_minx", "fe_miny", "fe_maxx", "fe_maxy"), self.bbox))
+        if self.cerca:
+            lng, lat, radio = self.cerca
+            # Prefiltro en grados (usa el índice GIST) + distancia exacta en metros
+            grados = radio / (METROS_POR_GRADO * max(math.cos(math.radians(lat)), 0.01))
+            punto = "ST_SetSRID(ST_MakePoint(:fe_lng, :fe_lat), 4326)"
+            partes.append(
+                f"ST_DWithin({col}, {punto}, :fe_grados) "
+                f"AND ST_DWithin({col}::geography, {punto}::geography, :fe_radio)"
+            )
+            params.update(fe_lng=lng, fe_lat=lat, fe_grados=grados, fe_radio=radio)
+        if self.poligono_wkt:
+            partes.append(f"ST_Intersects({col}, ST_GeomFromText(:fe_wkt, 4326))")
+            params["fe_wkt"] = self.poligono_wkt
+        return " AND ".join(f"({p})" for p in partes), params
+
+    def condicion(self, alias: str = "events"):
+        """Predicado listo para `.filter()` / `.where()` de SQLAlchemy."""
+        sql, params = self.condicion_sql(alias)
+        return text(sql).bindparams(**params)
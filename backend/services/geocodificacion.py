@@ -0,0 +1,301 @@
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from services import version_datos
+
+# Nomenclátor de barrios y corregimientos de Jamundí con un punto de referencia, para
+# ubicar eventos que llegan sin coordenadas. Se siembra en la tabla barrios_referencia
+# (create_tables) y se puede ampliar en la BD sin tocar el código: quien la modifique
+# debe incrementar la versión del dominio "barrios" (version_datos.incrementar, o
+# UPDATE data_versions SET version = version + 1 WHERE dominio = 'barrios') para que
+# los workers recarguen el índice.
+BARRIOS_SEMILLA = (
+    # Casco Urbano - Sectores principales
+    ("CENTRO", 3.2606, -76.5364),
+    ("EL ROSARIO", 3.2635, -76.5300),
+    ("EL JORDAN", 3.2720, -76.5340),
+    ("PORTALES DEL JORDAN", 3.2730, -76.5350),
+    ("PORTAL DE JORDAN", 3.2730, -76.5350),
+    ("TERRANOVA", 3.2690, -76.5315),
+    ("BONANZA", 3.2542, -76.5412),
+    ("ALFAGUARA", 3.2505, -76.5350),
+    ("VERDE ALFAGUARA", 3.2480, -76.5380),
+    ("PASADENA", 3.2580, -76.5380),
+    ("SACHAMATE", 3.2750, -76.5280),
+    ("PANGOLA", 3.2760, -76.5260),
+    ("CIUDAD SUR", 3.2530, -76.5450),
+    ("BELALCAZAR", 3.2620, -76.5330),
+    ("LAS ACACIAS", 3.2650, -76.5250),
+    ("LA ESPERANZA", 3.2680, -76.5380),
+    ("EL JARDIN", 3.2560, -76.5320),
+    ("CIRO VELASCO", 3.2590, -76.5300),
+    ("ARIZONA", 3.2510, -76.5390),
+    ("LOS CHALOS", 3.2550, -76.5490),
+    ("FARALLONES", 3.2600, -76.5500),
+    ("VILLA COLOMBIA", 3.2650, -76.5420),
+    ("SANTUARIO", 3.2680, -76.5450),
+    ("ZARAGOZA", 3.2700, -76.5400),
+    ("MANDARINOS", 3.2520, -76.5320),
+    ("COVICEDROS", 3.2540, -76.5300),
+    # Nuevos Barrios y Urbanizaciones
+    ("JUAN PABLO II", 3.2670, -76.5280),
+    ("EL CAIRO", 3.2550, -76.5250),
+    ("LA PRADERA", 3.2620, -76.5180),
+    ("RINCON DE JAMUNDI", 3.2580, -76.5220),
+    ("CIUDAD COUNTRY", 3.2820, -76.5250),
+    ("CASTILA", 3.2830, -76.5260),
+    ("ARBOLEDA", 3.2780, -76.5300),
+    ("LAS FLORES", 3.2590, -76.5320),
+    ("SOLAR DE JAMUNDI", 3.2510, -76.5420),
+    ("PARQUE NATURA", 3.2880, -76.5320),
+    ("PAGOLA", 3.2760, -76.5260),
+    ("LOS NARANJOS", 3.2560, -76.5350),
+    ("MARBELLA", 3.2630, -76.5380),
+    ("TORRES DE JAMUNDI", 3.2580, -76.5310),
+    ("LIBERTADORES", 3.2620, -76.5350),
+    ("PRIMERO DE MAYO", 3.2650, -76.5390),
+    ("JALISCO", 3.2600, -76.5420),
+    ("OCEANO VERDE", 3.2450, -76.5550),
+    ("BOSQUELAGO", 3.2650, -76.5450),
+    ("CIUDAD DE DIOS", 3.2500, -76.5400),
+    ("CIUDADELA DEL VIENTO", 3.2700, -76.5300),
+    ("EL RODEO", 3.2550, -76.5500),
+    ("OPORTO", 3.2520, -76.5350),
+    ("LOS CINCO SOLES", 3.2450, -76.5400),
+    ("VERDI", 3.2480, -76.5420),
+    ("PARQUES", 3.2500, -76.5450),
+    # Corregimientos / Zonas Rurales
+    ("POTRERITO", 3.2380, -76.5950),
+    ("QUINAMAYO", 3.2050, -76.5150),
+    ("VILLA PAZ", 3.1850, -76.4950),
+    ("ROBLES", 3.1600, -76.4800),
+    ("GUACHINTE", 3.1400, -76.5100),
+    ("SAN ISIDRO", 3.1900, -76.5500),
+    ("LA LIBERIA", 3.2100, -76.6200),
+    ("SAN ANTONIO", 3.2000, -76.6500),
+    ("AMPUDIA", 3.2500, -76.6000),
+    ("PASO DE LA BOLSA", 3.2450, -76.4750),
+    ("BOCAS DEL PALO", 3.2800, -76.4600),
+    ("TIMBA", 3.1050, -76.6150),
+    ("PUENTE VELEZ", 3.2200, -76.6800),
+    ("SAN VICENTE", 3.2800, -76.6500),
+    ("CHAGRES", 3.1850, -76.4750),
+    ("LA MESETA", 3.1650, -76.6400),
+    ("PEON", 3.2250, -76.6200),
+    # Vías y otros
+    ("VIA CALI", 3.2850, -76.5250),
+    ("VIA CALI JAMUNDI", 3.2850, -76.5250),
+    ("VIA SANTANDER", 3.2400, -76.5300),
+    # Sectores de la estación E24 (antes fijados a mano en patch_coords.py)
+    ("PORTAL DE JORDAN E24", 3.2505, -76.5412),
+    ("VIA CALI JAMUNDI E24", 3.2753, -76.5281),
+    ("EL RODEO E24", 3.2598, -76.5345),
+)
+
+# Similitud mínima (coeficiente de Dice sobre trigramas) para aceptar una coincidencia aproximada
+UMBRAL_SIMILITUD = 0.7
+# Nombres más cortos no se comparan por aproximación ("CALI", "VERDE"): con pocos
+# trigramas cualquier barrio parecido supera el umbral
+MIN_LONGITUD_APROXIMADA = 6
+# Tipos de coincidencia (el de aproximado se reporta aparte en la carga y la vista previa)
+EXACTO = "exacto"
+CONTENIDO = "contenido"
+APROXIMADO = "aproximado"
+# Nombres consultados que se recuerdan por índice (memoización)
+MAX_MEMO = 20000
+
+
+def normalizar_nombre(nombre) -> str:
+    """Mayúsculas, sin tildes ni signos y con espacios simples: "B/ Él Jordán" -> "B EL JORDAN"."""
+    if nombre is None or (isinstance(nombre, float) and pd.isna(nombre)):
+        return ""
+    texto = unicodedata.normalize('NFD', str(nombre)).encode('ascii', 'ignore').decode('ascii')
+    return " ".join(re.sub(r'[^A-Z0-9]+', ' ', texto.upper()).split())
+
+
+def _trigramas(texto: str) -> set:
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def _dice(a: set, b: set) -> float:
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _palabras_compatibles(clave: str, nombre: str) -> bool:
+    """
+    Cada palabra significativa de la consulta debe parecerse a alguna del barrio o
+    estar contenida en él ("TERRA NOVA" ~ "TERRANOVA"). Evita aceptar "VILLA SOL" por
+    "VILLA PAZ", donde el parecido lo aporta solo la palabra común.
+    """
+    palabras = nombre.split()
+    junto = nombre.replace(" ", "")
+    for palabra in clave.split():
+        if len(palabra) < 3 or palabra.isdigit() or palabra in junto:
+            continue
+        trigramas = _trigramas(palabra)
+        if max(_dice(trigramas, _trigramas(p)) for p in palabras) < 0.5:
+            return False
+    return True
+
+
+class Gazetteer:
+    """
+    Índice en memoria del nomenclátor. La búsqueda de un nombre normalizado es:
+    1) coincidencia exacta; 2) el barrio conocido más largo contenido como palabras
+    completas (p.ej. "URB PORTALES DEL JORDAN ETAPA 2"); 3) el más parecido por trigramas
+    si la consulta tiene al menos MIN_LONGITUD_APROXIMADA caracteres, supera
+    UMBRAL_SIMILITUD y sus palabras calzan con las del barrio. Los candidatos de 2) y 3)
+    salen del índice invertido de trigramas, sin recorrer todo el nomenclátor. Los
+    resultados (nombre y tipo de coincidencia) se memorizan.
+    """
+
+    def __init__(self, entradas: Iterable[Tuple[str, float, float]]):
+        self._puntos: Dict[str, Tuple[float, float]] = {}
+        for nombre, lat, lng in entradas:
+            clave = normalizar_nombre(nombre)
+            if clave:
+                self._puntos.setdefault(clave, (float(lat), float(lng)))
+        self._nombres: List[str] = list(self._puntos)
+        self._trigramas = [_trigramas(n) for n in self._nombres]
+        self._indice = defaultdict(list)
+        for i, trigramas in enumerate(self._trigramas):
+            for t in trigramas:
+                self._indice[t].append(i)
+        self._memo: Dict[str, Optional[Tuple[str, str]]] = {}
+
+    def __len__(self):
+        return len(self._nombres)
+
+    def _resolver(self, clave: str) -> Optional[Tuple[str, str]]:
+        if clave in self._puntos:
+            return clave, EXACTO
+        consulta = _trigramas(clave)
+        compartidos = Counter(i for t in consulta for i in self._indice.get(t, ()))
+        if not compartidos:
+            return None
+
+        # 2) Contenido: calza por palabras completas. Filtro previo: comparte todos sus
+        # trigramas salvo el de inicio de texto ("  P"), que no aparece a mitad de la consulta
+        rodeada = f" {clave} "
+        contenidos = [
+            self._nombres[i] for i, n in compartidos.items()
+            if n >= len(self._trigramas[i]) - 1 and len(self._nombres[i]) > 3
+            and f" {self._nombres[i]} " in rodeada
+        ]
+        if contenidos:
+            return max(contenidos, key=len), CONTENIDO
+
+        # 3) Aproximado (errores de digitación, letras faltantes)
+        if len(clave) < MIN_LONGITUD_APROXIMADA:
+            return None
+        i, n = max(compartidos.items(), key=lambda par: 2 * par[1] / (len(consulta) + len(self._trigramas[par[0]])))
+        similitud = 2 * n / (len(consulta) + len(self._trigramas[i]))
+        if similitud < UMBRAL_SIMILITUD or not _palabras_compatibles(clave, self._nombres[i]):
+            return None
+        return self._nombres[i], APROXIMADO
+
+    def coincidencia(self, nombre) -> Optional[Tuple[str, str]]:
+        """(barrio del nomenclátor, tipo de coincidencia) o None si no se reconoce."""
+        clave = normalizar_nombre(nombre)
+        if not clave:
+            return None
+        if clave not in self._memo:
+            if len(self._memo) >= MAX_MEMO:
+                self._memo.clear()
+            self._memo[clave] = self._resolver(clave)
+        return self._memo[clave]
+
+    def punto(self, barrio: str) -> Tuple[float, float]:
+        """(lat, lng) de un barrio del nomenclátor (nombre normalizado, p.ej. el de `coincidencia`)."""
+        return self._puntos[barrio]
+
+    def buscar(self, nombre) -> Optional[Tuple[float, float]]:
+        """(lat, lng) de referencia del barrio, o None si no se reconoce."""
+        encontrado = self.coincidencia(nombre)
+        return self._puntos[encontrado[0]] if encontrado else None
+
+    def geocodificar_serie(self, barrios: pd.Series) -> Tuple[pd.Series, pd.Series, pd.Series]:
+        """
+        Geocodifica una columna completa en una pasada: cada nombre distinto se busca
+        una sola vez. Retorna (lat, lng, tipo) alineados con `barrios`: NaN y None si no
+        hay coincidencia; `tipo` es EXACTO, CONTENIDO o APROXIMADO.
+        """
+        barrios = pd.Series(barrios, dtype=object)
+        codigos, unicos = pd.factorize(barrios)
+        encontrados = [self.coincidencia(b) for b in unicos]
+        puntos = np.array(
+            [self._puntos[e[0]] if e else (np.nan, np.nan) for e in encontrados], dtype=float
+        ).reshape(-1, 2)
+        puntos = np.vstack([puntos, [np.nan, np.nan]]) # código -1 = barrio nulo
+        tipos = np.array([e[1] if e else None for e in encontrados] + [None], dtype=object)
+        return (pd.Series(puntos[codigos, 0], index=barrios.index),
+                pd.Series(puntos[codigos, 1], index=barrios.index),
+                pd.Series(tipos[codigos], index=barrios.index))
+
+
+_gazetteer: Optional[Gazetteer] = None
+_version_gazetteer: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _leer(db: Session) -> Gazetteer:
+    filas = db.execute(text("SELECT nombre, latitud, longitud FROM barrios_referencia")).all()
+    return Gazetteer(filas or BARRIOS_SEMILLA)
+
+
+def gazetteer(db: Optional[Session] = None) -> Gazetteer:
+    """
+    Índice de proceso. Se reconstruye cuando cambia la versión del dominio "barrios"
+    (la incrementa `sembrar`), así todos los workers ven los barrios nuevos. Si la BD
+    no responde se usa el último índice construido (o la semilla). Obtenerlo una vez
+    por petición o lote, no por fila: cada llamada consulta la versión.
+    """
+    global _gazetteer, _version_gazetteer
+    propia = db is None
+    if propia:
+        from db.models import SessionLocal
+        db = SessionLocal()
+    try:
+        try:
+            version = version_datos.obtener(db, version_datos.BARRIOS)
+            with _lock:
+                if _gazetteer is None or version != _version_gazetteer:
+                    _gazetteer, _version_gazetteer = _leer(db), version
+        except Exception as e:
+            print(f"Nota: nomenclátor cargado desde la semilla ({e})")
+            with _lock:
+                if _gazetteer is None:
+                    _gazetteer = Gazetteer(BARRIOS_SEMILLA)
+        return _gazetteer
+    finally:
+        if propia:
+            db.close()
+
+
+def sembrar(db: Session):
+    """Inserta los barrios de la semilla que falten (y publica la nueva versión si hubo). No hace commit."""
+    insertados = db.execute(text("""
+        INSERT INTO barrios_referencia (nombre, nombre_normalizado, latitud, longitud)
+        SELECT * FROM unnest(
+            CAST(:nombres AS text[]), CAST(:normalizados AS text[]),
+            CAST(:lats AS float8[]), CAST(:lngs AS float8[])
+        )
+        ON CONFLICT (nombre_normalizado) DO NOTHING
+        RETURNING id
+    """), {
+        "nombres": [nombre for nombre, _, _ in BARRIOS_SEMILLA],
+        "normalizados": [normalizar_nombre(nombre) for nombre, _, _ in BARRIOS_SEMILLA],
+        "lats": [lat for _, lat, _ in BARRIOS_SEMILLA],
+        "lngs": [lng for _, _, lng in BARRIOS_SEMILLA],
+    }).all()
+    if insertados:
+        version_datos.incrementar(db, version_datos.BARRIOS)
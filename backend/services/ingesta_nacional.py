@@ -0,0 +1,62 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+
+logger = logging.getLogger("sisc_api")
+
+# Procesos que leen los Excel de MinDefensa en paralelo (1 = en el mismo proceso).
+# Por defecto todos los núcleos menos uno, que queda para la API y la carga a la BD.
+PROCESOS = int(os.getenv("SISC_INGESTA_PROCESOS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+
+def parsear_archivo(ruta: str, nombre: str, categoria: Optional[str] = None) -> Optional[pa.Table]:
+    """
+    Lee un Excel de MinDefensa (se ejecuta en un proceso del pool) y retorna sus
+    registros como una tabla Arrow con COLUMNAS_REGISTRO: viaja al proceso padre como
+    buffers por columna, no como objetos Python por fila. None si el libro es válido
+    pero no tiene registros; un libro ilegible o sin encabezado lanza la excepción,
+    que parsear_archivos entrega como `error`.
+    """
+    import pandas as pd
+    from services.excel_processor import NationalStatsProcessor
+
+    with open(ruta, "rb") as archivo:
+        lotes = list(NationalStatsProcessor().process_excel(archivo, nombre, categoria))
+    if not lotes:
+        return None
+    return pa.Table.from_pandas(pd.concat(lotes, ignore_index=True), preserve_index=False)
+
+
+def parsear_archivos(archivos: List[Dict], procesos: int = PROCESOS) -> Iterator[Tuple[Dict, Optional[pa.Table], Optional[str]]]:
+    """
+    Lee los archivos descargados (dicts con "ruta", "name" y "category") en un
+    ProcessPoolExecutor de `procesos` procesos y los entrega a medida que terminan
+    como (file_info, tabla, error). El llamador hace la carga a la BD (un solo escritor).
+    """
+    if procesos <= 1 or len(archivos) <= 1:
+        for file_info in archivos:
+            try:
+                yield file_info, parsear_archivo(file_info["ruta"], file_info["name"], file_info.get("category")), None
+            except Exception as e:
+                logger.error(f"Error leyendo {file_info['name']}: {e}")
+                yield file_info, None, str(e)
+        return
+
+    # spawn: los procesos no heredan las conexiones a la BD ni los hilos del servidor
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(procesos, len(archivos)), mp_context=contexto) as pool:
+        futuros = {
+            pool.submit(parsear_archivo, f["ruta"], f["name"], f.get("category")): f
+            for f in archivos
+        }
+        for futuro in as_completed(futuros):
+            file_info = futuros[futuro]
+            try:
+                yield file_info, futuro.result(), None
+            except Exception as e:
+                logger.error(f"Error leyendo {file_info['name']}: {e}")
+                yield file_info, None, str(e)
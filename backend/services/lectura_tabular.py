@@ -0,0 +1,72 @@
+import os
+from typing import BinaryIO, Iterator, Tuple
+
+import pandas as pd
+
+# Filas por lote al leer archivos grandes: acota la memoria al tamaño del lote
+TAMANO_LOTE = int(os.getenv("SISC_INGESTA_LOTE", "5000"))
+
+
+class FormatoNoSoportado(ValueError):
+    pass
+
+
+def iterar_filas_xlsx(archivo: BinaryIO) -> Iterator[Tuple]:
+    """
+    Recorre las filas de la primera hoja de un .xlsx sin cargar el libro en memoria
+    (openpyxl `read_only`). Cada fila es una tupla de valores.
+    """
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        for fila in hoja.iter_rows(values_only=True):
+            yield fila
+    finally:
+        libro.close()
+
+
+def _lotes_xlsx(archivo: BinaryIO, tamano_lote: int, encabezado: bool) -> Iterator[pd.DataFrame]:
+    filas = iterar_filas_xlsx(archivo)
+    if encabezado:
+        primera = next(filas, None)
+        if primera is None:
+            return
+        columnas = [str(c) if c is not None else f"columna_{i}" for i, c in enumerate(primera)]
+    else:
+        columnas = None
+
+    lote = []
+    for fila in filas:
+        # Las hojas en modo read_only pueden reportar filas vacías al final
+        if all(v is None for v in fila):
+            continue
+        lote.append(fila[:len(columnas)] if columnas else fila)
+        if len(lote) >= tamano_lote:
+            yield pd.DataFrame.from_records(lote, columns=columnas)
+            lote = []
+    if lote:
+        yield pd.DataFrame.from_records(lote, columns=columnas)
+
+
+def iterar_lotes(archivo: BinaryIO, nombre: str, tamano_lote: int = TAMANO_LOTE,
+                 encabezado: bool = True) -> Iterator[pd.DataFrame]:
+    """
+    Lee un CSV/Excel por lotes de `tamano_lote` filas.
+    Con `encabezado` la primera fila da los nombres de columna; sin él las columnas
+    son posiciones 0..n (para detectar el encabezado después, p.ej. en la vista previa).
+    `archivo` debe ser un archivo binario con seek (p.ej. el temporal de UploadFile).
+    Los .xls antiguos no admiten lectura por filas y se leen completos en un solo lote.
+    """
+    nombre = nombre.lower()
+    archivo.seek(0)
+    header = 0 if encabezado else None
+    if nombre.endswith('.csv'):
+        yield from pd.read_csv(archivo, chunksize=tamano_lote, header=header)
+    elif nombre.endswith('.xlsx'):
+        yield from _lotes_xlsx(archivo, tamano_lote, encabezado)
+    elif nombre.endswith('.xls'):
+        yield pd.read_excel(archivo, header=header)
+    else:
+        raise FormatoNoSoportado("Formato de archivo no soportado")
@@ -0,0 +1,167 @@
+from datetime import date, datetime, time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Reglas de normalización de /ingesta/bulk, compartidas con /ingesta/preview para
+# que la vista previa muestre exactamente lo que se insertaría.
+
+# Punto por defecto cuando una fila llega sin coordenadas
+LAT_DEFECTO = 3.26
+LNG_DEFECTO = -76.53
+
+# Tipos reconocidos por los indicadores del observatorio (los demás se aceptan con advertencia)
+TIPOS_ESTANDAR = (
+    'HOMICIDIO', 'HURTO A PERSONAS', 'HURTO A COMERCIO', 'HURTO A RESIDENCIAS',
+    'HURTO A MOTOCICLETAS', 'HURTO A AUTOMOTORES', 'LESIONES PERSONALES',
+    'VIOLENCIA INTRAFAMILIAR', 'RIÑA', 'HURTO', 'LESIONES', 'VIOLENCIA'
+)
+
+
+# Formatos de fecha que se prueban vectorizados antes de inferir valor a valor. Con
+# barras va primero mes/día: es el criterio de pd.to_datetime para valores ambiguos
+# (03/04/2024 = 4 de marzo) y las fechas con día > 12 caen en el formato día/mes.
+FORMATOS_FECHA = ('ISO8601', '%m/%d/%Y', '%d/%m/%Y', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S')
+
+# H:M al inicio del texto (los segundos se descartan), p.ej. "7:05", "14:30:00", "22:00 - 23:00"
+PATRON_HORA = r'^\s*(\d+)\s*:\s*(\d+)\s*(?::|$)'
+
+
+def _vacio(val) -> bool:
+    return val is None or (isinstance(val, float) and pd.isna(val)) or \
+        str(val).strip() == '' or str(val).lower() == 'undefined'
+
+
+def _vacios(serie: pd.Series) -> np.ndarray:
+    texto = serie.astype(str).str.strip()
+    return (serie.isna() | texto.eq('') | texto.str.lower().eq('undefined')).to_numpy()
+
+
+def es_tipo_estandar(tipo: str) -> bool:
+    return any(t in tipo for t in TIPOS_ESTANDAR)
+
+
+def parsear_hora(val) -> Optional[time]:
+    """Hora del registro o None si falta o no se puede interpretar."""
+    if isinstance(val, time):
+        return val.replace(second=0, microsecond=0)
+    if _vacio(val):
+        return None
+    val_str = str(val).split('-')[0].strip()
+    try:
+        if ':' in val_str:
+            parts = val_str.split(':')
+            h = int(parts[0])
+            m = int(parts[1]) if len(parts) > 1 else 0
+            return datetime.strptime(f"{h:02d}:{m:02d}", "%H:%M").time()
+        return pd.to_datetime(val_str).time()
+    except Exception:
+        return None
+
+
+def parsear_fecha(val) -> Optional[date]:
+    """Fecha del registro o None si falta o no se puede interpretar."""
+    if _vacio(val):
+        return None
+    for candidato in (val, str(val).split(' ')[0]):
+        try:
+            fecha = pd.to_datetime(candidato)
+        except Exception:
+            continue
+        if not pd.isna(fecha):
+            return fecha.date()
+    return None
+
+
+def parsear_fechas(serie: pd.Series) -> pd.Series:
+    """
+    Versión por columnas de `parsear_fecha`: prueba FORMATOS_FECHA vectorizados
+    (`format=` con `errors='coerce'`) y solo infiere valor a valor el residuo que
+    ninguno reconoce. Retorna datetime64 con NaT donde no hay fecha válida.
+    """
+    serie = pd.Series(serie, dtype=object)
+    valores = serie.reset_index(drop=True)
+    resultado = pd.Series(pd.NaT, index=valores.index, dtype='datetime64[ns]')
+    pendiente = ~_vacios(valores)
+
+    for formato in FORMATOS_FECHA:
+        if not pendiente.any():
+            break
+        try:
+            intento = pd.to_datetime(valores[pendiente], format=formato, errors='coerce')
+        except (ValueError, TypeError):
+            continue
+        if not pd.api.types.is_datetime64_dtype(intento):
+            continue # Zonas horarias mezcladas: se dejan al residuo
+        ok = intento.notna()
+        resultado[intento.index[ok]] = intento[ok]
+        pendiente[intento.index[ok]] = False
+
+    # Residuo (textos con formatos poco comunes): inferencia escalar
+    for i in np.flatnonzero(pendiente):
+        fecha = parsear_fecha(valores.iat[i])
+        if fecha is not None:
+            resultado.iat[i] = pd.Timestamp(fecha)
+
+    resultado.index = serie.index
+    return resultado
+
+
+def parsear_horas(serie: pd.Series) -> pd.Series:
+    """
+    Versión por columnas de `parsear_hora`: los textos H:M se resuelven con una
+    expresión regular sobre toda la columna; el resto se interpreta valor a valor.
+    Retorna minutos desde la medianoche (float, NaN donde no hay hora válida).
+    """
+    serie = pd.Series(serie, dtype=object)
+    vacio = _vacios(serie)
+    # Los objetos time de Excel pasan a "HH:MM:SS" y siguen el mismo camino que el texto
+    texto = serie.astype(str).str.split('-').str[0].str.strip()
+    partes = texto.str.extract(PATRON_HORA).astype(float)
+    h, m = partes[0].to_numpy(), partes[1].to_numpy()
+    minutos = np.where((h < 24) & (m < 60), h * 60 + m, np.nan)
+    minutos[vacio] = np.nan
+
+    # Residuo sin ':' (p.ej. "2 PM"): inferencia escalar
+    residuo = ~vacio & partes[0].isna().to_numpy() & ~texto.str.contains(':', regex=False).to_numpy()
+    for i in np.flatnonzero(residuo):
+        hora = parsear_hora(serie.iat[i])
+        if hora is not None:
+            minutos[i] = hora.hour * 60 + hora.minute
+
+    return pd.Series(minutos, index=serie.index)
+
+
+def fechas_robustas(serie: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """Fechas (date) de la columna con la de hoy como respaldo, y la máscara de filas que usaron el respaldo."""
+    fechas = parsear_fechas(serie)
+    por_defecto = fechas.isna().to_numpy()
+    fechas = fechas.fillna(pd.Timestamp(datetime.now().date()))
+    return fechas.dt.date, por_defecto
+
+
+def horas_robustas(serie: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """Horas (time) de la columna con 00:00 como respaldo, y la máscara de filas que usaron el respaldo."""
+    minutos = parsear_horas(serie)
+    por_defecto = minutos.isna().to_numpy()
+    minutos = minutos.fillna(0).astype(int)
+    horas = {m: time(m // 60, m % 60) for m in minutos.unique()}
+    return minutos.map(horas), por_defecto
+
+
+def parse_robust_time(val) -> time:
+    return parsear_hora(val) or time(0, 0)
+
+
+def parse_robust_date(val) -> date:
+    return parsear_fecha(val) or datetime.now().date()
+
+
+def limpiar_coordenada(c) -> Optional[float]:
+    if _vacio(c):
+        return None
+    try:
+        return float(str(c).replace(',', '.'))
+    except ValueError:
+        return None
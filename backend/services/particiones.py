@@ -0,0 +1,167 @@
+import os
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# `events` está particionada por rango anual de occurrence_date: events_y2024 contiene
+# [2024-01-01, 2025-01-01). Las consultas con rango de fechas solo leen las particiones
+# del período y los borrados/archivados por año son TRUNCATE/DETACH de una partición.
+PREFIJO = "events_y"
+# Clave del advisory lock que serializa la creación de particiones entre cargas concurrentes
+LOCK_PARTICIONES = 7260001
+
+
+def nombre(anio: int) -> str:
+    return f"{PREFIJO}{int(anio)}"
+
+
+def existentes(db: Session) -> List[int]:
+    """Años con partición creada."""
+    filas = db.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events'::regclass
+    """)).scalars()
+    return sorted(int(r[len(PREFIJO):]) for r in filas if r.startswith(PREFIJO) and r[len(PREFIJO):].isdigit())
+
+
+def asegurar(db: Session, anios: Iterable[int]):
+    """
+    Crea las particiones anuales que falten. Va en la misma transacción que la carga:
+    la tabla se crea aparte y se adjunta con ATTACH PARTITION, que solo toma SHARE UPDATE
+    EXCLUSIVE sobre `events` (no bloquea lecturas ni otras inserciones). Los índices del
+    padre se crean en la partición nueva al adjuntarla. No hace commit.
+    """
+    anios = {int(a) for a in anios if a is not None}
+    faltantes = anios - set(existentes(db))
+    if not faltantes:
+        return
+    db.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": LOCK_PARTICIONES})
+    # Otra carga pudo crearlas mientras se esperaba el lock
+    for anio in sorted(faltantes - set(existentes(db))):
+        tabla = nombre(anio)
+        db.execute(text(f"CREATE TABLE {tabla} (LIKE events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        db.execute(text(
+            f"ALTER TABLE events ATTACH PARTITION {tabla} "
+            f"FOR VALUES FROM ('{date(anio, 1, 1)}') TO ('{date(anio + 1, 1, 1)}')"
+        ))
+
+
+def vaciar_anio(db: Session, anio: int) -> bool:
+    """TRUNCATE de la partición del año (si existe). No hace commit."""
+    if int(anio) not in existentes(db):
+        return False
+    db.execute(text(f"TRUNCATE {nombre(anio)}"))
+    return True
+
+
+def desadjuntar(db: Session, anio: int):
+    """Separa la partición del año de `events` y la elimina (tras archivarla). No hace commit."""
+    tabla = nombre(anio)
+    db.execute(text(f"ALTER TABLE events DETACH PARTITION {tabla}"))
+    db.execute(text(f"DROP TABLE {tabla}"))
+
+
+def migrar(conn):
+    """
+    Convierte una tabla `events` sin particionar (esquemas creados antes del
+    particionado) en la tabla particionada por año, copiando los datos y las claves
+    foráneas. Los índices los vuelve a crear create_tables sobre la tabla nueva.
+    """
+    tipo = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('events')")).scalar()
+    if tipo != 'r':
+        return False
+
+    foraneas = conn.execute(text("""
+        SELECT pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = 'events'::regclass AND contype = 'f'
+    """)).scalars().all()
+    anios = conn.execute(text(
+        "SELECT DISTINCT extract(year FROM occurrence_date)::int FROM events ORDER BY 1"
+    )).scalars().all()
+
+    conn.execute(text("ALTER TABLE events RENAME TO events_sin_particionar"))
+    conn.execute(text(
+        "CREATE TABLE events (LIKE events_sin_particionar INCLUDING DEFAULTS) PARTITION BY RANGE (occurrence_date)"
+    ))
+    for anio in set(anios) | {date.today().year}:
+        conn.execute(text(
+            f"CREATE TABLE {nombre(anio)} PARTITION OF events "
+            f"FOR VALUES FROM ('{date(anio, 1, 1)}') TO ('{date(anio + 1, 1, 1)}')"
+        ))
+    conn.execute(text("INSERT INTO events SELECT * FROM events_sin_particionar"))
+    conn.execute(text("DROP TABLE events_sin_particionar"))
+    conn.execute(text("ALTER TABLE events ADD PRIMARY KEY (id, occurrence_date)"))
+    for definicion in foraneas:
+        conn.execute(text(f"ALTER TABLE events ADD {definicion}"))
+    return True
+
+
+# Columnas exportadas al archivar (geometría como lng/lat para leerla sin PostGIS)
+SQL_EXPORTAR = """
+    SELECT e.id::text AS id, e.external_id, et.category AS categoria, et.subcategory AS subcategoria,
+           e.occurrence_date, e.occurrence_time::text AS occurrence_time, e.barrio, e.estado,
+           e.descripcion, e.territory_id, ST_X(e.location_geom) AS lng, ST_Y(e.location_geom) AS lat,
+           e.dedup_hash
+    FROM {tabla} e
+    LEFT JOIN event_types et ON et.id = e.event_type_id
+"""
+
+
+def exportar_parquet(db: Session, anio: int, directorio: str, filas_lote: int = 50000) -> Tuple[str, int]:
+    """
+    Exporta la partición del año a `<directorio>/events_y<año>.parquet` (zstd) leyendo por
+    lotes con un cursor de servidor. Se escribe a un archivo temporal que se renombra al
+    terminar. Retorna (ruta, filas escritas).
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([
+        ("id", pa.string()), ("external_id", pa.string()), ("categoria", pa.string()),
+        ("subcategoria", pa.string()), ("occurrence_date", pa.date32()), ("occurrence_time", pa.string()),
+        ("barrio", pa.string()), ("estado", pa.string()), ("descripcion", pa.string()),
+        ("territory_id", pa.int64()), ("lng", pa.float64()), ("lat", pa.float64()), ("dedup_hash", pa.string()),
+    ])
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{nombre(anio)}.parquet")
+    temporal = ruta + ".tmp"
+    conexion = db.connection().execution_options(stream_results=True)
+    escritor, total = None, 0
+    try:
+        for lote in pd.read_sql(text(SQL_EXPORTAR.format(tabla=nombre(anio))), conexion, chunksize=filas_lote):
+            lote["territory_id"] = lote["territory_id"].astype("Int64")
+            if escritor is None:
+                escritor = pq.ParquetWriter(temporal, esquema, compression="zstd")
+            escritor.write_table(pa.Table.from_pandas(lote, schema=esquema, preserve_index=False))
+            total += len(lote)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    if escritor is None:
+        return ruta, 0
+    os.replace(temporal, ruta)
+    return ruta, total
+
+
+def archivar(db: Session, anio: int, directorio: str, eliminar: bool = False) -> Dict[str, object]:
+    """
+    Archiva una partición fría en Parquet. Con `eliminar`, tras verificar que el archivo
+    tiene todas las filas, separa y elimina la partición y quita sus celdas del cubo
+    diario. No hace commit.
+    """
+    from services import agregados, version_datos
+
+    esperadas = db.execute(text(f"SELECT COUNT(*) FROM {nombre(anio)}")).scalar()
+    ruta, escritas = exportar_parquet(db, anio, directorio)
+    if escritas != esperadas:
+        raise RuntimeError(f"{nombre(anio)}: se exportaron {escritas} de {esperadas} filas")
+
+    if eliminar:
+        desadjuntar(db, anio)
+        agregados.vaciar_periodo(db, date(anio, 1, 1), date(anio + 1, 1, 1))
+        version_datos.incrementar(db, version_datos.EVENTOS)
+    return {"anio": anio, "archivo": ruta if escritas else None, "filas": escritas, "eliminada": eliminar}
@@ -0,0 +1,45 @@
+import os
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Generalización determinista para el Modo Abierto (ver docs/INDICADORES.md):
+# cada evento se asigna a una celda cuadrada de CELDA_M metros (EPSG:3857) y en los
+# mapas públicos se dibuja en el centro de esa celda. Las celdas con menos de K_MINIMO
+# eventos en el conjunto consultado se suprimen (k-anonimato).
+CELDA_M = int(os.getenv("PRIVACIDAD_CELDA_M", "250"))
+K_MINIMO = int(os.getenv("PRIVACIDAD_K_MIN", "3"))
+
+SQL_GENERALIZAR = """
+    UPDATE events SET
+        celda_publica = c.clave,
+        public_geom = c.centro
+    FROM (
+        SELECT id,
+               floor(ST_X(g) / :celda)::bigint || ':' || floor(ST_Y(g) / :celda)::bigint AS clave,
+               ST_Transform(ST_SetSRID(ST_MakePoint(
+                   (floor(ST_X(g) / :celda) + 0.5) * :celda,
+                   (floor(ST_Y(g) / :celda) + 0.5) * :celda
+               ), 3857), 4326) AS centro
+        FROM (
+            SELECT id, ST_Transform(location_geom::geometry, 3857) AS g
+            FROM events
+            WHERE location_geom IS NOT NULL AND public_geom IS NULL
+        ) s
+    ) c
+    WHERE events.id = c.id
+"""
+
+
+def generalizar_pendientes(db: Session):
+    """
+    Calcula la celda pública de los eventos que aún no la tienen.
+    No hace commit: se ejecuta en la misma transacción de la ingesta.
+    """
+    db.execute(text(SQL_GENERALIZAR), {"celda": CELDA_M})
+
+
+def regenerar(db: Session):
+    """Recalcula todas las celdas (p.ej. tras cambiar PRIVACIDAD_CELDA_M)."""
+    db.execute(text("UPDATE events SET public_geom = NULL, celda_publica = NULL"))
+    generalizar_pendientes(db)
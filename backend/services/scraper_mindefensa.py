@@ -1,11 +1,24 @@
+import asyncio
+import hashlib
 import httpx
+import json
+import os
+import random
 import re
 import logging
-from datetime import datetime
+import tempfile
 from typing import List, Dict, Optional
 
 logger = logging.getLogger("sisc_api")
 
+# Caché local de descargas (ver CacheDescargas) y parámetros del descargador
+CACHE_DIR = os.getenv("SISC_MINDEFENSA_CACHE", os.path.join(tempfile.gettempdir(), "sisc_mindefensa"))
+CONCURRENCIA = int(os.getenv("SISC_MINDEFENSA_CONCURRENCIA", "4"))
+REINTENTOS = int(os.getenv("SISC_MINDEFENSA_REINTENTOS", "3"))
+BACKOFF_S = float(os.getenv("SISC_MINDEFENSA_BACKOFF_S", "1"))
+# Respuestas transitorias que se reintentan
+REINTENTAR_STATUS = {429, 500, 502, 503, 504}
+
 class MinDefensaScraper:
     BASE_URL = "https://www.mindefensa.gov.co"
     SOURCE_URL = "https://www.mindefensa.gov.co/defensa-y-seguridad/datos-y-cifras/informacion-estadistica"
@@ -37,21 +50,29 @@ class MinDefensaScraper:
         "MASACRES": "https://www.mindefensa.gov.co/sites/web/content/published/api/v1.1/assets/CONT7B88CCACEDD441E3984D326E3696DB5E/native/MASACRES.xlsx"
     }
 
-    def __init__(self):
-        self.client = httpx.Client(
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-                "Accept-Encoding": "gzip, deflate, br, zstd",
-                "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
-                "Referer": self.SOURCE_URL,
-                "Connection": "keep-alive",
-            },
-            verify=False,
-            timeout=120.0,
-            follow_redirects=True,
-            http2=False 
-        )
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+        "Accept-Encoding": "gzip, deflate, br, zstd",
+        "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
+        "Referer": SOURCE_URL,
+        "Connection": "keep-alive",
+    }
+
+    def __init__(self, urls: Optional[Dict[str, str]] = None, cache_dir: Optional[str] = None,
+                 concurrencia: int = CONCURRENCIA, reintentos: int = REINTENTOS):
+        """
+        `urls` (nombre -> URL completa) reemplaza a KNOWN_URLS; también se puede dar en
+        SISC_MINDEFENSA_URLS como JSON (p.ej. para apuntar a un servidor local de prueba).
+        """
+        if urls is None and os.getenv("SISC_MINDEFENSA_URLS"):
+            urls = json.loads(os.getenv("SISC_MINDEFENSA_URLS"))
+        self.urls = urls if urls is not None else {
+            name: f"{url}?channelToken={self.CHANNEL_TOKEN}" for name, url in self.KNOWN_URLS.items()
+        }
+        self.cache = CacheDescargas(cache_dir or CACHE_DIR)
+        self.concurrencia = max(1, concurrencia)
+        self.reintentos = max(0, reintentos)
 
     def fetch_available_files(self) -> List[Dict]:
         """
@@ -59,10 +80,9 @@ class MinDefensaScraper:
         """
         files = []
         
-        for name, base_url in self.KNOWN_URLS.items():
-            download_url = f"{base_url}?channelToken={self.CHANNEL_TOKEN}"
+        for name, download_url in self.urls.items():
             files.append({
-                "name": f"{name}.xlsx",
+                "name": name if name.lower().endswith(".xlsx") else f"{name}.xlsx",
                 "category": None, 
                 "url": download_url,
                 "year": 2025,
@@ -91,13 +111,128 @@ class MinDefensaScraper:
         match = re.search(r'20\d{2}', filename)
         return int(match.group(0)) if match else 2025
 
-    def download_file(self, url: str) -> Optional[bytes]:
+    async def descargar(self, files: List[Dict]) -> List[Dict]:
+        """
+        Descarga los archivos en paralelo (como máximo `concurrencia` a la vez) con GET
+        condicional (If-None-Match / If-Modified-Since) y reintentos con backoff.
+        Cada resultado es el file_info con "estado" ("nuevo", "sin_cambios" o "error"),
+        "ruta" (archivo en la caché) y "sha256". "sin_cambios" significa que el contenido
+        es el mismo que ya se ingirió (marcar_procesado) y no hay que volver a leerlo.
+        """
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        limites = httpx.Limits(max_connections=self.concurrencia, max_keepalive_connections=self.concurrencia)
+        async with httpx.AsyncClient(headers=self.HEADERS, verify=False, timeout=120.0,
+                                     follow_redirects=True, limits=limites) as client:
+            async def una(file_info: Dict) -> Dict:
+                async with semaforo:
+                    return await self._descargar_una(client, file_info)
+            resultados = await asyncio.gather(*(una(f) for f in files))
+        self.cache.guardar()
+        self.cache.podar()
+        return list(resultados)
+
+    async def _descargar_una(self, client: httpx.AsyncClient, file_info: Dict) -> Dict:
+        url = file_info["url"]
+        previa = self.cache.entrada(url)
+        encabezados = {}
+        if previa and self.cache.existe(previa["sha256"]):
+            if previa.get("etag"):
+                encabezados["If-None-Match"] = previa["etag"]
+            if previa.get("last_modified"):
+                encabezados["If-Modified-Since"] = previa["last_modified"]
+
+        for intento in range(self.reintentos + 1):
+            try:
+                async with client.stream("GET", url, headers=encabezados) as resp:
+                    if resp.status_code == 304:
+                        sha = previa["sha256"]
+                        logger.info(f"Sin cambios (304): {file_info['name']}")
+                    elif resp.status_code == 200:
+                        sha = await self.cache.escribir(resp.aiter_bytes())
+                        self.cache.registrar(url, sha, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                    elif resp.status_code in REINTENTAR_STATUS and intento < self.reintentos:
+                        raise httpx.HTTPStatusError(f"Status {resp.status_code}", request=resp.request, response=resp)
+                    else:
+                        logger.warning(f"Error descargando {url}: Status {resp.status_code}")
+                        return {**file_info, "estado": "error", "ruta": None, "sha256": None}
+                estado = "sin_cambios" if sha == self.cache.procesado(url) else "nuevo"
+                return {**file_info, "estado": estado, "ruta": self.cache.ruta(sha), "sha256": sha}
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if intento == self.reintentos:
+                    logger.error(f"Excepción descargando archivo {url}: {e}")
+                    break
+                espera = BACKOFF_S * 2 ** intento * (1 + random.random())
+                logger.warning(f"Reintento {intento + 1} de {file_info['name']} en {espera:.1f}s: {e}")
+                await asyncio.sleep(espera)
+        return {**file_info, "estado": "error", "ruta": None, "sha256": None}
+
+
+class CacheDescargas:
+    """
+    Caché local direccionada por contenido: cada archivo se guarda una vez como
+    objetos/<sha256>.xlsx y un índice JSON por URL recuerda su ETag, Last-Modified,
+    el sha256 descargado y el último sha256 ingerido con éxito.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self.objetos = os.path.join(directorio, "objetos")
+        self.archivo_indice = os.path.join(directorio, "indice.json")
+        os.makedirs(self.objetos, exist_ok=True)
         try:
-            resp = self.client.get(url)
-            if resp.status_code == 200:
-                return resp.content
-            logger.warning(f"Error descargando {url}: Status {resp.status_code}")
-            return None
-        except Exception as e:
-            logger.error(f"Excepción descargando archivo {url}: {e}")
-            return None
+            with open(self.archivo_indice, encoding="utf-8") as f:
+                self.indice = json.load(f)
+        except (OSError, ValueError):
+            self.indice = {}
+
+    def ruta(self, sha: str) -> str:
+        return os.path.join(self.objetos, f"{sha}.xlsx")
+
+    def existe(self, sha: Optional[str]) -> bool:
+        return bool(sha) and os.path.exists(self.ruta(sha))
+
+    def entrada(self, url: str) -> Optional[Dict]:
+        return self.indice.get(url)
+
+    def procesado(self, url: str) -> Optional[str]:
+        return (self.indice.get(url) or {}).get("procesado")
+
+    async def escribir(self, trozos) -> str:
+        """Guarda el cuerpo de la respuesta calculando su sha256 al vuelo. Retorna el sha256."""
+        digest = hashlib.sha256()
+        fd, temporal = tempfile.mkstemp(dir=self.objetos, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for trozo in trozos:
+                    digest.update(trozo)
+                    f.write(trozo)
+            sha = digest.hexdigest()
+            os.replace(temporal, self.ruta(sha))
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return sha
+
+    def registrar(self, url: str, sha: str, etag: Optional[str], last_modified: Optional[str]):
+        entrada = self.indice.setdefault(url, {})
+        entrada.update({"sha256": sha, "etag": etag, "last_modified": last_modified})
+
+    def marcar_procesado(self, url: str, sha: str):
+        """Registra que el contenido `sha` de la URL ya se ingirió (la próxima vez se omite)."""
+        self.indice.setdefault(url, {})["procesado"] = sha
+        self.guardar()
+
+    def guardar(self):
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.indice, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, self.archivo_indice)
+
+    def podar(self):
+        """Elimina los objetos que ya no referencia ninguna URL del índice."""
+        vigentes = {e.get(c) for e in self.indice.values() for c in ("sha256", "procesado")}
+        for archivo in os.listdir(self.objetos):
+            sha, extension = os.path.splitext(archivo)
+            if extension == ".xlsx" and sha not in vigentes:
+                os.remove(os.path.join(self.objetos, archivo))
@@ -0,0 +1,199 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+# Subidas reanudables (estilo tus): cada sesión son archivos en el directorio de spool:
+# <id>.json (metadatos), <id>.part (bytes recibidos) y <id>.trozos (SHA-256 hexadecimal
+# de cada trozo agregado, uno por línea). El offset confirmado es el tamaño de
+# <id>.part, así sobrevive a reinicios del servidor.
+DIRECTORIO = os.getenv("SISC_SUBIDAS_DIR", os.path.join(tempfile.gettempdir(), "sisc_subidas"))
+TAMANO_MAX = int(os.getenv("SISC_SUBIDAS_MAX_MB", "2048")) * 1024 * 1024
+TROZO_MAX = int(os.getenv("SISC_SUBIDAS_TROZO_MAX_MB", "64")) * 1024 * 1024
+EXPIRACION_S = int(os.getenv("SISC_SUBIDAS_EXPIRACION_H", "24")) * 3600
+
+DESTINOS = ("eventos", "nacional")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+class SubidaNoEncontrada(LookupError):
+    pass
+
+
+class ConflictoOffset(ValueError):
+    def __init__(self, esperado: int):
+        super().__init__(f"Offset inválido: el servidor tiene {esperado} bytes")
+        self.esperado = esperado
+
+
+class SubidaInvalida(ValueError):
+    pass
+
+
+class ChecksumInvalido(SubidaInvalida):
+    pass
+
+
+class HashRequerido(SubidaInvalida):
+    pass
+
+
+def _ruta(subida_id: str, extension: str) -> str:
+    # El id se valida como UUID para que no pueda salir del directorio de spool
+    try:
+        subida_id = str(uuid.UUID(subida_id))
+    except ValueError:
+        raise SubidaNoEncontrada(subida_id)
+    return os.path.join(DIRECTORIO, f"{subida_id}.{extension}")
+
+
+def _lock(subida_id: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(subida_id, threading.Lock())
+
+
+def limpiar_expiradas():
+    """Elimina sesiones sin actividad por más de EXPIRACION_S."""
+    if not os.path.isdir(DIRECTORIO):
+        return
+    limite = time.time() - EXPIRACION_S
+    for nombre in os.listdir(DIRECTORIO):
+        ruta = os.path.join(DIRECTORIO, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def crear(nombre_archivo: str, tamano: int, destino: str, sha256: Optional[str] = None,
+          usuario: Optional[str] = None) -> Dict:
+    if destino not in DESTINOS:
+        raise SubidaInvalida(f"destino debe ser uno de {DESTINOS}")
+    if not (0 < tamano <= TAMANO_MAX):
+        raise SubidaInvalida(f"El tamaño debe estar entre 1 byte y {TAMANO_MAX // (1024 * 1024)} MB")
+    if sha256 is not None and len(sha256) != 64:
+        raise SubidaInvalida("sha256 debe ser el hash hexadecimal del archivo completo")
+
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    limpiar_expiradas()
+
+    subida_id = str(uuid.uuid4())
+    meta = {
+        "id": subida_id,
+        "nombre_archivo": os.path.basename(nombre_archivo),
+        "tamano": tamano,
+        "destino": destino,
+        "sha256": sha256.lower() if sha256 else None,
+        "usuario": usuario,
+        "creado": time.time()
+    }
+    with open(_ruta(subida_id, "json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    open(_ruta(subida_id, "part"), "wb").close()
+    return meta
+
+
+def obtener(subida_id: str) -> Dict:
+    """Metadatos de la sesión más el offset actual (bytes confirmados)."""
+    try:
+        with open(_ruta(subida_id, "json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        meta["offset"] = os.path.getsize(_ruta(subida_id, "part"))
+    except FileNotFoundError:
+        raise SubidaNoEncontrada(subida_id)
+    return meta
+
+
+def escribir(subida_id: str, offset: int, datos: bytes, checksum: Optional[str] = None) -> int:
+    """
+    Agrega `datos` en la posición `offset`, que debe coincidir con los bytes ya recibidos,
+    y registra el SHA-256 del trozo para la cadena que se verifica al finalizar.
+    `checksum` opcional es el encabezado tus `Upload-Checksum` ("sha256 <base64>").
+    Retorna el nuevo offset.
+    """
+    if len(datos) > TROZO_MAX:
+        raise SubidaInvalida(f"El trozo supera {TROZO_MAX // (1024 * 1024)} MB")
+    if checksum:
+        _verificar_checksum_trozo(checksum, datos)
+
+    with _lock(subida_id):
+        meta = obtener(subida_id)
+        if offset != meta["offset"]:
+            raise ConflictoOffset(meta["offset"])
+        if offset + len(datos) > meta["tamano"]:
+            raise SubidaInvalida("Los datos superan el tamaño declarado de la subida")
+        with open(_ruta(subida_id, "part"), "ab") as f:
+            f.write(datos)
+        with open(_ruta(subida_id, "trozos"), "a", encoding="ascii") as f:
+            f.write(hashlib.sha256(datos).hexdigest() + "\n")
+        return offset + len(datos)
+
+
+def _verificar_checksum_trozo(checksum: str, datos: bytes):
+    try:
+        algoritmo, valor = checksum.split(" ", 1)
+        esperado = base64.b64decode(valor.strip())
+    except ValueError:
+        raise SubidaInvalida("Upload-Checksum debe tener el formato '<algoritmo> <base64>'")
+    if algoritmo.lower() not in ("sha256", "sha1", "md5"):
+        raise SubidaInvalida(f"Algoritmo de checksum no soportado: {algoritmo}")
+    if hashlib.new(algoritmo.lower(), datos).digest() != esperado:
+        raise ChecksumInvalido("El checksum del trozo no coincide")
+
+
+def cadena_trozos(subida_id: str) -> str:
+    """SHA-256 hexadecimal de la concatenación de los SHA-256 (binarios) de los trozos, en orden."""
+    try:
+        with open(_ruta(subida_id, "trozos"), encoding="ascii") as f:
+            digests = [bytes.fromhex(linea.strip()) for linea in f if linea.strip()]
+    except FileNotFoundError:
+        digests = []
+    return hashlib.sha256(b"".join(digests)).hexdigest()
+
+
+def completar(subida_id: str, sha256: Optional[str] = None, sha256_trozos: Optional[str] = None) -> Dict:
+    """
+    Verifica que la subida esté completa y su integridad de extremo a extremo: el
+    SHA-256 del archivo (declarado al crear la sesión o al finalizar) o, si el cliente
+    no puede calcularlo, `sha256_trozos`, la cadena de SHA-256 de los trozos que envió
+    (ver cadena_trozos). Sin ninguno de los dos se rechaza. Retorna los metadatos con la ruta.
+    """
+    meta = obtener(subida_id)
+    if meta["offset"] != meta["tamano"]:
+        raise SubidaInvalida(f"Subida incompleta: {meta['offset']} de {meta['tamano']} bytes")
+
+    esperado = (sha256 or meta.get("sha256") or "").lower()
+    ruta = _ruta(subida_id, "part")
+    if esperado:
+        digest = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(bloque)
+        if digest.hexdigest() != esperado:
+            raise ChecksumInvalido("El SHA-256 del archivo no coincide; vuelva a subirlo")
+    elif sha256_trozos:
+        if cadena_trozos(subida_id) != sha256_trozos.lower():
+            raise ChecksumInvalido("El SHA-256 de los trozos no coincide; vuelva a subirlo")
+    else:
+        raise HashRequerido("Se requiere sha256 del archivo o sha256_trozos para finalizar")
+
+    meta["ruta"] = ruta
+    return meta
+
+
+def eliminar(subida_id: str):
+    for extension in ("part", "trozos", "json"):
+        try:
+            os.remove(_ruta(subida_id, extension))
+        except FileNotFoundError:
+            pass
+    with _locks_lock:
+        _locks.pop(subida_id, None)
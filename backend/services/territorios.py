@@ -0,0 +1,193 @@
+import json
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from services import version_datos
+
+# Si un punto cae en varios polígonos (barrio dentro de comuna) gana el más específico
+PRIORIDAD_TIPOS = {"BARRIO": 0, "VEREDA": 1, "CORREGIMIENTO": 2, "COMUNA": 3}
+TIPOS = tuple(PRIORIDAD_TIPOS)
+# Tipos cuyo nombre se usa como Event.barrio (una comuna es demasiado gruesa para eso)
+TIPOS_BARRIO = ("BARRIO", "VEREDA", "CORREGIMIENTO")
+
+
+class TerritorioInvalido(ValueError):
+    pass
+
+
+class IndiceTerritorios:
+    """
+    Índice STRtree (shapely) de los polígonos de `territories` para asignar territorio
+    a lotes de puntos en memoria: una consulta vectorizada por lote, sin ida a la BD.
+    """
+
+    def __init__(self, ids, nombres, tipos, wkbs):
+        import shapely
+
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.nombres = np.asarray(nombres, dtype=object)
+        self.tipos = np.asarray(tipos, dtype=object)
+        self.prioridad = np.array([PRIORIDAD_TIPOS.get(t, len(PRIORIDAD_TIPOS)) for t in self.tipos])
+        self.geometrias = shapely.from_wkb(np.asarray(wkbs, dtype=object)) if len(wkbs) else np.array([], dtype=object)
+        self.arbol = shapely.STRtree(self.geometrias)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def asignar(self, lngs, lats) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Territorio de cada punto. Retorna (ids float con NaN si el punto no cae en ningún
+        polígono, nombre de barrio/vereda/corregimiento u None).
+        """
+        import shapely
+
+        lngs = np.asarray(lngs, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        ids = np.full(len(lngs), np.nan)
+        nombres = np.full(len(lngs), None, dtype=object)
+        validos = np.flatnonzero(~(np.isnan(lngs) | np.isnan(lats)))
+        if len(self) == 0 or len(validos) == 0:
+            return ids, nombres
+
+        puntos = shapely.points(lngs[validos], lats[validos])
+        # Pares (punto, polígono) con el punto dentro (o en el borde) del polígono
+        punto, poligono = self.arbol.query(puntos, predicate="intersects")
+        if len(punto) == 0:
+            return ids, nombres
+
+        # El polígono más específico por punto: ordenar por (punto, prioridad) y tomar el primero
+        orden = np.lexsort((self.prioridad[poligono], punto))
+        punto, poligono = punto[orden], poligono[orden]
+        primero = np.r_[True, punto[1:] != punto[:-1]]
+        punto, poligono = punto[primero], poligono[primero]
+
+        filas = validos[punto]
+        ids[filas] = self.ids[poligono]
+        es_barrio = np.isin(self.tipos[poligono], TIPOS_BARRIO)
+        nombres[filas[es_barrio]] = self.nombres[poligono[es_barrio]]
+        return ids, nombres
+
+
+_indice: Optional[IndiceTerritorios] = None
+_version_indice: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _leer(db: Session) -> IndiceTerritorios:
+    filas = db.execute(text("""
+        SELECT id, name, type, ST_AsBinary(geom) FROM territories WHERE geom IS NOT NULL
+    """)).all()
+    return IndiceTerritorios(
+        [f[0] for f in filas], [f[1] for f in filas], [f[2] for f in filas], [bytes(f[3]) for f in filas]
+    )
+
+
+def indice(db: Optional[Session] = None) -> IndiceTerritorios:
+    """
+    Índice de proceso. Se reconstruye cuando cambia la versión del dominio "territorios"
+    (la incrementa `cargar_geojson`), así todos los workers ven los polígonos nuevos.
+    Si la BD no responde se usa el último índice construido (o uno vacío).
+    """
+    global _indice, _version_indice
+    propia = db is None
+    if propia:
+        from db.models import SessionLocal
+        db = SessionLocal()
+    try:
+        try:
+            version = version_datos.obtener(db, version_datos.TERRITORIOS)
+            with _lock:
+                if _indice is None or version != _version_indice:
+                    _indice, _version_indice = _leer(db), version
+        except Exception as e:
+            print(f"Nota: índice de territorios no disponible ({e})")
+            with _lock:
+                if _indice is None:
+                    _indice = IndiceTerritorios([], [], [], [])
+        return _indice
+    finally:
+        if propia:
+            db.close()
+
+
+def cargar_geojson(db: Session, geojson: Dict, tipo: str, campo_nombre: str = "name",
+                   campo_codigo: Optional[str] = None) -> int:
+    """
+    Carga (o reemplaza, por tipo + nombre) los polígonos de un FeatureCollection en
+    `territories`. Las geometrías se corrigen con ST_MakeValid. No hace commit.
+    """
+    tipo = tipo.upper()
+    if tipo not in TIPOS:
+        raise TerritorioInvalido(f"Tipo de territorio no soportado: {tipo} (use {', '.join(TIPOS)})")
+    features = geojson.get("features") if isinstance(geojson, dict) else None
+    if not features:
+        raise TerritorioInvalido("Se esperaba un GeoJSON FeatureCollection con features")
+
+    filas = []
+    for i, feature in enumerate(features):
+        propiedades = feature.get("properties") or {}
+        nombre = propiedades.get(campo_nombre)
+        if not nombre or not feature.get("geometry"):
+            raise TerritorioInvalido(f"Feature {i}: falta la propiedad '{campo_nombre}' o la geometría")
+        filas.append({
+            "nombre": str(nombre).strip().upper()[:100],
+            "tipo": tipo,
+            "codigo": str(propiedades.get(campo_codigo))[:20] if campo_codigo and propiedades.get(campo_codigo) is not None else None,
+            "geometria": json.dumps(feature["geometry"]),
+        })
+
+    db.execute(text("""
+        INSERT INTO territories (name, type, code, geom)
+        VALUES (:nombre, :tipo, :codigo, ST_MakeValid(ST_SetSRID(ST_GeomFromGeoJSON(:geometria), 4326)))
+        ON CONFLICT (type, name) DO UPDATE SET code = EXCLUDED.code, geom = EXCLUDED.geom
+    """), filas)
+    version_datos.incrementar(db, version_datos.TERRITORIOS)
+    return len(filas)
+
+
+def backfill(db: Session, reescribir_barrio: bool = False) -> Dict[str, int]:
+    """
+    Asigna territory_id a los eventos existentes con un spatial join en PostGIS (índices
+    GIST de events y territories). Con `reescribir_barrio` también reemplaza el barrio de
+    texto por el del polígono; como el barrio es parte de dedup_hash y del cubo diario,
+    se recalculan ambos (dedup_hash con la misma clave con que se cargó cada evento,
+    ver carga_eventos.SQL_HASH_EVENTO). No hace commit.
+    """
+    tipos_barrio = list(TIPOS_BARRIO)
+    asignados = db.execute(text("""
+        UPDATE events e SET territory_id = t.id
+        FROM (
+            SELECT e2.id AS evento, (
+                SELECT t.id FROM territories t
+                WHERE ST_Intersects(t.geom, e2.location_geom)
+                ORDER BY CASE t.type WHEN 'BARRIO' THEN 0 WHEN 'VEREDA' THEN 1
+                                     WHEN 'CORREGIMIENTO' THEN 2 ELSE 3 END, t.id
+                LIMIT 1
+            ) AS id
+            FROM events e2 WHERE e2.location_geom IS NOT NULL
+        ) t
+        WHERE e.id = t.evento AND e.territory_id IS DISTINCT FROM t.id
+    """)).rowcount
+
+    renombrados = 0
+    if reescribir_barrio:
+        from services import agregados
+        from services.carga_eventos import SQL_BACKFILL_DEDUP
+
+        renombrados = db.execute(text("""
+            UPDATE events e SET barrio = t.name, dedup_hash = NULL
+            FROM territories t
+            WHERE t.id = e.territory_id AND t.type = ANY(CAST(:tipos AS text[]))
+              AND e.barrio IS DISTINCT FROM t.name
+        """), {"tipos": tipos_barrio}).rowcount
+        if renombrados:
+            db.execute(text(SQL_BACKFILL_DEDUP))
+            agregados.reconstruir(db)
+
+    if asignados or renombrados:
+        version_datos.incrementar(db, version_datos.EVENTOS)
+    return {"territorios_asignados": asignados, "barrios_reescritos": renombrados}
@@ -0,0 +1,32 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Dominios de datos versionados
+EVENTOS = "eventos"
+NACIONAL = "nacional"
+TERRITORIOS = "territorios" # Polígonos de barrios/comunas (services/territorios.py)
+TIPOS_EVENTO = "tipos_evento" # Filas de event_types (caché categorias.tipos_evento)
+BARRIOS = "barrios" # Nomenclátor barrios_referencia (services/geocodificacion.py)
+
+
+def incrementar(db: Session, dominio: str):
+    """
+    Incrementa la versión del dominio. No hace commit: debe ir en la misma
+    transacción que el cambio de datos para que la nueva versión sea visible
+    exactamente cuando lo son los datos.
+    """
+    db.execute(
+        text("""
+            INSERT INTO data_versions (dominio, version) VALUES (:dominio, 1)
+            ON CONFLICT (dominio) DO UPDATE SET version = data_versions.version + 1
+        """),
+        {"dominio": dominio}
+    )
+
+
+def obtener(db: Session, dominio: str) -> int:
+    version = db.execute(
+        text("SELECT version FROM data_versions WHERE dominio = :dominio"),
+        {"dominio": dominio}
+    ).scalar()
+    return version or 0
@@ -0,0 +1,263 @@
+import re
+from typing import BinaryIO, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from services import categorias, geocodificacion, lectura_tabular, normalizacion
+
+# Palabras clave por campo de /ingesta/bulk (mismo orden de preferencia que usaba el
+# mapeo del navegador en DataPage.jsx): primero coincidencia exacta, luego parcial.
+CAMPOS = {
+    "fecha": ['fecha_hecho', 'fecha', 'dia', 'date'],
+    "hora": ['hora24', 'hora_hecho', 'hora', 'time'],
+    "tipo": ['descripcion_conducta', 'delito', 'clase_de_sitio', 'conducta', 'tipo'],
+    "barrio": ['barrios_hecho', 'barrio', 'sector', 'comuna'],
+    "descripcion": ['modalidad', 'detalle_de_la_conducta', 'observacion', 'descripcion', 'detalle'],
+    "latitud": ['latitud_hecho', 'latitud', 'lat', 'y_hecho', 'coordenada_y', 'coord_y', 'coordy', 'y', 'norte'],
+    "longitud": ['longitud_hecho', 'longitud', 'long', 'lon', 'x_hecho', 'coordenada_x', 'coord_x', 'coordx', 'x', 'este'],
+}
+
+PALABRAS_ENCABEZADO = ('fecha', 'delito', 'conducta', 'hecho')
+FILAS_BUSQUEDA_ENCABEZADO = 20
+LIMITE_MAX = 2000
+SEMILLA_MUESTRA = 20240101
+
+
+def _limpiar(s) -> str:
+    return re.sub(r'[^a-z0-9]', '', str(s or '').lower())
+
+
+def inferir_mapeo(columnas: List) -> Dict[str, Optional[str]]:
+    """Asocia cada campo de evento a una columna del archivo (o None)."""
+    limpias = {c: _limpiar(c) for c in columnas}
+    mapeo = {}
+    for campo, palabras in CAMPOS.items():
+        encontrada = next(
+            (c for c, lc in limpias.items() if any(lc == _limpiar(kw) for kw in palabras)), None
+        )
+        if encontrada is None:
+            encontrada = next(
+                (c for c, lc in limpias.items() if lc and any(
+                    len(kw) > 3 and (_limpiar(kw) in lc or lc in _limpiar(kw)) for kw in palabras
+                )), None
+            )
+        mapeo[campo] = encontrada
+    return mapeo
+
+
+def _detectar_encabezado(df: pd.DataFrame) -> int:
+    """Índice de la primera fila que parece encabezado (las planillas policiales traen títulos arriba)."""
+    for i in range(min(FILAS_BUSQUEDA_ENCABEZADO, len(df))):
+        celdas = [str(v).lower().strip() for v in df.iloc[i].tolist() if v is not None and not pd.isna(v)]
+        if any(p in c for c in celdas for p in PALABRAS_ENCABEZADO):
+            return i
+    return 0
+
+
+def _nombres_unicos(celdas: List) -> List[str]:
+    nombres = []
+    for i, c in enumerate(celdas):
+        nombre = str(c).strip() if c is not None and not pd.isna(c) and str(c).strip() else f"columna_{i}"
+        if nombre in nombres:
+            nombre = f"{nombre}_{i}"
+        nombres.append(nombre)
+    return nombres
+
+
+def _lotes_con_encabezado(archivo: BinaryIO, nombre: str):
+    """
+    Lotes con nombres de columna, detectando la fila de encabezado en el primer lote.
+    Cada lote trae la columna `_fila` con el número de fila del archivo (base 1).
+    """
+    columnas = None
+    fila_archivo = 1
+    for df in lectura_tabular.iterar_lotes(archivo, nombre, encabezado=False):
+        filas = np.arange(len(df)) + fila_archivo
+        fila_archivo += len(df)
+        if columnas is None:
+            inicio = _detectar_encabezado(df)
+            columnas = _nombres_unicos(df.iloc[inicio].tolist()) if len(df) else []
+            df, filas = df.iloc[inicio + 1:], filas[inicio + 1:]
+            yield {"fila_encabezado": int(inicio + 1), "columnas": columnas}
+        df = df.iloc[:, :len(columnas)].copy()
+        df.columns = columnas[:df.shape[1]]
+        df["_fila"] = filas
+        yield df
+
+
+def _valor(fila: Dict, columna: Optional[str]):
+    if columna is None:
+        return None
+    v = fila.get(columna)
+    if v is None or (isinstance(v, float) and pd.isna(v)):
+        return None
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return v if isinstance(v, (int, float)) else str(v)
+
+
+def analizar_fila(fila: Dict, mapeo: Dict[str, Optional[str]],
+                  gazetteer: Optional[geocodificacion.Gazetteer] = None) -> Dict:
+    """
+    Aplica las reglas de /ingesta/bulk a una fila y describe el resultado:
+    status ok | warning | error, problemas (issues) y correcciones. `gazetteer` es el
+    nomenclátor a usar (vista_previa lo obtiene una vez para todas las filas).
+    """
+    original = {campo: _valor(fila, col) for campo, col in mapeo.items()}
+    issues, corrections = [], []
+    status = "ok"
+
+    def problema(nivel, mensaje):
+        nonlocal status
+        if nivel == "error" or status == "ok":
+            status = nivel
+        issues.append(mensaje)
+
+    # 1. Fecha
+    fecha = normalizacion.parsear_fecha(original["fecha"])
+    if original["fecha"] is None:
+        problema("error", "Fecha faltante (se usaría la fecha de hoy)")
+    elif fecha is None:
+        problema("error", f"Fecha inválida: {original['fecha']} (se usaría la fecha de hoy)")
+
+    # 2. Hora
+    hora = normalizacion.parsear_hora(original["hora"])
+    if hora is None:
+        problema("warning", "Hora faltante o inválida (se usaría 00:00)")
+
+    # 3. Tipo
+    raw_tipo = str(original["tipo"] or "").upper().strip()
+    tipo = categorias.EVENTOS.normalizar(raw_tipo)
+    if not raw_tipo:
+        problema("error", "Tipo de delito faltante")
+    elif len(tipo) > 50:
+        problema("error", "Tipo de delito excede 50 caracteres")
+    else:
+        if tipo != raw_tipo:
+            corrections.append(f"Tipo normalizado a {tipo}")
+        if not normalizacion.es_tipo_estandar(tipo):
+            problema("warning", f"Tipo de delito no estándar: {original['tipo']}")
+
+    # 4. Barrio
+    if original["barrio"] is None or str(original["barrio"]).strip().lower() in ("", "undefined"):
+        problema("error", "Barrio faltante")
+
+    # 5. Coordenadas
+    lat = normalizacion.limpiar_coordenada(original["latitud"])
+    lng = normalizacion.limpiar_coordenada(original["longitud"])
+    if not lat or not lng:
+        gazetteer = gazetteer or geocodificacion.gazetteer()
+        referencia = gazetteer.coincidencia(original["barrio"])
+        if referencia:
+            lat, lng = gazetteer.punto(referencia[0])
+            if referencia[1] == geocodificacion.APROXIMADO:
+                problema("warning", f"Barrio no reconocido exactamente: se ubicaría en {referencia[0]} (coincidencia aproximada)")
+            corrections.append(f"Coordenadas de referencia del barrio {referencia[0]}")
+        else:
+            problema("warning", "Sin coordenadas ni barrio reconocido (se usaría el punto por defecto)")
+            corrections.append("Coordenadas por defecto del municipio")
+
+    # 6. Descripción
+    descripcion = str(original["descripcion"] or "")
+    if len(descripcion) < 3 or descripcion == "undefined":
+        problema("warning", "Descripción insuficiente")
+
+    corrected = {
+        "fecha": (fecha or normalizacion.parse_robust_date(None)).isoformat(),
+        "hora": (hora or normalizacion.parse_robust_time(None)).strftime("%H:%M"),
+        "tipo": tipo,
+        "barrio": original["barrio"],
+        "descripcion": descripcion,
+        "latitud": lat or normalizacion.LAT_DEFECTO,
+        "longitud": lng or normalizacion.LNG_DEFECTO,
+    }
+    mensajes = list(dict.fromkeys(issues + corrections))
+    return {
+        "fila": int(fila["_fila"]),
+        "status": status,
+        "original": original,
+        "corrected": corrected,
+        "issues": issues,
+        "corrections": corrections,
+        "message": ". ".join(mensajes) if mensajes else "Validado correctamente",
+    }
+
+
+def _primeras(lotes, limite: int) -> pd.DataFrame:
+    partes, n = [], 0
+    for df in lotes:
+        partes.append(df.iloc[:limite - n])
+        n += len(partes[-1])
+        if n >= limite:
+            break
+    return pd.concat(partes) if partes else pd.DataFrame()
+
+
+def _estratificada(lotes, limite: int, mapeo: Dict[str, Optional[str]]):
+    """
+    Muestra estratificada por tipo de delito normalizado en una sola pasada: por estrato
+    se conservan las `limite` filas con menor clave aleatoria (reservorio acotado) y al
+    final se asigna a cada tipo una cuota proporcional a su frecuencia (mínimo 1 fila).
+    Retorna (muestra, total de filas del archivo).
+    """
+    rng = np.random.default_rng(SEMILLA_MUESTRA)
+    reservorio = None
+    conteos = pd.Series(dtype="int64")
+    columna_tipo = mapeo["tipo"]
+    for df in lotes:
+        df = df.copy()
+        if columna_tipo is not None:
+            df["_estrato"] = categorias.EVENTOS.normalizar_serie(
+                df[columna_tipo].where(df[columna_tipo].notna(), "").astype(str).str.upper().str.strip()
+            )
+        else:
+            df["_estrato"] = ""
+        df["_clave"] = rng.random(len(df))
+        conteos = conteos.add(df["_estrato"].value_counts(), fill_value=0)
+        reservorio = df if reservorio is None else pd.concat([reservorio, df])
+        reservorio = reservorio.sort_values("_clave").groupby("_estrato", sort=False).head(limite)
+
+    if reservorio is None:
+        return pd.DataFrame(), 0
+    total = int(conteos.sum())
+    cuotas = np.maximum(1, np.floor(limite * conteos / total)).astype(int)
+    reservorio["_orden"] = reservorio.groupby("_estrato").cumcount()
+    muestra = reservorio[reservorio["_orden"] < reservorio["_estrato"].map(cuotas)]
+    return muestra.sort_values("_fila").drop(columns=["_estrato", "_clave", "_orden"]), total
+
+
+def vista_previa(archivo: BinaryIO, nombre: str, limite: int = 200, muestra: str = "primeras") -> Dict:
+    """
+    Analiza las primeras `limite` filas (o una muestra estratificada por tipo) de un
+    archivo sin insertarlo: mapeo de columnas inferido y estado por fila.
+    """
+    lotes = _lotes_con_encabezado(archivo, nombre)
+    cabecera = next(lotes, None)
+    if cabecera is None:
+        return {"columnas": [], "mapeo": {}, "fila_encabezado": None, "total_filas": 0,
+                "muestra": muestra, "resumen": {"total": 0, "ok": 0, "warning": 0, "error": 0}, "filas": []}
+
+    mapeo = inferir_mapeo(cabecera["columnas"])
+    total_filas = None
+    if muestra == "estratificada":
+        df, total_filas = _estratificada(lotes, limite, mapeo)
+    else:
+        df = _primeras(lotes, limite)
+
+    nomenclator = geocodificacion.gazetteer()
+    filas = [analizar_fila(f, mapeo, nomenclator) for f in df.to_dict("records")]
+    resumen = {"total": len(filas), "ok": 0, "warning": 0, "error": 0}
+    for f in filas:
+        resumen[f["status"]] += 1
+
+    return {
+        "columnas": cabecera["columnas"],
+        "mapeo": mapeo,
+        "campos_sin_columna": [c for c, col in mapeo.items() if col is None],
+        "fila_encabezado": cabecera["fila_encabezado"],
+        "total_filas": total_filas,
+        "muestra": muestra,
+        "resumen": resumen,
+        "filas": filas,
+    }
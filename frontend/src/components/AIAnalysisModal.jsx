@@ -1,9 +1,10 @@
 import React, { useState, useEffect } from 'react';
 import { Check, AlertTriangle, X, Brain, Loader } from 'lucide-react';
-import { analyzeData } from '../utils/aiAnalysis';
+import { previewFile } from '../utils/aiAnalysis';
 
-const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
+const AIAnalysisModal = ({ isOpen, onClose, file, data, onConfirm }) => {
     const [isAnalyzing, setIsAnalyzing] = useState(true);
+    const [analysisError, setAnalysisError] = useState(null);
     const [analyzedData, setAnalyzedData] = useState([]);
     const [analysisSummary, setAnalysisSummary] = useState({
         total: 0,
@@ -12,22 +13,23 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
     });
 
     useEffect(() => {
-        if (isOpen) {
+        if (isOpen && file) {
             const performAnalysis = async () => {
+                setIsAnalyzing(true);
+                setAnalysisError(null);
                 try {
-                    const results = await analyzeData(data);
-
-                    const issuesCount = results.filter(r => r.status === 'error').length;
-                    const correctionsCount = results.filter(r => r.status === 'warning' && r.message.includes('corregida')).length; // Simple heuristic
+                    const preview = await previewFile(file);
+                    const results = preview.filas;
 
                     setAnalyzedData(results);
                     setAnalysisSummary({
-                        total: results.length,
-                        issues: issuesCount,
-                        corrections: correctionsCount
+                        total: data ? data.length : results.length,
+                        issues: preview.resumen.error,
+                        corrections: results.filter(r => r.corrections.length > 0).length
                     });
                 } catch (error) {
                     console.error("Analysis failed", error);
+                    setAnalysisError(error.message);
                 } finally {
                     setIsAnalyzing(false);
                 }
@@ -35,7 +37,7 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
 
             performAnalysis();
         }
-    }, [isOpen, data]);
+    }, [isOpen, file, data]);
 
     if (!isOpen) return null;
 
@@ -65,6 +67,11 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
                             <Loader className="w-12 h-12 text-primary animate-spin" />
                             <p className="text-slate-600 font-medium animate-pulse">Analizando patrones y validando registros...</p>
                         </div>
+                    ) : analysisError ? (
+                        <div className="flex flex-col items-center justify-center h-64 space-y-2">
+                            <X className="w-12 h-12 text-red-500" />
+                            <p className="text-slate-600 font-medium">No se pudo validar el archivo: {analysisError}</p>
+                        </div>
                     ) : (
                         <div className="space-y-6">
                             {/* Summary Cards */}
@@ -83,11 +90,18 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
                                 </div>
                             </div>
 
+                            {analyzedData.length < analysisSummary.total && (
+                                <p className="text-xs text-slate-500">
+                                    Vista previa de las primeras {analyzedData.length} filas; la validación completa se aplica al integrar.
+                                </p>
+                            )}
+
                             {/* Results Table */}
                             <div className="bg-white rounded-lg shadow-sm border border-slate-200 overflow-hidden">
                                 <table className="w-full text-left text-sm">
                                     <thead className="bg-slate-50 border-b border-slate-200">
                                         <tr>
+                                            <th className="p-3 font-semibold text-slate-600">Fila</th>
                                             <th className="p-3 font-semibold text-slate-600">Estado</th>
                                             <th className="p-3 font-semibold text-slate-600">Fecha</th>
                                             <th className="p-3 font-semibold text-slate-600">Tipo</th>
@@ -98,6 +112,7 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
                                     <tbody className="divide-y divide-slate-100">
                                         {analyzedData.map((item, idx) => (
                                             <tr key={idx} className="hover:bg-slate-50">
+                                                <td className="p-3 text-slate-400">{item.fila}</td>
                                                 <td className="p-3">
                                                     {item.status === 'ok' && <Check size={18} className="text-green-500" />}
                                                     {item.status === 'warning' && <AlertTriangle size={18} className="text-orange-500" />}
@@ -105,7 +120,7 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
                                                 </td>
                                                 <td className="p-3 text-slate-700">{item.corrected.fecha}</td>
                                                 <td className="p-3">
-                                                    <span className={item.original.tipo !== item.corrected.tipo ? 'text-orange-600 font-medium' : 'text-slate-700'}>
+                                                    <span className={String(item.original.tipo || '').toUpperCase().trim() !== item.corrected.tipo ? 'text-orange-600 font-medium' : 'text-slate-700'}>
                                                         {item.corrected.tipo}
                                                     </span>
                                                 </td>
@@ -135,8 +150,8 @@ const AIAnalysisModal = ({ isOpen, onClose, data, onConfirm }) => {
                         Cancelar
                     </button>
                     <button
-                        onClick={() => onConfirm(analyzedData.map(a => a.corrected))}
-                        disabled={isAnalyzing}
+                        onClick={() => onConfirm(data)}
+                        disabled={isAnalyzing || !!analysisError}
                         className="px-6 py-2 bg-primary text-white rounded-lg hover:bg-primary/90 font-medium disabled:opacity-50 disabled:cursor-not-allowed flex items-center shadow-lg shadow-primary/20"
                     >
                         {isAnalyzing ? 'Procesando...' : 'Confirmar e Integrar'}
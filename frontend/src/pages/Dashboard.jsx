@@ -36,27 +36,21 @@ const Dashboard = () => {
             const token = localStorage.getItem('token');
             const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
 
-            // 0. Determinar fechas
-            let start = currentFilters.start;
-            let end = currentFilters.end;
-            let refDate = new Date();
-            let coverage = { start: null, end: null };
-
-            const dateRes = await fetch(`${API_BASE_URL}/analitica/estadisticas/ultima-actualizacion`, { headers });
-            if (dateRes.ok) {
-                const dateData = await dateRes.json();
-                if (dateData.ultima_fecha) {
-                    refDate = new Date(dateData.ultima_fecha);
-                    coverage = { start: dateData.fecha_inicial, end: dateData.ultima_fecha };
-                }
-            }
-
-            if (!start) start = new Date(refDate.getFullYear(), refDate.getMonth(), 1).toISOString().split('T')[0];
-            if (!end) end = new Date(refDate.getFullYear(), refDate.getMonth() + 1, 0).toISOString().split('T')[0];
-
-            // 1. Fetch KPIs
-            const kpiRes = await fetch(`${API_BASE_URL}/analitica/estadisticas/kpis?start_date=${start}&end_date=${end}`, { headers });
-            const kpisCurrent = await kpiRes.json();
+            // 0. Bloques del tablero en una sola petición (si no hay filtros, el backend usa el mes del último dato)
+            const bundleParams = new URLSearchParams();
+            if (currentFilters.start) bundleParams.append('start_date', currentFilters.start);
+            if (currentFilters.end) bundleParams.append('end_date', currentFilters.end);
+            const bundleRes = await fetch(`${API_BASE_URL}/analitica/estadisticas/dashboard?${bundleParams.toString()}`, { headers });
+            if (!bundleRes.ok) throw new Error('Error cargando el tablero');
+            const bundle = await bundleRes.json();
+
+            const refDate = bundle.cobertura?.ultima_fecha ? new Date(bundle.cobertura.ultima_fecha) : new Date();
+            const coverage = { start: bundle.cobertura?.fecha_inicial, end: bundle.cobertura?.ultima_fecha };
+            const start = bundle.periodo?.inicio || currentFilters.start || new Date(refDate.getFullYear(), refDate.getMonth(), 1).toISOString().split('T')[0];
+            const end = bundle.periodo?.fin || currentFilters.end || new Date(refDate.getFullYear(), refDate.getMonth() + 1, 0).toISOString().split('T')[0];
+
+            // 1. KPIs
+            const kpisCurrent = bundle.kpis;
 
             let compResult = null;
             if (currentFilters.compare) {
@@ -65,19 +59,12 @@ const Dashboard = () => {
                 if (compRes.ok) {
                     compResult = await compRes.json();
                 }
-            } else {
-                const prevDate = new Date(start);
-                const prevStart = new Date(prevDate.getFullYear(), prevDate.getMonth() - 1, 1).toISOString().split('T')[0];
-                const prevEnd = new Date(prevDate.getFullYear(), prevDate.getMonth(), 0).toISOString().split('T')[0];
-                const kpiPrevRes = await fetch(`${API_BASE_URL}/analitica/estadisticas/kpis?start_date=${prevStart}&end_date=${prevEnd}`, { headers });
-                if (kpiPrevRes.ok) {
-                    const kpisPrev = await kpiPrevRes.json();
-                    compResult = {
-                        isLegacy: true,
-                        prevTotal: kpisPrev.total_incidentes,
-                        prevHomicidios: kpisPrev.tasa_homicidios
-                    };
-                }
+            } else if (bundle.periodo_anterior) {
+                compResult = {
+                    isLegacy: true,
+                    prevTotal: bundle.periodo_anterior.total_incidentes,
+                    prevHomicidios: bundle.periodo_anterior.tasa_homicidios
+                };
             }
 
             // Actualizar el estado de comparación
@@ -94,16 +81,10 @@ const Dashboard = () => {
                 ? calculateChange(kpisCurrent?.total_incidentes || 0, compResult.prevTotal || 0)
                 : (compResult ? { text: `${compResult.cambios_porcentaje.total > 0 ? '+' : ''}${compResult.cambios_porcentaje.total}% vs ref`, trend: compResult.cambios_porcentaje.total > 0 ? 'negative' : 'positive' } : { text: "Filtrado", trend: "neutral" });
 
-            // 2, 3, 4. Fetch Resto
-            const [trendRes, distRes, recentRes] = await Promise.all([
-                fetch(`${API_BASE_URL}/analitica/estadisticas/tendencia?start_date=${start}&end_date=${end}`, { headers }),
-                fetch(`${API_BASE_URL}/analitica/estadisticas/distribucion?start_date=${start}&end_date=${end}`, { headers }),
-                fetch(`${API_BASE_URL}/analitica/estadisticas/resumen?start_date=${start}&end_date=${end}`, { headers })
-            ]);
-
-            const trendData = await trendRes.json();
-            const distData = await distRes.json();
-            const recentData = await recentRes.json();
+            // 2, 3, 4. Tendencia, distribución y actividad reciente vienen en el bundle
+            const trendData = bundle.tendencia;
+            const distData = bundle.distribucion;
+            const recentData = bundle.recientes;
 
             // 5. Map
             const mapRes = await fetch(`${API_BASE_URL}/analitica/eventos/geojson?token=${token || ''}&start_date=${start}&end_date=${end}`);
@@ -122,7 +103,7 @@ const Dashboard = () => {
                 ],
                 crimeTrendData: Array.isArray(trendData) ? trendData : [],
                 crimeDistributionData: Array.isArray(distData) ? distData : [],
-                recentActivity: Array.isArray(recentData) ? recentData.slice(0, 5).map(i => ({
+                recentActivity: Array.isArray(recentData) ? recentData.map(i => ({
                     id: i?.id, type: i?.tipo, location: i?.barrio, time: i?.fecha, status: i?.estado
                 })) : [],
                 referenceDate: refDate,
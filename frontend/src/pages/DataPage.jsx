@@ -3,7 +3,6 @@ import { Search, Plus, Edit2, Trash2, Save, X, ChevronLeft, ChevronRight, Upload
 import * as XLSX from 'xlsx';
 import AIAnalysisModal from '../components/AIAnalysisModal';
 
-import { geocodeNeighborhood } from '../utils/geocoding';
 import { API_BASE_URL } from '../utils/apiConfig';
 
 const API_URL = `${API_BASE_URL}/analitica/estadisticas/resumen`;
@@ -14,6 +13,7 @@ const DataPage = () => {
     const [isModalOpen, setIsModalOpen] = useState(false);
     const [isAIModalOpen, setIsAIModalOpen] = useState(false);
     const [pendingImportData, setPendingImportData] = useState([]);
+    const [pendingImportFile, setPendingImportFile] = useState(null);
     const [editingId, setEditingId] = useState(null);
     const [formData, setFormData] = useState({
         fecha: '',
@@ -36,11 +36,17 @@ const DataPage = () => {
     const fetchIncidents = async () => {
         try {
             const token = localStorage.getItem('token');
-            const response = await fetch(API_URL, {
-                headers: token ? { 'Authorization': `Bearer ${token}` } : {}
-            });
-            if (!response.ok) throw new Error('Error al cargar datos');
-            const result = await response.json();
+            const headers = token ? { 'Authorization': `Bearer ${token}` } : {};
+            // El backend pagina por cursor: seguimos X-Siguiente-Cursor hasta la última página
+            let result = [];
+            let cursor = null;
+            do {
+                const url = cursor ? `${API_URL}?cursor=${encodeURIComponent(cursor)}` : API_URL;
+                const response = await fetch(url, { headers });
+                if (!response.ok) throw new Error('Error al cargar datos');
+                result = result.concat(await response.json());
+                cursor = response.headers.get('X-Siguiente-Cursor');
+            } while (cursor);
             setData(result);
             setError(null);
         } catch (err) {
@@ -196,14 +202,13 @@ const DataPage = () => {
                         });
                     }
 
-                    // FALLBACK: Geocodificación por Barrio (User Request)
-                    // Solo si faltan datos o si son el punto exacto de la alcaldía (indicador de dato no georreferenciado)
+                    // El punto exacto de la alcaldía indica un dato no georreferenciado: se envía sin
+                    // coordenadas y el servidor lo ubica por barrio con su nomenclátor (/ingesta/bulk)
                     const isGenericCenter = lat && lng && Math.abs(lat - 3.2606) < 0.0001 && Math.abs(lng - (-76.5364)) < 0.0001;
 
                     if (!lat || !lng || isGenericCenter) {
-                        const geo = geocodeNeighborhood(barrio || "");
-                        lat = geo.lat;
-                        lng = geo.lng;
+                        lat = null;
+                        lng = null;
                     }
 
                     return {
@@ -218,6 +223,7 @@ const DataPage = () => {
                 });
 
                 setPendingImportData(normalizedData);
+                setPendingImportFile(file);
                 setIsAIModalOpen(true);
             } catch (err) {
                 alert('Error leyendo el archivo: ' + err.message);
@@ -512,6 +518,7 @@ const DataPage = () => {
             <AIAnalysisModal
                 isOpen={isAIModalOpen}
                 onClose={() => setIsAIModalOpen(false)}
+                file={pendingImportFile}
                 data={pendingImportData}
                 onConfirm={handleConfirmImport}
             />
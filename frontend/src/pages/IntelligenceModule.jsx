@@ -14,6 +14,10 @@ import {
 } from 'recharts';
 
 import { API_BASE_URL } from '../utils/apiConfig';
+import { resumableUpload } from '../utils/resumableUpload';
+
+// Por encima de este tamaño se usa la subida reanudable por trozos
+const UMBRAL_SUBIDA_REANUDABLE = 10 * 1024 * 1024;
 
 const Card = ({ children, className }) => <div className={`bg-white rounded-xl shadow-sm border border-slate-200 ${className}`}>{children}</div>;
 const CardHeader = ({ children, className }) => <div className={`p-6 pb-2 ${className}`}>{children}</div>;
@@ -73,6 +77,25 @@ const IntelligenceModule = () => {
         if (!file) return;
 
         setUploading(true);
+
+        if (file.size > UMBRAL_SUBIDA_REANUDABLE) {
+            try {
+                const data = await resumableUpload(file, {
+                    destino: 'nacional',
+                    onProgress: (p) => setIngestStatus(`Subiendo archivo... ${Math.round(p * 100)}%`)
+                });
+                setIngestStatus(`Éxito: ${data.message} (${data.records_inserted} registros)`);
+                fetchStats();
+            } catch (error) {
+                console.error("Error uploading file:", error);
+                setIngestStatus(`Error: ${error.message || 'Fallo en la carga'}`);
+            } finally {
+                setUploading(false);
+                event.target.value = null;
+            }
+            return;
+        }
+
         const formData = new FormData();
         formData.append('file', file);
 
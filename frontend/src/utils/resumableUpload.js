@@ -0,0 +1,109 @@
+import { API_BASE_URL } from './apiConfig';
+
+// Cliente del protocolo de subidas reanudables (/ingesta/subidas, estilo tus).
+// Envía el archivo en trozos; ante un corte consulta el offset del servidor y
+// continúa desde ahí en lugar de reiniciar la subida completa. Al finalizar envía la
+// cadena de SHA-256 de los trozos (WebCrypto no calcula el hash del archivo por partes)
+// para que el servidor verifique el archivo completo de extremo a extremo.
+const TAMANO_TROZO = 8 * 1024 * 1024;
+const MAX_REINTENTOS = 5;
+
+const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+const base64 = (buffer) => {
+    let binario = '';
+    const bytes = new Uint8Array(buffer);
+    for (let i = 0; i < bytes.length; i++) binario += String.fromCharCode(bytes[i]);
+    return btoa(binario);
+};
+
+const hex = (buffer) => Array.from(new Uint8Array(buffer), b => b.toString(16).padStart(2, '0')).join('');
+
+// SHA-256 de la concatenación de los SHA-256 de los trozos en el orden del archivo
+const cadenaTrozos = async (digests, tamano) => {
+    const partes = [];
+    for (let offset = 0; offset < tamano;) {
+        const trozo = digests.get(offset);
+        if (!trozo) throw new Error(`Falta el hash del trozo en el byte ${offset}`);
+        partes.push(new Uint8Array(trozo.digest));
+        offset += trozo.longitud;
+    }
+    const concatenado = new Uint8Array(partes.length * 32);
+    partes.forEach((parte, i) => concatenado.set(parte, i * 32));
+    return hex(await crypto.subtle.digest('SHA-256', concatenado));
+};
+
+const leerError = async (response) => {
+    try {
+        const data = await response.json();
+        return data.detail || `Error ${response.status}`;
+    } catch {
+        return `Error ${response.status}`;
+    }
+};
+
+/**
+ * Sube `file` por trozos y ejecuta la ingesta del `destino` ('eventos' | 'nacional').
+ * `onProgress(fraccion)` recibe el avance entre 0 y 1. Retorna la respuesta de la ingesta.
+ */
+export const resumableUpload = async (file, { destino = 'eventos', onProgress } = {}) => {
+    const token = localStorage.getItem('token');
+    const auth = { 'Authorization': `Bearer ${token}` };
+    const base = `${API_BASE_URL}/ingesta/subidas`;
+
+    const creada = await fetch(base, {
+        method: 'POST',
+        headers: { ...auth, 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size, destino })
+    });
+    if (!creada.ok) throw new Error(await leerError(creada));
+    const { id, trozo_max } = await creada.json();
+    const tamanoTrozo = Math.min(TAMANO_TROZO, trozo_max || TAMANO_TROZO);
+
+    let offset = 0;
+    let reintentos = 0;
+    const digests = new Map(); // offset -> { digest, longitud } de cada trozo enviado
+    while (offset < file.size) {
+        const trozo = await file.slice(offset, offset + tamanoTrozo).arrayBuffer();
+        try {
+            const digest = await crypto.subtle.digest('SHA-256', trozo);
+            digests.set(offset, { digest, longitud: trozo.byteLength });
+            const response = await fetch(`${base}/${id}`, {
+                method: 'PATCH',
+                headers: {
+                    ...auth,
+                    'Content-Type': 'application/offset+octet-stream',
+                    'Upload-Offset': String(offset),
+                    'Upload-Checksum': `sha256 ${base64(digest)}`
+                },
+                body: trozo
+            });
+            if (response.status === 409) {
+                // El servidor tiene otro offset (p.ej. un PATCH previo sí llegó): continuar desde ahí
+                offset = Number(response.headers.get('Upload-Offset'));
+                continue;
+            }
+            if (!response.ok) throw new Error(await leerError(response));
+            offset = Number(response.headers.get('Upload-Offset'));
+            reintentos = 0;
+            if (onProgress) onProgress(offset / file.size);
+        } catch (err) {
+            if (++reintentos > MAX_REINTENTOS) throw err;
+            await esperar(1000 * 2 ** reintentos);
+            try {
+                const estado = await fetch(`${base}/${id}`, { headers: auth });
+                if (estado.ok) offset = (await estado.json()).offset;
+            } catch {
+                // Sin conexión todavía: se reintenta el mismo trozo
+            }
+        }
+    }
+
+    const finalizada = await fetch(`${base}/${id}/finalizar`, {
+        method: 'POST',
+        headers: { ...auth, 'Content-Type': 'application/json' },
+        body: JSON.stringify({ sha256_trozos: await cadenaTrozos(digests, file.size) })
+    });
+    if (!finalizada.ok) throw new Error(await leerError(finalizada));
+    return finalizada.json();
+};